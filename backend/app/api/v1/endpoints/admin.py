@@ -0,0 +1,30 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+from ....core.config import get_settings
+from ....services.runtime_probe import node_runtime
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Libera a rota apenas com o header X-Admin-Token igual a ADMIN_TOKEN."""
+    token = get_settings().ADMIN_TOKEN
+    if not token:
+        raise HTTPException(status_code=403, detail="Rotas de admin desabilitadas (ADMIN_TOKEN não configurado)")
+    # Comparação em tempo constante; em bytes porque compare_digest recusa str não-ASCII
+    if not hmac.compare_digest((x_admin_token or "").encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Token de admin inválido")
+
+
+@router.post("/runtime/probe", dependencies=[Depends(require_admin)])
+async def reprobe_runtime():
+    """
+    Refaz o probe do runtime JS (Node.js).
+
+    Útil depois de instalar/atualizar o node sem reiniciar o servidor.
+    """
+    status = await run_in_threadpool(node_runtime.probe)
+    return status.to_dict()
@@ -1,56 +1,294 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from ....services.ytdlp_service import YtDlpService
-from ....schemas.video import VideoInfo, DownloadRequest, StreamRequest
+import hashlib
+import json
+import math
+import time
+from contextlib import aclosing
+from fastapi import APIRouter, Depends, HTTPException, Header, Path, Query, Request
+from typing import Optional
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from ....core.config import get_settings
+from ....services.ytdlp_service import YtDlpService, MediaStream
+from ....services.extraction_pool import PoolSaturatedError, ExtractionTimeoutError
+from ....services.media_proxy import ByteRange, RangeNotSatisfiableError
+from ....services.playlist import InvalidCursorError
+from ....services.metrics import instrument_stream, rate_limited, route_template
+from ....services.rate_limit import get_rate_limiter
+from ....schemas.video import VideoInfo, DownloadRequest, StreamRequest, BatchInfoRequest, PlaylistPage
 from loguru import logger
 
 router = APIRouter()
 
-@router.post("/info", response_model=VideoInfo)
-async def get_video_info(request: DownloadRequest):
+
+def rate_limit(request: Request):
+    """
+    Token bucket por IP (429) e global (503) antes de qualquer extração ou
+    stream; os dois respondem com Retry-After.
+    """
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return
+    client = request.client.host if request.client else "anonimo"
+    scope, wait = limiter.check(client)
+    if scope is None:
+        return
+    rate_limited.inc(endpoint=route_template(request.scope), scope=scope)
+    headers = {"Retry-After": str(max(math.ceil(wait), 1))}
+    if scope == "client":
+        raise HTTPException(status_code=429, detail="Muitas requisições. Aguarde antes de tentar de novo.", headers=headers)
+    raise HTTPException(status_code=503, detail="Servidor no limite de requisições. Tente novamente em instantes.", headers=headers)
+
+
+def _capacity_error(e: Exception) -> HTTPException:
+    if isinstance(e, PoolSaturatedError):
+        return HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return HTTPException(status_code=504, detail=str(e))
+
+
+def _error_status(e: Exception) -> int:
+    if isinstance(e, PoolSaturatedError):
+        return 503
+    if isinstance(e, ExtractionTimeoutError):
+        return 504
+    return 400
+
+
+def _video_info(info: dict, url: str) -> VideoInfo:
+    return VideoInfo(
+        title=info.get('title', 'Unknown'),
+        thumbnail=info.get('thumbnail', ''),
+        duration=info.get('duration', 0),
+        uploader=info.get('uploader', 'Unknown'),
+        view_count=info.get('view_count', 0),
+        webpage_url=info.get('webpage_url', url),
+        qualities=info.get('qualities', []),
+        audio_filesize=info.get('audio_filesize', 0)
+    )
+
+
+def _info_etag(video_info: VideoInfo) -> str:
+    """ETag do /info: muda só quando algum campo da resposta muda."""
+    digest = hashlib.sha1(video_info.model_dump_json().encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def _range_error(e: RangeNotSatisfiableError) -> HTTPException:
+    total = "*" if e.total_size is None else str(e.total_size)
+    return HTTPException(status_code=416, detail=str(e), headers={"Content-Range": f"bytes */{total}"})
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Compara If-None-Match (lista de ETags ou '*') com o ETag atual, ignorando o prefixo fraco W/."""
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class _MediaStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que sempre fecha o `MediaStream` no fim. O Starlette não
+    fecha o iterador: se o cliente sai antes do primeiro pedaço, o corpo nunca
+    é iterado e o `finally` dele (upstream, perfil de saída) não roda.
+    """
+
+    def __init__(self, stream: MediaStream, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.stream = stream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.stream.aclose()
+
+
+def _media_response(stream: MediaStream, headers: dict, endpoint: str, mode: str, started: float) -> Response:
+    """Resposta HTTP do stream: arquivo do cache em disco ou streaming (medido em `/metrics`)."""
+    headers.update(stream.headers)
+    if stream.file_path is not None:
+        # FileResponse trata Range/If-Range sozinho e usa o `http.response.pathsend`
+        # (sendfile) quando o servidor ASGI oferece a extensão
+        return FileResponse(stream.file_path, media_type=stream.media_type, headers=headers)
+    return _MediaStreamingResponse(
+        stream,
+        instrument_stream(stream.body, endpoint, mode, stream.engine, started),
+        status_code=stream.status_code,
+        media_type=stream.media_type,
+        headers=headers
+    )
+
+
+@router.post("/info", response_model=VideoInfo, dependencies=[Depends(rate_limit)])
+async def get_video_info(
+    request: DownloadRequest,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
+):
     """
     Obtém metadados de um vídeo do YouTube.
 
     Recupera título, thumbnail, duração e lista de formatos disponíveis.
+    A resposta leva ETag; um cliente que pergunta de novo com If-None-Match
+    recebe 304 sem corpo enquanto nada mudou.
     """
     try:
-        info = YtDlpService.get_info(request.url)
-        return VideoInfo(
-            title=info.get('title', 'Unknown'),
-            thumbnail=info.get('thumbnail', ''),
-            duration=info.get('duration', 0),
-            uploader=info.get('uploader', 'Unknown'),
-            view_count=info.get('view_count', 0),
-            webpage_url=info.get('webpage_url', request.url),
-            qualities=info.get('qualities', []),
-            audio_filesize=info.get('audio_filesize', 0)
-        )
+        info = await YtDlpService.fetch_info(request.url)
+        video_info = _video_info(info, request.url)
+        etag = _info_etag(video_info)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return video_info
+    except (PoolSaturatedError, ExtractionTimeoutError) as e:
+        logger.warning(f"Sem capacidade de extração: {e}")
+        raise _capacity_error(e)
     except Exception as e:
         logger.exception("Detalhes completos do erro:")
         logger.error(f"Erro ao obter info: {repr(e)}")
         raise HTTPException(status_code=400, detail=f"Falha ao obter vídeo: {str(e) or repr(e)}")
 
-@router.post("/stream")
-async def stream_media(request: StreamRequest):
+@router.post("/info/batch", dependencies=[Depends(rate_limit)])
+async def get_video_info_batch(request: BatchInfoRequest):
+    """
+    Metadados de várias URLs (ou de uma playlist/canal) em um só request.
+
+    A resposta é NDJSON, uma linha por vídeo na ordem em que cada extração
+    termina, para o app mostrar o primeiro resultado sem esperar o mais lento.
+    Cada linha traz `index` (posição na lista expandida) e `url`, mais `info`
+    ou `error`/`status` quando aquele item falhou.
     """
-    Stream de mídia (video ou audio) direto do yt-dlp.
+    async def lines():
+        async with aclosing(YtDlpService.fetch_info_batch(request.urls, request.max_items)) as items:
+            async for item in items:
+                line = {"index": item.index, "url": item.url}
+                if item.error is None:
+                    line["info"] = _video_info(item.info, item.url).model_dump()
+                else:
+                    line["status"] = _error_status(item.error)
+                    line["error"] = str(item.error) or repr(item.error)
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/playlist", response_model=PlaylistPage, dependencies=[Depends(rate_limit)])
+async def list_playlist(
+    url: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+):
+    """
+    Lista uma playlist/canal em páginas, sem resolver os formatos de cada vídeo.
+
+    Cada entrada traz só id, URL, título, duração, canal e thumbnail; os
+    formatos vêm do `/info` (ou `/info/batch`) quando o usuário escolhe o
+    vídeo. Passe o `next_cursor` da resposta para buscar a próxima página.
+    """
+    try:
+        page = await YtDlpService.fetch_playlist_page(url, cursor, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (PoolSaturatedError, ExtractionTimeoutError) as e:
+        raise _capacity_error(e)
+    except Exception as e:
+        logger.error(f"Erro ao listar playlist: {repr(e)}")
+        raise HTTPException(status_code=400, detail=f"Falha ao listar playlist: {str(e) or repr(e)}")
+    return PlaylistPage(title=page.title, entries=page.entries, next_cursor=page.next_cursor)
+
+
+@router.post("/stream", dependencies=[Depends(rate_limit)])
+async def stream_media(request: StreamRequest, range: Optional[str] = Header(default=None)):
+    """
+    Stream de mídia (video ou audio).
+    Repassa a URL direta do formato (ou o stdout do yt-dlp, como fallback).
     Não salva nada no disco.
+
+    Aceita `Range: bytes=...` para retomar downloads interrompidos (206).
+    No modo 'audio', `codec`/`bitrate` pedem conversão no servidor (mp3/opus).
+    """
+    started = time.perf_counter()
+    try:
+        stream = await YtDlpService.open_stream(
+            request.url, request.mode, request.quality, ByteRange.parse(range),
+            codec=request.codec, bitrate=request.bitrate, video_codec=request.video_codec,
+        )
+    except RangeNotSatisfiableError as e:
+        raise _range_error(e)
+    except (PoolSaturatedError, ExtractionTimeoutError) as e:
+        raise _capacity_error(e)
+
+    headers = {"Content-Disposition": f"attachment; filename={stream.filename}"}
+    mode = f"{request.mode}/{request.codec}" if request.mode == "audio" and request.codec else request.mode
+    return _media_response(stream, headers, "/stream", mode, started)
+
+
+@router.api_route("/stream/{video_id}", methods=["GET", "HEAD"], dependencies=[Depends(rate_limit)])
+async def stream_media_by_id(
+    request: Request,
+    video_id: str = Path(pattern=r"^[A-Za-z0-9_-]{11}$"),
+    mode: str = "video",
+    quality: Optional[int] = None,
+    codec: Optional[str] = Query(default=None, pattern=r"^(mp3|opus)$"),
+    bitrate: Optional[int] = Query(default=None, ge=32, le=320),
+    video_codec: Optional[str] = Query(default=None, pattern=r"^(avc1|vp9|av01)$"),
+    range: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    if_range: Optional[str] = Header(default=None),
+):
+    """
+    Variante GET do /stream com URL estável.
+
+    Players nativos e gerenciadores de download podem usar a URL direto, e um
+    proxy/CDN na frente do backend pode cachear a resposta: ela leva ETag,
+    Last-Modified e Cache-Control, responde 304 para If-None-Match e aceita
+    Range/If-Range.
     """
-    if request.mode == 'audio':
-        format_str = "bestaudio[ext=m4a]"
-        media_type = "audio/mp4"
-        filename = "audio.m4a"
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    started = time.perf_counter()
+    try:
+        target = await YtDlpService.resolve_stream(url, mode, quality, codec, bitrate, video_codec)
+    except (PoolSaturatedError, ExtractionTimeoutError) as e:
+        raise _capacity_error(e)
+
+    validators = target.validators()
+    etag = validators.get("ETag")
+    if validators:
+        cache_headers = {"Cache-Control": f"public, max-age={get_settings().STREAM_CACHE_MAX_AGE}"}
     else:
-        # Video mode
-        if request.quality:
-            format_str = f"bestvideo[height={request.quality}]"
-        else:
-            format_str = "bestvideo"
-        media_type = "video/mp4"
-        filename = "video.mp4"
-
-    return StreamingResponse(
-        YtDlpService.stream_video(request.url, format_str),
-        media_type=media_type,
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+        # Fallback pelo subprocess: sem validador, não deixa caches guardarem
+        cache_headers = {"Cache-Control": "no-store"}
+    cache_headers.update(validators)
+
+    if etag and if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    headers = {"Content-Disposition": f"attachment; filename={target.filename}"}
+    headers.update(cache_headers)
+
+    if request.method == "HEAD":
+        headers["Accept-Ranges"] = "bytes" if target.proxyable else "none"
+        if target.proxyable and target.size:
+            headers["Content-Length"] = str(target.size)
+        return Response(status_code=200, media_type=target.media_type, headers=headers)
+
+    byte_range = ByteRange.parse(range)
+    if byte_range and if_range and if_range.strip() not in (etag, validators.get("Last-Modified")):
+        # A mídia mudou desde o download parcial: manda o arquivo inteiro
+        byte_range = None
+
+    try:
+        stream = await YtDlpService.open_stream(url, mode, quality, byte_range, target=target)
+    except RangeNotSatisfiableError as e:
+        raise _range_error(e)
+    except (PoolSaturatedError, ExtractionTimeoutError) as e:
+        raise _capacity_error(e)
+
+    if stream.engine == 'subprocess':
+        headers.update({"Cache-Control": "no-store"})
+        headers.pop("ETag", None)
+        headers.pop("Last-Modified", None)
+    label = f"{mode}/{codec}" if mode == "audio" and codec else mode
+    return _media_response(stream, headers, "/stream/{video_id}", label, started)
@@ -0,0 +1,118 @@
+import json
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from ....services.extraction_pool import PoolSaturatedError
+from ....services.jobs import ClientJobLimitError, Job, get_job_scheduler
+from ....schemas.video import JobRequest, JobStatus
+from loguru import logger
+
+router = APIRouter()
+
+# Comentário SSE enviado quando nada muda, para proxies não fecharem a conexão
+_SSE_HEARTBEAT = 15.0
+
+
+def _client_id(request: Request, x_client_id: Optional[str]) -> str:
+    """Cliente para a justiça da fila: header X-Client-Id, senão o IP."""
+    if x_client_id:
+        return x_client_id[:128]
+    return request.client.host if request.client else "anonimo"
+
+
+def _get_job(job_id: str) -> Job:
+    job = get_job_scheduler().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+@router.post("", response_model=JobStatus, status_code=202)
+async def create_job(job_request: JobRequest, request: Request, x_client_id: Optional[str] = Header(default=None)):
+    """
+    Enfileira um download no servidor.
+
+    O job entra numa fila com prioridade e alternância entre clientes
+    (`X-Client-Id`, ou o IP). Acompanhe por `GET /jobs/{id}/events` (SSE) ou
+    pelo WebSocket `/jobs/{id}/ws`; quando `state` for 'completed', baixe o
+    arquivo em `GET /jobs/{id}/artifact` (aceita Range).
+    """
+    params = job_request.model_dump(exclude={"url", "priority"})
+    try:
+        job = get_job_scheduler().submit(
+            _client_id(request, x_client_id), job_request.url, job_request.priority, **params
+        )
+    except ClientJobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return job.snapshot()
+
+
+@router.get("", response_model=list[JobStatus])
+async def list_jobs(request: Request, x_client_id: Optional[str] = Header(default=None)):
+    """Jobs do cliente (na fila, rodando e terminados ainda disponíveis)."""
+    return [job.snapshot() for job in get_job_scheduler().list(_client_id(request, x_client_id))]
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    return _get_job(job_id).snapshot()
+
+
+@router.delete("/{job_id}", status_code=204)
+async def delete_job(job_id: str):
+    """Cancela o job (se ainda não terminou) e apaga o arquivo."""
+    if not get_job_scheduler().delete(job_id):
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return Response(status_code=204)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Progresso do job por Server-Sent Events.
+
+    Um evento por mudança (estado, posição na fila, progresso no máximo duas
+    vezes por segundo); o nome do evento é o `state`. O stream termina no
+    estado final.
+    """
+    job = _get_job(job_id)
+
+    async def events():
+        async for snapshot in get_job_scheduler().events(job, heartbeat=_SSE_HEARTBEAT):
+            if snapshot is None:
+                yield ": ping\n\n"
+                continue
+            yield f"event: {snapshot['state']}\ndata: {json.dumps(snapshot)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/{job_id}/ws")
+async def job_websocket(websocket: WebSocket, job_id: str):
+    """Mesmos eventos do SSE, como mensagens JSON; o servidor fecha no estado final."""
+    job = get_job_scheduler().get(job_id)
+    if job is None:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    try:
+        async for snapshot in get_job_scheduler().events(job):
+            await websocket.send_json(snapshot)
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.debug(f"WebSocket do job {job_id} desconectado")
+
+
+@router.api_route("/{job_id}/artifact", methods=["GET", "HEAD"])
+async def job_artifact(job_id: str):
+    """Arquivo do job concluído (Range/If-Range pelo FileResponse)."""
+    job = _get_job(job_id)
+    if job.state != "completed" or not job.path:
+        raise HTTPException(status_code=409, detail=f"Job ainda não concluído (estado: {job.state})")
+    return FileResponse(job.path, media_type=job.media_type, filename=job.filename)
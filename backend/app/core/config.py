@@ -7,15 +7,123 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "YouTube Downloader API"
     DOWNLOAD_DIR: str = os.path.join(os.getcwd(), "downloads")
 
+    # Servidor de produção (python -m app.server)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0  # 0 = número de núcleos
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE: int = 75  # Segundos; acima do idle timeout típico de balanceadores (60s)
+    SERVER_GRACEFUL_TIMEOUT: int = 300  # Segundos que streams em andamento têm para terminar no restart
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"  # Proxies confiáveis para X-Forwarded-For
+    # Importa o app e o yt-dlp uma vez no master e cria os workers com fork
+    # (páginas compartilhadas copy-on-write); sem reload de código no SIGHUP
+    SERVER_PRELOAD: bool = False
+    # Estado compartilhado entre workers (vagas globais, locks); vazio = um worker só.
+    # O app.server preenche com um diretório em /dev/shm quando sobe mais de um worker.
+    SHARED_STATE_DIR: str = ""
+
+    # Token para as rotas /admin (desabilitadas se vazio)
+    ADMIN_TOKEN: str = ""
+
     # Configurações do YT-DLP
     YTDLP_FORMAT: str = "bestvideo+bestaudio/best"
 
+    # Pool de extração (get_info roda fora do event loop)
+    EXTRACTION_EXECUTOR: str = "thread"  # 'thread' ou 'process'
+    EXTRACTION_MAX_WORKERS: int = 4
+    EXTRACTION_MAX_QUEUE: int = 16  # Extrações aguardando além das em execução
+    EXTRACTION_TIMEOUT: float = 30.0  # Segundos por extração
+    EXTRACTION_RETRY_AFTER: int = 5  # Valor do header Retry-After no 503
+
+    # Limite de requests em /info e /stream: por IP (429) e somando todos (503)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_CLIENT: float = 5.0  # Requests/s por IP
+    RATE_LIMIT_CLIENT_BURST: int = 30
+    RATE_LIMIT_GLOBAL: float = 100.0  # Requests/s no servidor todo
+    RATE_LIMIT_GLOBAL_BURST: int = 300
+    RATE_LIMIT_MAX_CLIENTS: int = 10000  # IPs lembrados (LRU)
+
+    # Ritmo adaptativo das extrações quando o YouTube pede verificação (bot/login)
+    UPSTREAM_MAX_RATE: float = 10.0  # Extrações/s sem bloqueios
+    UPSTREAM_MIN_RATE: float = 0.2  # Piso depois de reduções seguidas
+    UPSTREAM_CHALLENGE_THRESHOLD: float = 0.2  # Fração de bloqueios na janela que abre o circuito
+    UPSTREAM_MIN_CHALLENGES: int = 3  # Bloqueios mínimos na janela para abrir
+    UPSTREAM_WINDOW: float = 60.0  # Segundos
+    UPSTREAM_BACKOFF: float = 10.0  # Pausa ao abrir; dobra a cada reabertura seguida
+    UPSTREAM_MAX_BACKOFF: float = 300.0
+    UPSTREAM_RECOVERY: float = 0.05  # Extrações/s recuperadas por segundo sem bloqueio
+
+    # Perfis de saída para o YouTube (app/services/egress.py), em JSON: lista de
+    # {"name", "proxy", "source_address", "impersonate", "cookies"}.
+    # Vazio = um perfil 'default' com conexão direta.
+    EGRESS_PROFILES: list[dict] = []
+    EGRESS_QUARANTINE: float = 60.0  # Segundos fora de uso após um bloqueio; dobra a cada bloqueio seguido
+    EGRESS_MAX_QUARANTINE: float = 900.0
+
+    # POST /info/batch
+    BATCH_INFO_MAX_ITEMS: int = 200  # URLs por lote, já com as playlists expandidas
+    BATCH_INFO_CONCURRENCY: int = 4  # Extrações simultâneas por lote
+
+    # GET /playlist (listagem paginada)
+    PLAYLIST_PAGE_SIZE: int = 50
+    PLAYLIST_MAX_PAGE_SIZE: int = 200
+    PLAYLIST_SESSION_TTL: float = 600.0  # Segundos que uma listagem aberta espera a próxima página
+    PLAYLIST_MAX_SESSIONS: int = 64
+
+    # Pool de instâncias YoutubeDL reaproveitáveis
+    YDL_POOL_MAX_SIZE: int = 4  # Instâncias ociosas mantidas
+    YDL_POOL_MAX_AGE: float = 900.0  # Segundos até reciclar uma instância
+    YDL_POOL_MAX_USES: int = 200  # Extrações por instância antes de reciclar
+    YDL_POOL_PREWARM: int = 2  # Instâncias criadas no startup
+
+    # Streaming: 'proxy' repassa a URL direta do formato dentro do processo;
+    # 'subprocess' usa `python -m yt_dlp -o -` (também é o fallback do proxy)
+    STREAM_ENGINE: str = "proxy"
+    STREAM_UPSTREAM_CHUNK_SIZE: int = 10 * 1024 * 1024  # Tamanho de cada Range pedido ao upstream
+    STREAM_UPSTREAM_TIMEOUT: float = 30.0
+    STREAM_CACHE_MAX_AGE: int = 3600  # Cache-Control do GET /stream/{video_id}
+    # Clientes simultâneos da mesma mídia compartilham um único upstream
+    STREAM_BROADCAST_ENABLED: bool = True
+    STREAM_BROADCAST_WINDOW: int = 4 * 1024 * 1024  # Bytes já lidos guardados por mídia (para quem entra depois)
+    STREAM_BROADCAST_READ_AHEAD: int = 1024 * 1024  # Leitura máxima à frente do cliente mais rápido
+    # Relay do stdout de subprocessos (yt-dlp/ffmpeg) para o cliente
+    STREAM_RELAY_CHUNK_SIZE: int = 256 * 1024  # Bytes por leitura do pipe (e capacidade do pipe)
+    STREAM_RELAY_HIGH_WATER: int = 1024 * 1024  # Máximo agrupado por pedaço enviado
+    # Supervisor dos subprocessos de stream
+    STREAM_PROCESS_IDLE_TIMEOUT: float = 60.0  # Segundos sem saída antes de encerrar o filho
+    STREAM_PROCESS_TOTAL_TIMEOUT: float = 3 * 3600.0  # Duração máxima de um stream
+    STREAM_PROCESS_STDERR_LIMIT: int = 64 * 1024  # Bytes finais de stderr guardados para o log
+    STREAM_PROCESS_KILL_GRACE: float = 2.0  # Segundos entre SIGTERM e SIGKILL
+
+    # ffmpeg no servidor (modo 'muxed' e conversão de áudio)
+    FFMPEG_PATH: str = "ffmpeg"
+    FFMPEG_MAX_PROCESSES: int = 4  # Processos ffmpeg simultâneos
+    FFMPEG_MAX_QUEUE: int = 8  # Streams aguardando vaga antes de responder 503
+    # Conversão de áudio (mp3/opus) usa CPU: limite próprio, 0 = número de núcleos
+    TRANSCODE_MAX_PROCESSES: int = 0
+    TRANSCODE_MAX_QUEUE: int = 16
+
+    # Jobs de download (POST /jobs): arquivos em DOWNLOAD_DIR/jobs
+    JOBS_MAX_WORKERS: int = 2  # Jobs baixando ao mesmo tempo
+    JOBS_MAX_QUEUE: int = 64  # Jobs aguardando (todos os clientes) antes de responder 503
+    JOBS_MAX_PER_CLIENT: int = 8  # Jobs ativos (na fila ou rodando) por cliente
+    JOBS_TTL: float = 3600.0  # Segundos que um job terminado e o arquivo ficam disponíveis
+
+    # Cache de mídia em disco (DOWNLOAD_DIR/media), por (video_id, format_id)
+    MEDIA_CACHE_ENABLED: bool = False
+    MEDIA_CACHE_MAX_BYTES: int = 10 * 1024 ** 3
+
+    # Cache de metadados do /info
+    INFO_CACHE_ENABLED: bool = True
+    INFO_CACHE_BACKEND: str = "memory"  # 'memory' ou 'sqlite' (compartilhado entre workers)
+    INFO_CACHE_PATH: str = ""  # Arquivo do backend 'sqlite' (padrão: SHARED_STATE_DIR/info-cache.sqlite3)
+    INFO_CACHE_MAX_ENTRIES: int = 512
+    INFO_CACHE_TTL: float = 1800.0  # Segundos
+    INFO_CACHE_EXPIRY_MARGIN: float = 600.0  # Folga antes do 'expire' das URLs assinadas
+
     class Config:
         case_sensitive = True
 
 @lru_cache()
 def get_settings():
     return Settings()
-
-# Criar diretório de downloads se não existir
-os.makedirs(Settings().DOWNLOAD_DIR, exist_ok=True)
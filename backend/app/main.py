@@ -2,7 +2,14 @@
 Main Application Module.
 
 Configura a instância FastAPI, middlewares e inclui os routers.
+
+O import é leve de propósito (o `yt_dlp` só entra na primeira extração) e o
+aquecimento roda em segundo plano depois do startup: o `/health` responde
+logo, com `warm: false` até o aquecimento terminar.
 """
+import asyncio
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
@@ -22,19 +29,118 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-from app.api.v1.endpoints import download
+from app.api.v1.endpoints import download, admin, jobs
 
-from fastapi.staticfiles import StaticFiles
 from app.core.config import get_settings
+from app.services.extraction_pool import get_extraction_pool
+from app.services.info_cache import get_info_cache
+from app.services.runtime_probe import node_runtime
+from app.services.ydl_pool import clear_ydl_pools, get_ydl_pool, ydl_pools_stats
+from app.services.media_proxy import get_media_proxy
+from app.services.media_cache import get_media_cache
+from app.services.broadcast import get_broadcast_hub
+from app.services.ffmpeg_service import get_ffmpeg_limiter, get_transcode_limiter
+from app.services.process_supervisor import get_process_supervisor
+from app.services.playlist import get_playlist_pager
+from app.services.jobs import get_job_scheduler
+from app.services.rate_limit import get_rate_limiter, get_upstream_throttle
+from app.services.egress import get_egress_pool
+from app.services.metrics import REGISTRY, MetricsMiddleware, stats_gauges
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 
 app.include_router(download.router, prefix="/api/v1/download", tags=["download"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+
+
+
+# Tarefa de aquecimento (None antes do startup); o /health mostra se terminou
+_warmup: asyncio.Task | None = None
+
+
+async def warm_up():
+    """Tudo que só deixa o primeiro request mais rápido, fora do caminho do startup."""
+    # Probe do Node.js uma única vez; get_info usa o resultado memorizado
+    await run_in_threadpool(node_runtime.probe)
+
+    settings = get_settings()
+    if settings.EXTRACTION_EXECUTOR == "thread":
+        # Instâncias YoutubeDL prontas antes do primeiro /info, em cada perfil de saída
+        try:
+            for profile in get_egress_pool().profiles:
+                await run_in_threadpool(get_ydl_pool(profile).prewarm, settings.YDL_POOL_PREWARM)
+        except Exception as e:
+            logger.warning(f"Falha ao pré-aquecer o pool do yt-dlp: {e!r}")
 
+    media_cache = get_media_cache()
+    if media_cache is not None:
+        # Reconstrói o índice LRU e limpa arquivos .part de streams interrompidos
+        # (sem isso, o primeiro lookup carrega o índice)
+        try:
+            await run_in_threadpool(media_cache.load)
+        except OSError as e:
+            logger.warning(f"Falha ao carregar o cache de mídia: {e!r}")
+    logger.info("Aquecimento concluído")
 
 
 @app.on_event("startup")
 async def startup_event():
+    global _warmup
     logger.info("Servidor iniciado!")
+    os.makedirs(get_settings().DOWNLOAD_DIR, exist_ok=True)
+    # Jobs não sobrevivem a um restart: arquivos antigos são apagados
+    await run_in_threadpool(get_job_scheduler().cleanup)
+    _warmup = asyncio.ensure_future(warm_up())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _warmup is not None and not _warmup.done():
+        _warmup.cancel()
+    get_extraction_pool().shutdown()
+    clear_ydl_pools()
+    await get_media_proxy().close()
+    get_process_supervisor().kill_all()
+    get_playlist_pager().clear()
+    await get_job_scheduler().close()
+
+
+def component_stats() -> dict:
+    """Estado dos caches, pools e filas (para o /health e o /metrics)."""
+    return {
+        "extraction_pool": get_extraction_pool().stats(),
+        "info_cache": get_info_cache().stats(),
+        "ydl_pool": ydl_pools_stats(),
+        "media_cache": get_media_cache().stats() if get_media_cache() else None,
+        "broadcast": get_broadcast_hub().stats(),
+        "ffmpeg": get_ffmpeg_limiter().stats(),
+        "transcode": get_transcode_limiter().stats(),
+        "processes": get_process_supervisor().stats(),
+        "playlist": get_playlist_pager().stats(),
+        "jobs": get_job_scheduler().stats(),
+        "rate_limit": get_rate_limiter().stats() if get_rate_limiter() else None,
+        "upstream": get_upstream_throttle().stats(),
+        "egress": get_egress_pool().stats(),
+    }
+
+
+app.add_middleware(MetricsMiddleware)
+REGISTRY.register_collector(stats_gauges(
+    "vids_component_state", "Campos numéricos do stats() de cada pool, fila e cache.", component_stats))
+
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "version": "1.0.0"}
+    return {
+        "status": "ok",
+        "version": "1.0.0",
+        "warm": _warmup is not None and _warmup.done(),
+        "runtime": node_runtime.last.to_dict() if node_runtime.last else None,
+        **component_stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas no formato de texto do Prometheus."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
 
 class VideoQuality(BaseModel):
     height: int
@@ -22,7 +22,58 @@ class DownloadRequest(BaseModel):
     quality: Optional[int] = None
 
 
+class BatchInfoRequest(BaseModel):
+    urls: list[str] = Field(min_length=1) # Videos and/or playlist/channel URLs (expanded)
+    max_items: Optional[int] = Field(default=None, ge=1) # Capped by BATCH_INFO_MAX_ITEMS
+
+
+class PlaylistEntry(BaseModel):
+    id: Optional[str] = None
+    url: Optional[str] = None # Pass to /info for formats
+    title: Optional[str] = None
+    duration: Optional[float] = None
+    uploader: Optional[str] = None
+    thumbnail: Optional[str] = None
+
+
+class PlaylistPage(BaseModel):
+    title: Optional[str] = None
+    entries: list[PlaylistEntry] = []
+    next_cursor: Optional[str] = None # None on the last page
+
+
 class StreamRequest(BaseModel):
     url: str
-    mode: str = "video" # 'video' or 'audio'
-    quality: Optional[int] = None # Only for video
+    mode: str = "video" # 'video', 'audio' or 'muxed' (video+audio joined on the server)
+    quality: Optional[int] = None # Only for video/muxed
+    codec: Optional[Literal["mp3", "opus"]] = None # Only for audio: transcoded on the server
+    bitrate: Optional[int] = Field(default=None, ge=32, le=320) # kbps, with codec
+    video_codec: Optional[Literal["avc1", "vp9", "av01"]] = None # Preferred video codec, if available
+
+
+class JobRequest(BaseModel):
+    url: str
+    mode: Literal["video", "audio", "muxed"] = "video"
+    quality: Optional[int] = None # Only for video/muxed
+    codec: Optional[Literal["mp3", "opus"]] = None # Only for audio: transcoded on the server
+    bitrate: Optional[int] = Field(default=None, ge=32, le=320) # kbps, with codec
+    video_codec: Optional[Literal["avc1", "vp9", "av01"]] = None
+    priority: Literal["high", "normal", "low"] = "normal"
+
+
+class JobStatus(BaseModel):
+    id: str
+    state: str # queued, running, completed, failed, cancelled
+    url: str
+    mode: str
+    quality: Optional[int] = None
+    priority: str
+    position: Optional[int] = None # Place in the queue (1 = next), while queued
+    bytes_done: int = 0
+    total_bytes: Optional[int] = None # Unknown for muxed/transcoded until the end
+    progress: Optional[float] = None # 0..1, when total_bytes is known
+    error: Optional[str] = None
+    filename: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
@@ -0,0 +1,220 @@
+"""
+Servidor de produção: `python -m app.server`.
+
+Sobe o uvicorn com `SERVER_WORKERS` processos (0 = um por núcleo), uvloop e
+httptools quando instalados (`uvicorn[standard]`), backlog e keep-alive
+ajustáveis, e desligamento gracioso: no SIGTERM cada worker para de aceitar
+conexões e espera até `SERVER_GRACEFUL_TIMEOUT` segundos pelos streams em
+andamento. `kill -HUP <pid do master>` recria os workers um a um, no mesmo
+esquema, sem cortar downloads.
+
+Dois modos de criar os workers:
+
+- padrão: o supervisor do uvicorn, que inicia cada worker do zero (cada um
+  importa o app e, na primeira extração, o yt-dlp). O SIGHUP carrega código
+  novo;
+- `SERVER_PRELOAD=true`: o master importa o app e os módulos pesados do
+  yt-dlp uma vez (`ydl_pool.preload`), abre o socket e cria os workers com
+  `fork`. Eles começam com tudo já importado, compartilhando as páginas
+  copy-on-write: subir (ou repor) um worker custa milissegundos. O SIGHUP
+  recria os workers a partir do mesmo master, então troca de código exige
+  reiniciar o processo.
+
+Com mais de um worker, o master cria um `SHARED_STATE_DIR` (em /dev/shm, se
+existir) antes de criá-los e passa o cache do /info para o backend 'sqlite',
+para que somar workers não multiplique extrações nem os limites globais de
+extração e ffmpeg (ver `app/services/shared_state.py`).
+
+Em desenvolvimento continue usando `uvicorn app.main:app --reload`.
+"""
+import gc
+import importlib.util
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from loguru import logger
+
+from app.core.config import get_settings
+
+# Código de saída do uvicorn quando o worker não consegue subir
+_STARTUP_FAILURE = 3
+# Intervalo do laço do master (sinais e filhos encerrados)
+_SUPERVISE_INTERVAL = 0.2
+
+
+def worker_count(configured: int) -> int:
+    return configured if configured > 0 else (os.cpu_count() or 1)
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def prepare_shared_state() -> str:
+    """
+    Cria o diretório de estado compartilhado e ajusta o ambiente que os
+    workers herdam. Devolve o diretório (o master apaga ao sair).
+    """
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    directory = tempfile.mkdtemp(prefix="vids-", dir=base)
+    os.environ["SHARED_STATE_DIR"] = directory
+    if get_settings().INFO_CACHE_BACKEND == "memory":
+        os.environ["INFO_CACHE_BACKEND"] = "sqlite"
+    get_settings.cache_clear()
+    return directory
+
+
+def _run_child(run_worker: Callable[[], None]):
+    # O filho herda os handlers do master; o uvicorn instala os seus
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    code = 0
+    try:
+        run_worker()
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        logger.exception("Worker encerrado por erro")
+        code = 1
+    finally:
+        # Nunca volta para o código do master
+        os._exit(code)
+
+
+def prefork(run_worker: Callable[[], None], workers: int) -> int:
+    """
+    Cria `workers` processos com `fork` rodando `run_worker` e os
+    supervisiona até o SIGTERM/SIGINT: repõe quem morrer, repassa o sinal no
+    desligamento e, no SIGHUP, troca cada worker por um novo (o substituto
+    sobe antes do antigo começar a drenar). Devolve o código de saída.
+
+    Nada que abra descritores compartilháveis (vagas, pools, conexões) pode
+    ter sido criado antes: cada worker cria os seus depois do fork.
+    """
+    children: dict[int, float] = {}
+    retiring: set[int] = set()
+    received: list[int] = []
+    stopping = False
+    exit_code = 0
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _run_child(run_worker)
+        children[pid] = time.monotonic()
+
+    def stop():
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    previous = {sig: signal.signal(sig, lambda sig, _frame: received.append(sig))
+                for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)}
+    try:
+        for _ in range(workers):
+            spawn()
+        logger.info(f"Master {os.getpid()}: {workers} workers criados com fork")
+        while children:
+            time.sleep(_SUPERVISE_INTERVAL)
+            while received:
+                sig = received.pop(0)
+                if sig == signal.SIGHUP and not stopping:
+                    logger.info("SIGHUP: recriando os workers")
+                    for pid in [pid for pid in children if pid not in retiring]:
+                        spawn()
+                        retiring.add(pid)
+                        os.kill(pid, signal.SIGTERM)
+                elif not stopping:
+                    logger.info("Encerrando: aguardando os workers terminarem os streams")
+                    stop()
+            while children:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    children.clear()
+                    break
+                if pid == 0:
+                    break
+                children.pop(pid, None)
+                if pid in retiring:
+                    retiring.discard(pid)
+                    continue
+                if stopping:
+                    continue
+                code = os.waitstatus_to_exitcode(status)
+                if code == _STARTUP_FAILURE:
+                    logger.error(f"Worker {pid} não conseguiu subir; encerrando o servidor")
+                    exit_code = code
+                    stop()
+                    continue
+                logger.warning(f"Worker {pid} saiu com código {code}; criando outro")
+                spawn()
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    return exit_code
+
+
+def main():
+    settings = get_settings()
+    workers = worker_count(settings.SERVER_WORKERS)
+    shared_dir = None
+    if workers > 1 and not settings.SHARED_STATE_DIR:
+        # Os workers dividem entre si os ritmos globais (rate_limit)
+        os.environ["SERVER_WORKERS"] = str(workers)
+        shared_dir = prepare_shared_state()
+        # Cada worker pula a limpeza dos jobs para não apagar os dos outros
+        shutil.rmtree(os.path.join(settings.DOWNLOAD_DIR, "jobs"), ignore_errors=True)
+
+    import uvicorn
+
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+    options = dict(
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        loop=loop,
+        http=http,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.SERVER_FORWARDED_ALLOW_IPS,
+        # O log de acesso por request custa caro; /metrics já conta tudo
+        access_log=False,
+    )
+    mode = "preload + fork" if settings.SERVER_PRELOAD else "spawn"
+    logger.info(f"Servidor de produção: {workers} workers ({mode}), loop {loop}, http {http}")
+    try:
+        if not settings.SERVER_PRELOAD:
+            uvicorn.run("app.main:app", workers=workers, **options)
+            return
+        started = time.perf_counter()
+        from app.main import app
+        from app.services.ydl_pool import preload
+
+        missing = preload()
+        if missing:
+            logger.warning(f"Módulos não pré-carregados: {', '.join(missing)}")
+        logger.info(f"App pré-carregado em {time.perf_counter() - started:.2f}s")
+        # Objetos do import ficam fora do GC: coletá-los nos workers tocaria
+        # (e copiaria) as páginas compartilhadas
+        gc.collect()
+        gc.freeze()
+        config = uvicorn.Config(app, **options)
+        sock = config.bind_socket()
+        sys.exit(prefork(lambda: uvicorn.Server(config).run(sockets=[sock]), workers))
+    finally:
+        if shared_dir is not None:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
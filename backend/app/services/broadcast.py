@@ -0,0 +1,333 @@
+"""
+Broadcast Module.
+
+Fan-out de streams: quando vários clientes pedem a mesma mídia ao mesmo
+tempo, um único leitor do upstream por (vídeo, formato) empurra os pedaços
+para um buffer circular limitado, e cada cliente lê dele no próprio ritmo.
+
+O leitor só avança até `read_ahead` bytes (alguns pedaços) à frente do
+consumidor mais rápido. Enquanto o byte 0 está no buffer, ele guarda até
+`window` bytes já lidos para quem chega depois; quando o início sai do
+buffer ninguém mais entra, e o que ficou atrás do consumidor mais lento é
+descartado. Um stream com um cliente só ocupa no máximo `window` no começo
+e depois pouco mais que `read_ahead`. Um consumidor lento que fica mais de
+`window` atrás do mais rápido é desligado do broadcast e segue por conta
+própria a partir do byte em que parou (via `fallback`, ex: um Range no
+upstream), sem travar os demais.
+
+O upstream só começa a ser lido na primeira leitura de um consumidor. Se
+todas as inscrições forem fechadas antes disso (clientes que saíram antes do
+primeiro pedaço), o upstream é fechado sem ser lido.
+"""
+import asyncio
+from collections import deque
+from contextlib import aclosing
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, Hashable, Optional
+
+from loguru import logger
+
+from app.core.config import get_settings
+
+Fallback = Callable[[int], AsyncIterator[bytes]]
+Closer = Callable[[], Awaitable[None]]
+
+
+class ConsumerDetachedError(Exception):
+    """O consumidor ficou para trás do buffer e não há como retomar do upstream."""
+
+
+class _Consumer:
+    __slots__ = ("pos", "registered")
+
+    def __init__(self):
+        self.pos = 0
+        self.registered = False
+
+
+class _Subscription:
+    """Iterador de um consumidor; `aclose` vale mesmo antes da primeira leitura."""
+
+    def __init__(self, broadcast: "Broadcast"):
+        self._broadcast = broadcast
+        self._consumer = _Consumer()
+        self._iterator = broadcast._consume(self._consumer)
+        self._closed = False
+        broadcast._pending += 1
+
+    def __aiter__(self) -> "_Subscription":
+        return self
+
+    async def __anext__(self) -> bytes:
+        return await self._iterator.__anext__()
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        await self._iterator.aclose()
+        if not self._consumer.registered:
+            await self._broadcast._abandon()
+
+
+class Broadcast:
+    """
+    Um upstream, vários consumidores, buffer circular de até `window` bytes
+    (só o que algum consumidor ainda vai ler, depois que ninguém mais pode
+    entrar) e leitura no máximo `read_ahead` bytes à frente do consumidor
+    mais rápido.
+    """
+
+    def __init__(
+        self,
+        key: Hashable,
+        source: AsyncIterator[bytes],
+        window: int,
+        read_ahead: int = 1024 * 1024,
+        headers: Optional[dict] = None,
+        fallback: Optional[Fallback] = None,
+        on_finish: Optional[Callable[["Broadcast"], None]] = None,
+        close: Optional[Closer] = None,
+    ):
+        self.key = key
+        self.headers = dict(headers or {})
+        self.window = window
+        self.read_ahead = min(read_ahead, window)
+        self._source = source
+        self._fallback = fallback
+        self._on_finish = on_finish
+        self._close = close
+        self._chunks: deque[bytes] = deque()
+        self._base = 0  # Offset absoluto do primeiro byte no buffer
+        self._end = 0  # Offset absoluto logo após o último byte lido do upstream
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._consumers: set[_Consumer] = set()
+        self._cond = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._pending = 0  # Inscrições que ainda não leram nada (começam do byte 0)
+        self.detached = 0
+
+    @property
+    def joinable(self) -> bool:
+        """Novos consumidores só entram enquanto o byte 0 ainda está no buffer."""
+        return self._base == 0 and self._error is None
+
+    @property
+    def consumers(self) -> int:
+        return len(self._consumers)
+
+    @property
+    def buffered(self) -> int:
+        return self._end - self._base
+
+    def _trim(self):
+        """Descarta o que não serve mais a ninguém. Chamado com `_cond`."""
+        # Até `window` bytes para quem ainda vai entrar (ou ficou para trás)
+        while len(self._chunks) > 1 and self._end - self._base - len(self._chunks[0]) >= self.window:
+            self._base += len(self._chunks.popleft())
+        if self._base and self._consumers:
+            # Ninguém mais entra: o que ficou atrás do consumidor mais lento já foi entregue
+            slowest = min(c.pos for c in self._consumers)
+            while self._chunks and self._base + len(self._chunks[0]) <= slowest:
+                self._base += len(self._chunks.popleft())
+
+    async def _produce(self):
+        try:
+            async for chunk in self._source:
+                if not chunk:
+                    continue
+                async with self._cond:
+                    self._chunks.append(chunk)
+                    self._end += len(chunk)
+                    self._trim()
+                    self._cond.notify_all()
+                    # Não lê além de `read_ahead` à frente do consumidor mais rápido
+                    # (ou do byte 0, se só restam inscritos que ainda não leram)
+                    while (self._consumers or self._pending) and \
+                            self._end - max((c.pos for c in self._consumers), default=0) >= self.read_ahead:
+                        await self._cond.wait()
+        except asyncio.CancelledError:
+            self._error = ConsumerDetachedError("Broadcast cancelado")
+            raise
+        except Exception as e:
+            self._error = e
+        finally:
+            await self._finish()
+
+    async def _finish(self):
+        self._done = True
+        aclose = getattr(self._source, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
+        if self._close is not None:
+            # Solta o que o `aclose` de um iterador nunca lido não alcança (ex: o perfil de saída)
+            try:
+                await self._close()
+            except Exception:
+                pass
+        async with self._cond:
+            self._cond.notify_all()
+        if self._on_finish is not None:
+            self._on_finish(self)
+
+    async def _read(self, consumer: _Consumer) -> Optional[list[bytes]]:
+        """
+        Próximos pedaços a partir da posição do consumidor. Retorna [] no fim
+        do stream e None se o consumidor ficou para trás do buffer.
+        """
+        async with self._cond:
+            while consumer.pos >= self._end and not self._done:
+                await self._cond.wait()
+            if consumer.pos < self._base:
+                return None
+            if consumer.pos >= self._end:
+                if isinstance(self._error, ConsumerDetachedError):
+                    # Leitor cancelado: o consumidor segue pelo `fallback`
+                    return None
+                if self._error is not None:
+                    raise self._error
+                return []
+            out = []
+            offset = self._base
+            for chunk in self._chunks:
+                chunk_end = offset + len(chunk)
+                if chunk_end > consumer.pos:
+                    out.append(chunk[consumer.pos - offset:] if offset < consumer.pos else chunk)
+                offset = chunk_end
+            return out
+
+    async def _advance(self, consumer: _Consumer, size: int):
+        async with self._cond:
+            consumer.pos += size
+            if self._base:
+                self._trim()
+            self._cond.notify_all()
+
+    def subscribe(self) -> AsyncIterator[bytes]:
+        """
+        Iterador de um novo consumidor. Ele só passa a contar na primeira
+        leitura (o primeiro dá a partida no leitor do upstream): um iterador
+        que ainda não leu não segura o leitor para os outros, mas impede que
+        ele seja cancelado quando os demais saem. Quem não for ler até o fim
+        fecha o iterador com `aclose`.
+        """
+        return _Subscription(self)
+
+    async def _abandon(self):
+        """Uma inscrição foi fechada sem ter lido nada."""
+        self._pending -= 1
+        await self._stop_if_unused()
+
+    async def _stop_if_unused(self):
+        if self._consumers or self._pending or self._done:
+            return
+        if self._task is None:
+            # Ninguém chegou a ler: fecha o upstream sem ter lido nada
+            self._error = ConsumerDetachedError("Broadcast sem consumidores")
+            await self._finish()
+        else:
+            # Ninguém mais ouvindo nem para começar: para de puxar o upstream
+            self._task.cancel()
+
+    async def _register(self, consumer: _Consumer):
+        async with self._cond:
+            self._pending -= 1
+            consumer.registered = True
+            self._consumers.add(consumer)
+            if self._task is None:
+                self._task = asyncio.ensure_future(self._produce())
+            self._cond.notify_all()
+
+    async def _consume(self, consumer: _Consumer) -> AsyncIterator[bytes]:
+        await self._register(consumer)
+        try:
+            while True:
+                chunks = await self._read(consumer)
+                if chunks is None:
+                    break
+                if not chunks:
+                    return
+                for chunk in chunks:
+                    yield chunk
+                    await self._advance(consumer, len(chunk))
+        finally:
+            await self._unsubscribe(consumer)
+
+        # Ficou para trás (ou o leitor parou): segue sozinho a partir do byte onde parou
+        self.detached += 1
+        if self._fallback is None:
+            raise ConsumerDetachedError("Cliente lento demais para acompanhar o stream compartilhado")
+        logger.info(f"Consumidor desligado do broadcast {self.key} no byte {consumer.pos}")
+        async with aclosing(self._fallback(consumer.pos)) as rest:
+            async for chunk in rest:
+                yield chunk
+
+    async def _unsubscribe(self, consumer: _Consumer):
+        async with self._cond:
+            self._consumers.discard(consumer)
+            self._cond.notify_all()
+        await self._stop_if_unused()
+
+
+class BroadcastHub:
+    """Registro dos broadcasts ativos, por chave (vídeo, formato)."""
+
+    def __init__(self, window: int = 4 * 1024 * 1024, read_ahead: int = 1024 * 1024):
+        self.window = window
+        self.read_ahead = read_ahead
+        self._active: dict[Hashable, Broadcast] = {}
+        self.started = 0
+        self.joined = 0
+
+    def join(self, key: Hashable) -> Optional[Broadcast]:
+        """Broadcast em andamento para a chave, se ainda for possível entrar nele."""
+        broadcast = self._active.get(key)
+        if broadcast is None or not broadcast.joinable:
+            return None
+        self.joined += 1
+        return broadcast
+
+    def publish(
+        self,
+        key: Hashable,
+        source: AsyncIterator[bytes],
+        headers: Optional[dict] = None,
+        fallback: Optional[Fallback] = None,
+        close: Optional[Closer] = None,
+    ) -> Broadcast:
+        """
+        Registra um broadcast para um upstream já aberto; a leitura começa na
+        primeira leitura de um `subscribe`. `close` roda quando o broadcast
+        termina, tenha o upstream sido lido ou não.
+        """
+        broadcast = Broadcast(
+            key, source, self.window, self.read_ahead, headers, fallback, on_finish=self._finished, close=close
+        )
+        self._active[key] = broadcast
+        self.started += 1
+        return broadcast
+
+    def _finished(self, broadcast: Broadcast):
+        if self._active.get(broadcast.key) is broadcast:
+            del self._active[broadcast.key]
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._active),
+            "consumers": sum(b.consumers for b in self._active.values()),
+            "started": self.started,
+            "joined": self.joined,
+        }
+
+
+@lru_cache()
+def get_broadcast_hub() -> BroadcastHub:
+    settings = get_settings()
+    return BroadcastHub(
+        window=settings.STREAM_BROADCAST_WINDOW,
+        read_ahead=settings.STREAM_BROADCAST_READ_AHEAD,
+    )
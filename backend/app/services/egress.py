@@ -0,0 +1,256 @@
+"""
+Egress Module.
+
+Identidades de rede para falar com o YouTube. Cada perfil combina proxy ou
+endereço de origem, alvo de impersonação (curl_cffi) e arquivo de cookies;
+`EGRESS_PROFILES` (JSON) define a lista e, vazio, há um perfil só
+('default': conexão direta, impersonando o Chrome), que é o comportamento de
+sempre.
+
+- extração: `fetch_info` empresta o perfil menos carregado (streams e
+  extrações em andamento, ponderados pela saúde) e grava o nome em cada
+  formato do `SlimInfo`. As URLs assinadas do googlevideo valem para o IP que as
+  obteve, então os streams daquele info saem pelo mesmo perfil. Listagens de
+  playlist (extração 'flat') também emprestam um perfil, e as páginas de uma
+  mesma listagem seguem por ele;
+- saúde: média móvel dos resultados. Um bloqueio ("Sign in"/bot, 429 do
+  upstream) põe o perfil em quarentena por `EGRESS_QUARANTINE` segundos,
+  dobrando a cada bloqueio seguido até `EGRESS_MAX_QUARANTINE`; na volta ele
+  recomeça com saúde pela metade. O último perfil disponível não entra em
+  quarentena: com um perfil só (ou todos os outros fora), quem segura as
+  extrações é o circuito do `AdaptiveThrottle`, como antes;
+- o subprocess do yt-dlp extrai de novo e pega o perfil menos carregado; o
+  ffmpeg e o proxy de mídia usam o perfil gravado em cada formato.
+
+A vazão de extração e de banda cresce com o número de perfis: cada um tem
+o seu pool de `YoutubeDL` e o seu cliente HTTP.
+
+O ffmpeg só aceita proxy HTTP (`-http_proxy`); endereço de origem e proxies
+SOCKS valem para extração, proxy de mídia e subprocess. Formatos extraídos
+por um perfil assim não vão para o ffmpeg (a conexão direta levaria 403 na
+URL assinada): o modo 'muxed' cai para o subprocess do yt-dlp e a conversão
+de áudio, para o formato original pelo proxy de mídia.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterator, Optional
+
+from loguru import logger
+
+from app.core.config import get_settings
+
+DEFAULT_PROFILE = "default"
+# Peso de cada resultado novo na média de saúde
+_SCORE_ALPHA = 0.2
+# Saúde mínima considerada na escolha (um perfil ruim ainda recebe um pouco)
+_MIN_SCORE = 0.05
+
+
+@dataclass(eq=False)
+class EgressProfile:
+    name: str
+    proxy: Optional[str] = None
+    source_address: Optional[str] = None
+    impersonate: Optional[str] = "chrome"  # None/'' = sem impersonação
+    cookies: Optional[str] = None  # Arquivo cookies.txt (formato Netscape)
+    in_flight: int = 0
+    score: float = 1.0
+    strikes: int = 0
+    quarantined_until: float = 0.0
+    last_used: float = 0.0
+    leases: int = 0
+    blocked: int = 0
+    failures: int = 0
+
+    @property
+    def routed(self) -> bool:
+        """Sai por proxy ou endereço próprio (senão, a conexão direta de sempre)."""
+        return bool(self.proxy or self.source_address)
+
+    def ydl_options(self) -> dict:
+        """Opções do `YoutubeDL` deste perfil (somadas às de `base_ydl_options`)."""
+        options = {}
+        if self.impersonate:
+            from yt_dlp.networking.impersonate import ImpersonateTarget
+
+            options['impersonate'] = ImpersonateTarget.from_str(self.impersonate)
+        else:
+            options['impersonate'] = None
+        if self.proxy:
+            options['proxy'] = self.proxy
+        if self.source_address:
+            options['source_address'] = self.source_address
+        if self.cookies:
+            options['cookiefile'] = self.cookies
+        return options
+
+    def cli_args(self) -> list[str]:
+        """Mesmas opções para o `python -m yt_dlp` do subprocess."""
+        args = []
+        if self.impersonate:
+            args += ["--impersonate", self.impersonate]
+        if self.proxy:
+            args += ["--proxy", self.proxy]
+        if self.source_address:
+            args += ["--source-address", self.source_address]
+        if self.cookies:
+            args += ["--cookies", self.cookies]
+        return args
+
+    def ffmpeg_args(self) -> list[str]:
+        """Opções de entrada do ffmpeg (só proxy HTTP é suportado)."""
+        if self.proxy and self.proxy.startswith("http://"):
+            return ["-http_proxy", self.proxy]
+        return []
+
+    @property
+    def ffmpeg_supported(self) -> bool:
+        """O ffmpeg consegue sair por este perfil (conexão direta ou proxy HTTP)."""
+        return not self.routed or bool(self.ffmpeg_args())
+
+
+class EgressPool:
+    """Perfis de saída com escolha pelo menos carregado, saúde e quarentena."""
+
+    def __init__(
+        self,
+        profiles: list[EgressProfile],
+        quarantine: float = 60.0,
+        max_quarantine: float = 900.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not profiles:
+            raise ValueError("Pelo menos um perfil de saída é necessário")
+        names = [profile.name for profile in profiles]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Nomes de perfil repetidos: {names}")
+        self.profiles = {profile.name: profile for profile in profiles}
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def get(self, name: Optional[str]) -> Optional[EgressProfile]:
+        return self.profiles.get(name) if name else None
+
+    def _available(self, profile: EgressProfile, now: float) -> bool:
+        if profile.quarantined_until and profile.quarantined_until <= now:
+            profile.quarantined_until = 0.0
+            profile.score = 0.5
+            logger.info(f"Perfil de saída '{profile.name}' saiu da quarentena")
+        return not profile.quarantined_until
+
+    def acquire(self) -> EgressProfile:
+        """
+        Perfil com menos uso em andamento por unidade de saúde; empate vai
+        para o usado há mais tempo. Sempre há um fora de quarentena.
+        """
+        with self._lock:
+            now = self._clock()
+            candidates = [p for p in self.profiles.values() if self._available(p, now)]
+            profile = min(
+                candidates,
+                key=lambda p: ((p.in_flight + 1) / max(p.score, _MIN_SCORE), p.last_used),
+            )
+            self._hold(profile, now)
+            return profile
+
+    def hold(self, name: Optional[str]) -> Optional[EgressProfile]:
+        """Conta um uso de um perfil específico (stream de um info já extraído)."""
+        with self._lock:
+            profile = self.profiles.get(name) if name else None
+            if profile is not None:
+                self._hold(profile, self._clock())
+            return profile
+
+    def _hold(self, profile: EgressProfile, now: float):
+        profile.in_flight += 1
+        profile.leases += 1
+        profile.last_used = now
+
+    def release(self, profile: EgressProfile, outcome: Optional[str] = "ok"):
+        """
+        Devolve o perfil. `outcome`: 'ok', 'blocked' (quarentena), 'error'
+        (só baixa a saúde) ou None (o resultado não diz nada sobre o perfil).
+        """
+        with self._lock:
+            profile.in_flight = max(profile.in_flight - 1, 0)
+            if outcome is not None:
+                self._report(profile, outcome)
+
+    def _report(self, profile: EgressProfile, outcome: str):
+        now = self._clock()
+        # Uma quarentena vencida acaba antes de contar o resultado novo
+        available = self._available(profile, now)
+        good = 1.0 if outcome == "ok" else 0.0
+        profile.score = profile.score * (1 - _SCORE_ALPHA) + good * _SCORE_ALPHA
+        if outcome == "ok":
+            profile.strikes = 0
+        elif outcome == "blocked":
+            profile.blocked += 1
+            others = any(p is not profile and self._available(p, now) for p in self.profiles.values())
+            # O último perfil disponível fica: aí quem segura é o circuito do rate_limit
+            if available and others:
+                delay = min(self.quarantine * 2 ** profile.strikes, self.max_quarantine)
+                profile.strikes += 1
+                profile.quarantined_until = now + delay
+                logger.warning(f"Perfil de saída '{profile.name}' bloqueado; quarentena de {delay:.0f}s")
+        else:
+            profile.failures += 1
+
+    @contextmanager
+    def lease(self) -> Iterator[EgressProfile]:
+        profile = self.acquire()
+        outcome = None
+        try:
+            yield profile
+            outcome = "ok"
+        finally:
+            self.release(profile, outcome)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            profiles = {
+                name: {
+                    "in_flight": p.in_flight,
+                    "score": round(p.score, 3),
+                    "quarantined_for": round(max(p.quarantined_until - now, 0.0), 1),
+                    "leases": p.leases,
+                    "blocked": p.blocked,
+                    "failures": p.failures,
+                }
+                for name, p in self.profiles.items()
+            }
+        return {
+            "profiles": len(profiles),
+            "quarantined": sum(1 for p in profiles.values() if p["quarantined_for"] > 0),
+            "in_flight": sum(p["in_flight"] for p in profiles.values()),
+            "by_profile": profiles,
+        }
+
+
+def parse_profiles(raw: list[dict]) -> list[EgressProfile]:
+    """Perfis do `EGRESS_PROFILES`; nomes faltando viram 'egress-<n>'."""
+    fields = {"name", "proxy", "source_address", "impersonate", "cookies"}
+    profiles = []
+    for i, entry in enumerate(raw):
+        unknown = set(entry) - fields
+        if unknown:
+            raise ValueError(f"Campos desconhecidos no perfil de saída {i}: {sorted(unknown)}")
+        profiles.append(EgressProfile(**{"name": f"egress-{i}", **entry}))
+    return profiles
+
+
+@lru_cache()
+def get_egress_pool() -> EgressPool:
+    settings = get_settings()
+    profiles = parse_profiles(settings.EGRESS_PROFILES) or [EgressProfile(DEFAULT_PROFILE)]
+    return EgressPool(
+        profiles,
+        quarantine=settings.EGRESS_QUARANTINE,
+        max_quarantine=settings.EGRESS_MAX_QUARANTINE,
+    )
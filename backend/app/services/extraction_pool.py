@@ -0,0 +1,161 @@
+"""
+Extraction Pool Module.
+
+Executa as chamadas síncronas do yt-dlp fora do event loop, em um pool de
+threads (ou processos) com limite de concorrência, backpressure por
+profundidade de fila e timeout por extração.
+"""
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Optional
+
+from loguru import logger
+
+from app.core.config import get_settings
+from app.services.shared_state import SharedSlots, get_shared_slots
+
+
+class PoolSaturatedError(Exception):
+    """O pool está cheio (workers ocupados e fila no limite)."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Servidor ocupado processando outros vídeos. Tente novamente em instantes.")
+        self.retry_after = retry_after
+
+
+class ExtractionTimeoutError(Exception):
+    """A extração passou do tempo limite configurado."""
+
+
+class ExtractionPool:
+    """
+    Pool limitado para extrações bloqueantes.
+
+    `max_workers` extrações rodam ao mesmo tempo e até `max_queue` ficam
+    aguardando. Acima disso, `run` falha imediatamente com `PoolSaturatedError`
+    em vez de enfileirar sem limite.
+
+    Com `shared` (vários workers), cada extração também ocupa uma vaga global
+    enquanto roda, então `max_workers` vale para o servidor todo.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_queue: int = 16,
+        timeout: float = 30.0,
+        retry_after: int = 5,
+        kind: str = "thread",
+        shared: Optional[SharedSlots] = None,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Tipo de executor inválido: {kind}")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.kind = kind
+        self.shared = shared
+        self._executor: Executor | None = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings) -> "ExtractionPool":
+        return cls(
+            max_workers=settings.EXTRACTION_MAX_WORKERS,
+            max_queue=settings.EXTRACTION_MAX_QUEUE,
+            timeout=settings.EXTRACTION_TIMEOUT,
+            retry_after=settings.EXTRACTION_RETRY_AFTER,
+            kind=settings.EXTRACTION_EXECUTOR,
+            shared=get_shared_slots("extraction", settings.EXTRACTION_MAX_WORKERS),
+        )
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def pending(self) -> int:
+        """Extrações em execução ou na fila (inclui as que já estouraram o timeout mas ainda rodam)."""
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="ytdlp-extract",
+                )
+        return self._executor
+
+    def _release(self, slot: Optional[int] = None, _future=None):
+        with self._lock:
+            self._pending -= 1
+        if slot is not None:
+            self.shared.release(slot)
+
+    async def run(self, fn, *args):
+        """
+        Executa `fn(*args)` no pool e aguarda o resultado sem bloquear o loop.
+
+        Raises:
+            PoolSaturatedError: se não houver vaga nem na fila.
+            ExtractionTimeoutError: se a extração exceder `timeout` segundos.
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise PoolSaturatedError(self.retry_after)
+            self._pending += 1
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        slot = None
+        try:
+            if self.shared is not None:
+                # Vaga global: espera outro worker terminar, dentro do mesmo timeout
+                slot = await asyncio.wait_for(self.shared.acquire(), timeout=self.timeout)
+            future = self._get_executor().submit(fn, *args)
+        except asyncio.TimeoutError:
+            self._release(slot)
+            logger.warning(f"Sem vaga global de extração em {self.timeout}s")
+            raise ExtractionTimeoutError(
+                f"Tempo limite de {self.timeout:.0f}s excedido ao obter o vídeo."
+            ) from None
+        except BaseException:
+            self._release(slot)
+            raise
+        # A vaga só é liberada quando o worker realmente termina, mesmo que o
+        # chamador já tenha desistido por timeout. Assim o limite é real.
+        future.add_done_callback(partial(self._release, slot))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            logger.warning(f"Extração excedeu {self.timeout}s; liberando o cliente")
+            raise ExtractionTimeoutError(
+                f"Tempo limite de {self.timeout:.0f}s excedido ao obter o vídeo."
+            ) from None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+@lru_cache()
+def get_extraction_pool() -> ExtractionPool:
+    return ExtractionPool.from_settings(get_settings())
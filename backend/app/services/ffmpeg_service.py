@@ -0,0 +1,246 @@
+"""
+FFmpeg Service Module.
+
+Processamento de mídia no servidor com o `ffmpeg` da imagem Docker: junta
+vídeo e áudio (stream copy, sem re-encode) em MP4 fragmentado e converte
+áudio para mp3/opus, entregando a saída progressivamente por um pipe.
+"""
+import asyncio
+import os
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+
+from app.core.config import get_settings
+from app.services.egress import get_egress_pool
+from app.services.extraction_pool import PoolSaturatedError
+from app.services.process_supervisor import ProcessFailedError, get_process_supervisor
+from app.services.shared_state import SharedSlots, get_shared_slots
+
+# MP4 "streamável": moov vazio no início e fragmentos a cada keyframe, para o
+# cliente poder começar a gravar/tocar antes do fim do processamento.
+FRAGMENTED_MP4_FLAGS = "frag_keyframe+empty_moov+default_base_moof"
+
+
+class FfmpegError(Exception):
+    """O ffmpeg terminou com erro depois de já ter começado a gerar saída."""
+
+
+@dataclass(frozen=True)
+class AudioCodec:
+    encoder: str
+    muxer: str
+    media_type: str
+    ext: str
+    default_bitrate: int  # kbps
+
+
+AUDIO_CODECS = {
+    "mp3": AudioCodec("libmp3lame", "mp3", "audio/mpeg", "mp3", 192),
+    "opus": AudioCodec("libopus", "ogg", "audio/ogg", "opus", 128),
+}
+
+
+class ProcessTicket:
+    """Lugar na fila reservado por `ProcessLimiter.reserve` e usado por `slot`."""
+
+    def __init__(self, limiter: "ProcessLimiter", position: int):
+        self.limiter = limiter
+        self.position = position
+        self.active = True
+
+    def release(self):
+        """Devolve a reserva (o processo nunca chegou a pedir vaga); idempotente."""
+        if self.active:
+            self.active = False
+            self.limiter.reserved -= 1
+
+    async def aclose(self):
+        self.release()
+
+
+class ProcessLimiter:
+    """
+    Limite de processos ffmpeg simultâneos.
+
+    `max_processes` rodam ao mesmo tempo e até `max_queue` esperam por uma vaga,
+    em ordem de chegada. `reserve` admite (ou recusa de imediato, antes de
+    mandar headers) e já ocupa o lugar na fila, para uma rajada de pedidos não
+    passar toda pela mesma checagem; o limite real é garantido por `slot`, que
+    consome a reserva. Um stream que nunca chega a rodar devolve a reserva com
+    `ProcessTicket.release`.
+
+    Com `shared` (vários workers), o processo também precisa de uma vaga
+    global, então `max_processes` vale para o servidor todo; a fila continua
+    por worker.
+    """
+
+    def __init__(self, max_processes: int, max_queue: int, retry_after: int = 5, shared: Optional[SharedSlots] = None):
+        self.max_processes = max_processes
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.shared = shared
+        self._semaphore = asyncio.Semaphore(max_processes)
+        self.running = 0
+        self.waiting = 0
+        self.reserved = 0  # Admitidos por `reserve` que ainda não pediram vaga
+
+    def reserve(self) -> ProcessTicket:
+        """
+        Reserva o lugar de um novo processo; `position` é quantos estão na
+        frente dele na fila (0: roda de imediato).
+
+        Raises:
+            PoolSaturatedError: se todas as vagas e a fila estiverem ocupadas.
+        """
+        occupied = self.running + self.waiting + self.reserved
+        position = 0
+        if occupied >= self.max_processes:
+            queued = occupied - self.max_processes
+            if queued >= self.max_queue:
+                raise PoolSaturatedError(self.retry_after)
+            position = queued + 1
+        self.reserved += 1
+        return ProcessTicket(self, position)
+
+    @asynccontextmanager
+    async def slot(self, ticket: Optional[ProcessTicket] = None):
+        shared_slot = None
+        if ticket is not None:
+            ticket.release()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+            if self.shared is not None:
+                try:
+                    shared_slot = await self.shared.acquire()
+                except BaseException:
+                    self._semaphore.release()
+                    raise
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            if shared_slot is not None:
+                self.shared.release(shared_slot)
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "reserved": self.reserved,
+            "max_processes": self.max_processes,
+            "max_queue": self.max_queue,
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+
+def _headers_arg(fmt: dict) -> list[str]:
+    """`-headers` do ffmpeg com os http_headers que o yt-dlp exige para a URL do formato."""
+    headers = fmt.get('http_headers') or {}
+    if not headers:
+        return []
+    return ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+
+
+def _input_args(fmt: dict) -> list[str]:
+    """Opções de entrada de um formato: headers e o proxy do perfil de saída que o extraiu."""
+    profile = get_egress_pool().get(fmt.get('egress'))
+    egress = profile.ffmpeg_args() if profile is not None else []
+    return [*egress, *_headers_arg(fmt)]
+
+
+def ffmpeg_can_fetch(fmt: dict) -> bool:
+    """O ffmpeg consegue baixar o formato pelo perfil de saída que o extraiu."""
+    profile = get_egress_pool().get(fmt.get('egress'))
+    return profile is None or profile.ffmpeg_supported
+
+
+class FfmpegService:
+    @staticmethod
+    def mux_command(video_fmt: dict, audio_fmt: dict) -> list[str]:
+        """Comando que junta vídeo e áudio sem re-encode em MP4 fragmentado no stdout."""
+        settings = get_settings()
+        return [
+            settings.FFMPEG_PATH,
+            "-hide_banner", "-nostdin", "-loglevel", "error",
+            *_input_args(video_fmt), "-i", video_fmt['url'],
+            *_input_args(audio_fmt), "-i", audio_fmt['url'],
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c", "copy",
+            "-movflags", FRAGMENTED_MP4_FLAGS,
+            "-f", "mp4", "pipe:1",
+        ]
+
+    @staticmethod
+    def transcode_command(audio_fmt: dict, codec: str, bitrate: int) -> list[str]:
+        """Comando que converte a faixa de áudio para `codec` a `bitrate` kbps no stdout."""
+        settings = get_settings()
+        spec = AUDIO_CODECS[codec]
+        return [
+            settings.FFMPEG_PATH,
+            "-hide_banner", "-nostdin", "-loglevel", "error",
+            *_input_args(audio_fmt), "-i", audio_fmt['url'],
+            "-map", "0:a:0", "-vn",
+            # Uma thread por conversão: o limite de processos já divide os núcleos
+            "-threads", "1",
+            "-c:a", spec.encoder, "-b:a", f"{bitrate}k",
+            "-f", spec.muxer, "pipe:1",
+        ]
+
+    @staticmethod
+    async def stream(
+        cmd: list[str],
+        limiter: Optional[ProcessLimiter] = None,
+        ticket: Optional[ProcessTicket] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Roda o ffmpeg (esperando vaga no `limiter`, com a reserva `ticket` se
+        já houver uma) e gera o stdout em pedaços.
+
+        O processo fica a cargo do `ProcessSupervisor`: é encerrado se o
+        cliente desconectar no meio ou se passar dos timeouts.
+
+        Raises:
+            FfmpegError: se o ffmpeg sair com erro (a saída gerada está incompleta).
+        """
+        limiter = limiter or get_ffmpeg_limiter()
+        async with limiter.slot(ticket):
+            logger.info(f"Iniciando ffmpeg: {' '.join(cmd[:4])} ...")
+            try:
+                async with aclosing(get_process_supervisor().stream(cmd, "ffmpeg")) as body:
+                    async for chunk in body:
+                        yield chunk
+            except ProcessFailedError as e:
+                raise FfmpegError(str(e)) from e
+
+
+@lru_cache()
+def get_ffmpeg_limiter() -> ProcessLimiter:
+    settings = get_settings()
+    return ProcessLimiter(
+        max_processes=settings.FFMPEG_MAX_PROCESSES,
+        max_queue=settings.FFMPEG_MAX_QUEUE,
+        retry_after=settings.EXTRACTION_RETRY_AFTER,
+        shared=get_shared_slots("ffmpeg", settings.FFMPEG_MAX_PROCESSES),
+    )
+
+
+@lru_cache()
+def get_transcode_limiter() -> ProcessLimiter:
+    """Fila das conversões de áudio: por padrão, uma por núcleo de CPU."""
+    settings = get_settings()
+    max_processes = settings.TRANSCODE_MAX_PROCESSES or os.cpu_count() or 1
+    return ProcessLimiter(
+        max_processes=max_processes,
+        max_queue=settings.TRANSCODE_MAX_QUEUE,
+        retry_after=settings.EXTRACTION_RETRY_AFTER,
+        shared=get_shared_slots("transcode", max_processes),
+    )
@@ -0,0 +1,128 @@
+"""
+Format Index Module.
+
+Índice compacto dos formatos de um vídeo, montado uma única vez por extração
+(numa só passada pela lista de formatos) e guardado no cache junto com o
+info dict.
+
+Responde direto, sem reler a lista de formatos:
+- `qualities` e `audio_filesize` do `/info`;
+- qual `format_id` exato servir para (modo, qualidade, codec preferido),
+  em vez de montar um seletor (`bestvideo[height=N]`) para o yt-dlp
+  percorrer os formatos de novo.
+"""
+from typing import Optional
+
+# Famílias de codec de vídeo aceitas como preferência
+VIDEO_CODECS = ("avc1", "vp9", "av01")
+
+
+def codec_family(vcodec: Optional[str]) -> Optional[str]:
+    """'avc1.64001F' -> 'avc1', 'vp09.00.40.08' -> 'vp9', 'av01.0.08M.08' -> 'av01'."""
+    if not vcodec or vcodec == 'none':
+        return None
+    family = vcodec.split('.')[0].lower()
+    return 'vp9' if family in ('vp09', 'vp9') else family
+
+
+class FormatIndex:
+    """
+    Os formatos do yt-dlp vêm do pior para o melhor; cada lista do índice
+    mantém essa ordem, então o último item é o que um seletor `best*`
+    escolheria.
+    """
+
+    __slots__ = ("video", "video_by_height", "audio_m4a", "qualities", "audio_filesize", "positions")
+
+    def __init__(self):
+        self.video: list[tuple[str, Optional[str]]] = []  # (format_id, família do codec), só vídeo
+        self.video_by_height: dict[int, list[tuple[str, Optional[str]]]] = {}
+        self.audio_m4a: list[str] = []
+        self.qualities: list[dict] = []
+        self.audio_filesize = 0
+        self.positions: dict[str, int] = {}  # format_id -> posição em info['formats']
+
+    @classmethod
+    def build(cls, formats: Optional[list]) -> "FormatIndex":
+        index = cls()
+        unique_qualities: dict[int, dict] = {}
+        best_audio_size = 0
+
+        for position, f in enumerate(formats or []):
+            format_id = f.get('format_id')
+            height = f.get('height')
+            vcodec = f.get('vcodec')
+            acodec = f.get('acodec')
+            filesize = f.get('filesize') or f.get('filesize_approx') or 0
+            ext = f.get('ext')
+            if format_id is not None:
+                index.positions[format_id] = position
+
+            # Qualidades do /info: primeiro formato de cada altura, trocado por
+            # um com tamanho conhecido se o primeiro não tinha
+            if height and isinstance(height, int) and height > 0:
+                if vcodec is None or vcodec != 'none':
+                    current = unique_qualities.get(height)
+                    if not current or (filesize > 0 and current['filesize'] == 0):
+                        unique_qualities[height] = {
+                            'height': height,
+                            'filesize': filesize,
+                            'format_id': format_id,
+                        }
+
+            # Tamanho do áudio: maior m4a; outro container só como estimativa
+            if vcodec == 'none' and acodec != 'none' and filesize > 0:
+                if ext == 'm4a':
+                    if filesize > best_audio_size:
+                        best_audio_size = filesize
+                elif best_audio_size == 0:
+                    best_audio_size = filesize
+
+            if format_id is None:
+                continue
+            if vcodec == 'none' and acodec not in (None, 'none') and ext == 'm4a':
+                index.audio_m4a.append(format_id)
+            elif vcodec not in (None, 'none') and acodec in (None, 'none'):
+                entry = (format_id, codec_family(vcodec))
+                index.video.append(entry)
+                if isinstance(height, int):
+                    index.video_by_height.setdefault(height, []).append(entry)
+
+        index.qualities = [unique_qualities[h] for h in sorted(unique_qualities, reverse=True)]
+        index.audio_filesize = best_audio_size
+        return index
+
+    def select(self, mode: str, quality: Optional[int] = None, video_codec: Optional[str] = None) -> Optional[str]:
+        """
+        `format_id` equivalente aos seletores do modo subprocess:
+
+        - audio: `bestaudio[ext=m4a]`
+        - video: `bestvideo[height=N]` ou `bestvideo`; com `video_codec`, o
+          melhor daquele codec se existir, senão o melhor de qualquer codec.
+        """
+        if mode == 'audio':
+            return self.audio_m4a[-1] if self.audio_m4a else None
+        candidates = self.video_by_height.get(quality, []) if quality else self.video
+        if not candidates:
+            return None
+        if video_codec:
+            for format_id, family in reversed(candidates):
+                if family == video_codec:
+                    return format_id
+        return candidates[-1][0]
+
+    def get(self, info: dict, format_id: Optional[str]) -> Optional[dict]:
+        """Dict completo do formato (com URL e headers) a partir do `format_id`."""
+        position = self.positions.get(format_id) if format_id is not None else None
+        if position is None:
+            return None
+        formats = info.get('formats') or []
+        return formats[position] if position < len(formats) else None
+
+
+def format_index(info: dict) -> FormatIndex:
+    """Índice guardado com o info (montado no `get_info`), ou montado agora."""
+    index = info.get('format_index')
+    if not isinstance(index, FormatIndex):
+        index = FormatIndex.build(info.get('formats'))
+    return index
@@ -0,0 +1,308 @@
+"""
+Info Cache Module.
+
+Cache de metadados do `/info`, indexado pelo ID canônico do vídeo para que
+variações da mesma URL (`youtu.be/X`, `watch?v=X&t=10`, `m.youtube.com`...)
+caiam na mesma entrada.
+
+O backend padrão é em memória (LRU com TTL). Com vários workers, o backend
+'sqlite' guarda as entradas num arquivo local compartilhado, para que um
+vídeo extraído por um worker seja hit em todos. Outros backends (ex: Redis)
+só precisam implementar `InfoCacheBackend`.
+"""
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+from app.core.config import get_settings
+
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_YOUTUBE_HOSTS = {
+    "youtube.com",
+    "www.youtube.com",
+    "m.youtube.com",
+    "music.youtube.com",
+    "youtube-nocookie.com",
+    "www.youtube-nocookie.com",
+}
+_PATH_PREFIXES = ("shorts", "embed", "live", "v", "e")
+
+
+def canonical_video_id(url: str) -> Optional[str]:
+    """Extrai o ID de 11 caracteres de uma URL do YouTube, ou None se não reconhecer."""
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None
+    host = (parsed.hostname or "").lower()
+    candidate = None
+
+    if host in ("youtu.be", "www.youtu.be"):
+        candidate = parsed.path.lstrip("/").split("/")[0]
+    elif host in _YOUTUBE_HOSTS:
+        parts = [p for p in parsed.path.split("/") if p]
+        if parts[:1] == ["watch"]:
+            candidate = (parse_qs(parsed.query).get("v") or [None])[0]
+        elif len(parts) >= 2 and parts[0] in _PATH_PREFIXES:
+            candidate = parts[1]
+
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def is_playlist_url(url: str) -> bool:
+    """URL do YouTube de playlist/canal (sem vídeo específico), que vira uma lista de vídeos."""
+    if canonical_video_id(url):
+        return False
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return False
+    if (parsed.hostname or "").lower() not in _YOUTUBE_HOSTS:
+        return False
+    parts = [p for p in parsed.path.split("/") if p]
+    if "list" in parse_qs(parsed.query):
+        return True
+    return bool(parts) and (parts[0] in ("playlist", "channel", "c", "user") or parts[0].startswith("@"))
+
+
+def cache_key(url: str) -> str:
+    """Chave de cache: ID canônico quando for YouTube, senão a própria URL."""
+    video_id = canonical_video_id(url)
+    if video_id:
+        return f"yt:{video_id}"
+    return f"url:{url.strip()}"
+
+
+def signed_url_expiry(info: dict) -> Optional[float]:
+    """
+    Menor timestamp `expire=` entre as URLs assinadas dos formatos.
+
+    As URLs do googlevideo param de funcionar depois disso, então não faz
+    sentido servir a entrada do cache além desse ponto.
+    """
+    earliest = None
+    for f in info.get("formats") or []:
+        url = f.get("url")
+        if not url or "expire=" not in url:
+            continue
+        values = parse_qs(urlparse(url).query).get("expire")
+        if not values:
+            continue
+        try:
+            expire = float(values[0])
+        except ValueError:
+            continue
+        if earliest is None or expire < earliest:
+            earliest = expire
+    return earliest
+
+
+def info_ttl(info: dict, default_ttl: float, margin: float, now: Optional[float] = None) -> float:
+    """TTL efetivo: o configurado, limitado pela expiração das URLs assinadas menos a margem."""
+    now = time.time() if now is None else now
+    ttl = default_ttl
+    expire = signed_url_expiry(info)
+    if expire is not None:
+        ttl = min(ttl, expire - margin - now)
+    return max(ttl, 0.0)
+
+
+class InfoCacheBackend(ABC):
+    """Interface dos backends de cache de metadados."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class MemoryInfoCache(InfoCacheBackend):
+    """LRU em memória com TTL por entrada e contadores de hit/miss/eviction."""
+
+    def __init__(self, max_entries: int = 512, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SqliteInfoCache(InfoCacheBackend):
+    """
+    Cache em SQLite (WAL) compartilhado pelos workers da máquina.
+
+    Os valores (`SlimInfo`, com o índice de formatos) são gravados com pickle;
+    o arquivo fica num diretório privado do servidor. TTL em tempo de parede
+    (comum a todos os processos) e remoção LRU pelo último acesso. Hits e
+    misses são contados por processo.
+    """
+
+    def __init__(self, path: str, max_entries: int = 512, clock=time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self._clock = clock
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS info ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        # Uma conexão por thread (o /info roda no pool de extração e no event loop)
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str) -> Optional[Any]:
+        db = self._db()
+        row = db.execute("SELECT value, expires_at FROM info WHERE key = ?", (key,)).fetchone()
+        now = self._clock()
+        if row is None:
+            self.misses += 1
+            return None
+        value, expires_at = row
+        if expires_at <= now:
+            db.execute("DELETE FROM info WHERE key = ? AND expires_at <= ?", (key, now))
+            self.expirations += 1
+            self.misses += 1
+            return None
+        db.execute("UPDATE info SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return pickle.loads(value)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        now = self._clock()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO info (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, blob, now + ttl, now),
+        )
+        excess = db.execute("SELECT COUNT(*) FROM info").fetchone()[0] - self.max_entries
+        if excess > 0:
+            db.execute(
+                "DELETE FROM info WHERE key IN (SELECT key FROM info ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+
+    def delete(self, key: str) -> None:
+        self._db().execute("DELETE FROM info WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._db().execute("DELETE FROM info")
+
+    def __len__(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM info").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {
+            "backend": "sqlite",
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+@lru_cache()
+def get_info_cache() -> InfoCacheBackend:
+    settings = get_settings()
+    if settings.INFO_CACHE_BACKEND == "memory":
+        return MemoryInfoCache(max_entries=settings.INFO_CACHE_MAX_ENTRIES)
+    if settings.INFO_CACHE_BACKEND == "sqlite":
+        path = settings.INFO_CACHE_PATH or os.path.join(
+            settings.SHARED_STATE_DIR or settings.DOWNLOAD_DIR, "info-cache.sqlite3"
+        )
+        return SqliteInfoCache(path, max_entries=settings.INFO_CACHE_MAX_ENTRIES)
+    raise ValueError(f"Backend de cache desconhecido: {settings.INFO_CACHE_BACKEND}")
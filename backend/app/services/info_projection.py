@@ -0,0 +1,78 @@
+"""
+Info Projection Module.
+
+O info dict completo do yt-dlp (thumbnails, legendas, heatmap, capítulos,
+dezenas de formatos com todos os campos) costuma passar de centenas de KB.
+O backend só usa os campos do `VideoInfo` e, para streaming, alguns campos
+de cada formato. `project_info` monta essa projeção compacta logo depois da
+extração, e é ela que fica no cache; o dict bruto é descartado.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from app.services.format_index import FormatIndex, format_index
+
+# Campos de cada formato usados para escolher e repassar o stream
+STREAM_FORMAT_KEYS = (
+    'format_id', 'url', 'ext', 'vcodec', 'acodec', 'height',
+    'filesize', 'protocol', 'http_headers', 'downloader_options',
+)
+
+
+def slim_format(fmt: dict, egress: Optional[str] = None) -> dict:
+    slim = {key: fmt[key] for key in STREAM_FORMAT_KEYS if fmt.get(key) is not None}
+    if fmt.get('fragments'):
+        # `is_proxyable` só precisa saber que o formato é fragmentado
+        slim['fragments'] = True
+    if egress:
+        # A URL assinada vale para o IP que a obteve: o stream sai pelo mesmo perfil
+        slim['egress'] = egress
+    return slim
+
+
+@dataclass(slots=True)
+class SlimInfo:
+    """Projeção do info dict: metadados do `/info` e formatos para streaming."""
+    id: Optional[str]
+    title: Optional[str]
+    thumbnail: Optional[str]
+    duration: Optional[float]
+    uploader: Optional[str]
+    view_count: Optional[int]
+    webpage_url: Optional[str]
+    qualities: list = field(default_factory=list)
+    audio_filesize: int = 0
+    # Mesma ordem dos formatos originais: as posições do índice continuam valendo
+    formats: list = field(default_factory=list)
+    format_index: Optional[FormatIndex] = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Leitura no estilo do info dict, para o código que recebe um ou outro."""
+        if key not in SlimInfo.__slots__:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+
+def project_info(info, egress: Optional[str] = None) -> SlimInfo:
+    """
+    Projeção compacta do info dict do yt-dlp (idempotente para `SlimInfo`).
+
+    `egress` é o perfil de saída que fez a extração; fica em cada formato.
+    """
+    if isinstance(info, SlimInfo):
+        return info
+    index = format_index(info)
+    return SlimInfo(
+        id=info.get('id'),
+        title=info.get('title'),
+        thumbnail=info.get('thumbnail'),
+        duration=info.get('duration'),
+        uploader=info.get('uploader'),
+        view_count=info.get('view_count'),
+        webpage_url=info.get('webpage_url'),
+        qualities=info.get('qualities', index.qualities),
+        audio_filesize=info.get('audio_filesize', index.audio_filesize),
+        formats=[slim_format(f, egress) for f in info.get('formats') or []],
+        format_index=index,
+    )
@@ -0,0 +1,607 @@
+"""
+Jobs Module.
+
+Downloads assíncronos: em vez de segurar a conexão do `/stream`, o app cria
+um job (`POST /jobs`), acompanha o progresso por SSE ou WebSocket e, no fim,
+baixa o arquivo pronto com Range.
+
+- um número fixo de workers (`JOBS_MAX_WORKERS`) roda os jobs, então um pico
+  de pedidos vira fila em vez de dezenas de subprocessos ao mesmo tempo;
+- a fila é por prioridade ('high' > 'normal' > 'low') e, dentro de cada
+  prioridade, alterna entre clientes (round-robin): quem enfileirou 50 jobs
+  não passa na frente de quem enfileirou um;
+- cada job usa o mesmo caminho do `/stream` (`YtDlpService.open_stream`:
+  proxy, subprocess, ffmpeg, cache de mídia) e grava o resultado em
+  `DOWNLOAD_DIR/jobs/`;
+- jobs terminados e seus arquivos somem depois de `JOBS_TTL` segundos.
+
+O estado fica em memória, no processo que recebeu o job. Com vários workers
+(`SHARED_STATE_DIR`, ver `app/server.py`), cada job também é gravado como
+`<id>.json` ao lado do arquivo, então qualquer worker responde status,
+eventos e artifact; cancelar ou apagar um job de outro worker deixa um
+marcador `<id>.cancel` que o dono aplica na próxima vez que olhar a fila. A
+fila e os limites de `submit` continuam por worker.
+"""
+import asyncio
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from loguru import logger
+
+from app.core.config import get_settings
+from app.services.extraction_pool import PoolSaturatedError
+from app.services.shared_state import shared_state_dir
+from app.services.ytdlp_service import YtDlpService
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+TERMINAL_STATES = ("completed", "failed", "cancelled")
+
+# Intervalo mínimo entre eventos de progresso de um job
+_PROGRESS_INTERVAL = 0.5
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+# Campos do registro compartilhado além do snapshot
+_RECORD_EXTRA = ("client", "path", "media_type")
+
+
+class ClientJobLimitError(Exception):
+    """O cliente já tem o máximo de jobs ativos."""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Limite de {limit} downloads ativos por cliente atingido.")
+        self.limit = limit
+
+
+class _Listener:
+    """Assinante de eventos: guarda só o estado mais recente do job."""
+
+    def __init__(self):
+        self.snapshot: Optional[dict] = None
+        self.changed = asyncio.Event()
+
+    def push(self, snapshot: dict):
+        self.snapshot = snapshot
+        self.changed.set()
+
+
+@dataclass(eq=False)
+class Job:
+    id: str
+    client: str
+    url: str
+    mode: str = "video"
+    quality: Optional[int] = None
+    codec: Optional[str] = None
+    bitrate: Optional[int] = None
+    video_codec: Optional[str] = None
+    priority: str = "normal"
+    state: str = "queued"  # queued, running, completed, failed, cancelled
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    bytes_done: int = 0
+    total_bytes: Optional[int] = None
+    error: Optional[str] = None
+    media_type: Optional[str] = None
+    filename: Optional[str] = None
+    path: Optional[str] = None
+    position: Optional[int] = None  # Posição na fila (1 = próximo), só enquanto 'queued'
+    last_report: float = field(default=0.0, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    listeners: list = field(default_factory=list, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    def snapshot(self) -> dict:
+        progress = None
+        if self.state == "completed":
+            progress = 1.0
+        elif self.total_bytes:
+            progress = min(self.bytes_done / self.total_bytes, 1.0)
+        return {
+            "id": self.id,
+            "state": self.state,
+            "url": self.url,
+            "mode": self.mode,
+            "quality": self.quality,
+            "priority": self.priority,
+            "position": self.position if self.state == "queued" else None,
+            "bytes_done": self.bytes_done,
+            "total_bytes": self.total_bytes,
+            "progress": progress,
+            "error": self.error,
+            "filename": self.filename,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobScheduler:
+    """
+    Fila de jobs com prioridade e justiça entre clientes, e os workers que a
+    consomem.
+
+    `run` executa um job (baixa e grava em `job.path`, atualizando
+    `bytes_done` via `report`). Se ele falhar com `PoolSaturatedError` (ffmpeg
+    ou extração sem vaga), o job volta para a frente da fila do cliente e o
+    worker espera o `retry_after` antes de pegar o próximo.
+    """
+
+    def __init__(
+        self,
+        run: Callable[["JobScheduler", Job], Awaitable[None]],
+        directory: str,
+        max_workers: int = 2,
+        max_queue: int = 64,
+        max_per_client: int = 8,
+        ttl: float = 3600.0,
+        retry_after: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+        shared: bool = False,
+    ):
+        self._run = run
+        self.shared = shared
+        self.directory = directory
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._clock = clock
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # prioridade -> cliente -> jobs na ordem de chegada; a ordem dos
+        # clientes é a vez de cada um (quem foi servido vai para o fim)
+        self._queues: dict[int, "OrderedDict[str, deque[Job]]"] = {p: OrderedDict() for p in PRIORITIES.values()}
+        self._expires: dict[str, float] = {}
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._workers: list[asyncio.Task] = []
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.requeued = 0
+
+    # Fila
+
+    @property
+    def queued(self) -> int:
+        return sum(len(jobs) for queue in self._queues.values() for jobs in queue.values())
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.state == "running")
+
+    def _enqueue(self, job: Job, front: bool = False):
+        queue = self._queues[PRIORITIES[job.priority]]
+        jobs = queue.get(job.client)
+        if jobs is None:
+            jobs = queue[job.client] = deque()
+        if front:
+            jobs.appendleft(job)
+            queue.move_to_end(job.client, last=False)
+        else:
+            jobs.append(job)
+
+    def _unqueue(self, job: Job):
+        queue = self._queues[PRIORITIES[job.priority]]
+        jobs = queue.get(job.client)
+        if jobs is not None and job in jobs:
+            jobs.remove(job)
+            if not jobs:
+                del queue[job.client]
+
+    def _dequeue(self) -> Optional[Job]:
+        for level in sorted(self._queues):
+            queue = self._queues[level]
+            if queue:
+                client, jobs = queue.popitem(last=False)
+                job = jobs.popleft()
+                if jobs:
+                    queue[client] = jobs
+                return job
+        return None
+
+    def _order(self) -> list[Job]:
+        """Jobs na fila, na ordem em que serão despachados."""
+        order = []
+        for level in sorted(self._queues):
+            lanes = [list(jobs) for jobs in self._queues[level].values()]
+            for i in range(max((len(lane) for lane in lanes), default=0)):
+                order.extend(lane[i] for lane in lanes if i < len(lane))
+        return order
+
+    def _update_positions(self):
+        for position, job in enumerate(self._order(), start=1):
+            if job.position != position:
+                job.position = position
+                self._publish(job)
+
+    # API
+
+    def submit(self, client: str, url: str, priority: str = "normal", **params) -> Job:
+        """
+        Enfileira um download.
+
+        Raises:
+            ClientJobLimitError: se o cliente já tem `max_per_client` jobs ativos.
+            PoolSaturatedError: se a fila geral estiver cheia.
+        """
+        self._expire()
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridade inválida: {priority}")
+        active = sum(1 for job in self._jobs.values() if job.client == client and not job.finished)
+        if active >= self.max_per_client:
+            raise ClientJobLimitError(self.max_per_client)
+        if self.queued >= self.max_queue:
+            raise PoolSaturatedError(self.retry_after)
+
+        job = Job(id=uuid.uuid4().hex, client=client, url=url, priority=priority, **params)
+        self._jobs[job.id] = job
+        self._enqueue(job)
+        self.submitted += 1
+        self._ensure_workers()
+        self._update_positions()
+        self._ready.release()
+        logger.info(f"Job {job.id} na fila ({priority}, posição {job.position}): {url}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self._jobs.get(job_id) or self._read_record(job_id)
+
+    def list(self, client: str) -> list[Job]:
+        self._expire()
+        jobs = [job for job in self._jobs.values() if job.client == client]
+        if self.shared:
+            for job_id in self._record_ids():
+                if job_id not in self._jobs:
+                    job = self._read_record(job_id)
+                    if job is not None and job.client == client:
+                        jobs.append(job)
+            jobs.sort(key=lambda job: job.created_at)
+        return jobs
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancela um job na fila ou em execução; terminados ficam como estão."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._read_record(job_id)
+            if job is not None and not job.finished:
+                self._mark(job_id, "cancel")
+            return job
+        if job.finished:
+            return job
+        if job.state == "running" and job.task is not None:
+            job.task.cancel()
+        else:
+            self._unqueue(job)
+            self._finish(job, "cancelled")
+            self._update_positions()
+        return job
+
+    def delete(self, job_id: str) -> bool:
+        """Cancela (se preciso) e remove o job e o arquivo."""
+        if job_id not in self._jobs:
+            job = self._read_record(job_id)
+            if job is None:
+                return False
+            if job.finished:
+                self._remove_files(job, record=True)
+            # Job de outro worker: ele remove da memória ao ver o marcador
+            self._mark(job_id, "delete")
+            return True
+        job = self.cancel(job_id)
+        self._jobs.pop(job_id, None)
+        self._expires.pop(job_id, None)
+        self._remove_files(job, record=True)
+        return True
+
+    async def events(self, job: Job, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[dict]]:
+        """
+        Estado do job agora e a cada mudança, até um estado final. Com
+        `heartbeat`, gera None depois de tantos segundos sem mudança (para
+        manter a conexão viva).
+
+        Progresso é coalescido: um assinante lento recebe o estado mais
+        recente, não uma fila de eventos antigos.
+        """
+        if job.id not in self._jobs:
+            async for snapshot in self._remote_events(job, heartbeat):
+                yield snapshot
+            return
+        listener = _Listener()
+        job.listeners.append(listener)
+        try:
+            snapshot = job.snapshot()
+            yield snapshot
+            while snapshot["state"] not in TERMINAL_STATES:
+                try:
+                    async with asyncio.timeout(heartbeat):
+                        await listener.changed.wait()
+                except TimeoutError:
+                    yield None
+                    continue
+                listener.changed.clear()
+                snapshot = listener.snapshot
+                yield snapshot
+        finally:
+            job.listeners.remove(listener)
+
+    async def _remote_events(self, job: Job, heartbeat: Optional[float]) -> AsyncIterator[Optional[dict]]:
+        """`events` de um job de outro worker, lendo o registro compartilhado."""
+        snapshot = job.snapshot()
+        yield snapshot
+        quiet = 0.0
+        while snapshot["state"] not in TERMINAL_STATES:
+            await asyncio.sleep(_PROGRESS_INTERVAL)
+            current = self._read_record(job.id)
+            if current is None:
+                return
+            if current.snapshot() != snapshot:
+                snapshot, quiet = current.snapshot(), 0.0
+                yield snapshot
+                continue
+            quiet += _PROGRESS_INTERVAL
+            if heartbeat is not None and quiet >= heartbeat:
+                quiet = 0.0
+                yield None
+
+    def report(self, job: Job, bytes_done: int, force: bool = False):
+        """Atualiza o progresso; publica no máximo a cada `_PROGRESS_INTERVAL`."""
+        job.bytes_done = bytes_done
+        now = self._clock()
+        if force or now - job.last_report >= _PROGRESS_INTERVAL:
+            job.last_report = now
+            self._publish(job)
+
+    # Execução
+
+    def _ensure_workers(self):
+        if self._ready is None:
+            self._ready = asyncio.Semaphore(0)
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.max_workers:
+            self._workers.append(asyncio.ensure_future(self._worker()))
+
+    async def _worker(self):
+        while True:
+            await self._ready.acquire()
+            self._apply_marks()
+            job = self._dequeue()
+            if job is None:
+                continue
+            self._update_positions()
+            job.state, job.position, job.started_at = "running", None, time.time()
+            self._publish(job)
+            job.task = asyncio.ensure_future(self._run(self, job))
+            try:
+                await asyncio.shield(job.task)
+            except asyncio.CancelledError:
+                if not job.task.cancelled():
+                    # O worker foi cancelado (shutdown), não o job
+                    job.task.cancel()
+                    raise
+                self._remove_files(job)
+                self._finish(job, "cancelled")
+            except PoolSaturatedError as e:
+                logger.info(f"Job {job.id} sem vaga no servidor; volta para a fila")
+                self.requeued += 1
+                job.state, job.started_at, job.bytes_done = "queued", None, 0
+                self._enqueue(job, front=True)
+                self._update_positions()
+                await asyncio.sleep(e.retry_after)
+                self._ready.release()
+            except Exception as e:
+                logger.error(f"Job {job.id} falhou: {e!r}")
+                self._remove_files(job)
+                job.error = str(e) or repr(e)
+                self._finish(job, "failed")
+            else:
+                self._finish(job, "completed")
+            finally:
+                job.task = None
+
+    def _finish(self, job: Job, state: str):
+        job.state, job.position, job.finished_at = state, None, time.time()
+        if state == "completed":
+            self.completed += 1
+        elif state == "failed":
+            self.failed += 1
+        else:
+            self.cancelled += 1
+        self._expires[job.id] = self._clock() + self.ttl
+        self._publish(job)
+
+    def _publish(self, job: Job):
+        if job.listeners:
+            snapshot = job.snapshot()
+            for listener in job.listeners:
+                listener.push(snapshot)
+        if self.shared and job.id in self._jobs:
+            self._write_record(job)
+
+    # Registros compartilhados (vários workers)
+
+    def _record_path(self, job_id: str, suffix: str = "json") -> str:
+        return os.path.join(self.directory, f"{job_id}.{suffix}")
+
+    def _write_record(self, job: Job):
+        record = job.snapshot()
+        record.pop("progress")
+        record.update({name: getattr(job, name) for name in _RECORD_EXTRA})
+        path = self._record_path(job.id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(record, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o estado do job {job.id}: {e!r}")
+
+    def _read_record(self, job_id: str) -> Optional[Job]:
+        if not self.shared or not _JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._record_path(job_id)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        record.pop("progress", None)
+        return Job(**record)
+
+    def _record_ids(self) -> "list[str]":
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [name[:-5] for name in names if name.endswith(".json") and _JOB_ID.fullmatch(name[:-5])]
+
+    def _mark(self, job_id: str, action: str):
+        with open(self._record_path(job_id, "cancel"), "w") as f:
+            f.write(action)
+
+    def _apply_marks(self):
+        """Aplica cancelamentos e remoções pedidos por outros workers."""
+        if not self.shared:
+            return
+        for job_id in list(self._jobs):
+            path = self._record_path(job_id, "cancel")
+            try:
+                with open(path) as f:
+                    action = f.read().strip()
+            except FileNotFoundError:
+                continue
+            os.remove(path)
+            if action == "delete":
+                self.delete(job_id)
+            else:
+                self.cancel(job_id)
+
+    def job_path(self, job: Job, ext: str) -> str:
+        return os.path.join(self.directory, f"{job.id}.{ext}")
+
+    def _remove_files(self, job: Job, record: bool = False):
+        paths = [job.path, f"{job.path}.part" if job.path else None]
+        if record and self.shared:
+            paths += [self._record_path(job.id), self._record_path(job.id, "cancel")]
+        for path in paths:
+            if path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Não foi possível apagar {path}: {e!r}")
+
+    def _expire(self):
+        self._apply_marks()
+        now = self._clock()
+        for job_id, expires_at in list(self._expires.items()):
+            if expires_at <= now:
+                del self._expires[job_id]
+                job = self._jobs.pop(job_id, None)
+                if job is not None:
+                    self._remove_files(job, record=True)
+
+    def cleanup(self):
+        """No startup: apaga arquivos de jobs de execuções anteriores (o estado não sobrevive)."""
+        if self.shared:
+            # Com vários workers quem limpa é o app.server, antes de criá-los
+            return
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        for job in self._jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "requeued": self.requeued,
+        }
+
+
+async def run_download_job(scheduler: JobScheduler, job: Job):
+    """Baixa a mídia do job pelo mesmo caminho do `/stream` e grava em disco."""
+    stream = await YtDlpService.open_stream(
+        job.url, job.mode, job.quality,
+        codec=job.codec, bitrate=job.bitrate, video_codec=job.video_codec,
+    )
+    job.media_type, job.filename = stream.media_type, stream.filename
+    ext = os.path.splitext(stream.filename)[1].lstrip(".") or "bin"
+    job.path = scheduler.job_path(job, ext)
+    loop = asyncio.get_running_loop()
+    os.makedirs(scheduler.directory, exist_ok=True)
+
+    if stream.file_path is not None:
+        # Já está no cache de mídia: link (ou cópia) para o cache poder removê-lo depois
+        size = os.path.getsize(stream.file_path)
+        job.total_bytes = size
+        await loop.run_in_executor(None, _link_or_copy, stream.file_path, job.path)
+        scheduler.report(job, size, force=True)
+        return
+
+    length = stream.headers.get("Content-Length")
+    job.total_bytes = int(length) if length and length.isdigit() else None
+    scheduler.report(job, 0, force=True)
+    part = f"{job.path}.part"
+    done = 0
+    # Fecha o stream mesmo se nada for lido (ex: falha ao criar o .part)
+    async with aclosing(stream):
+        with open(part, "wb") as f:
+            async for chunk in stream.body:
+                await loop.run_in_executor(None, f.write, chunk)
+                done += len(chunk)
+                scheduler.report(job, done)
+    os.replace(part, job.path)
+    if job.total_bytes is None:
+        job.total_bytes = done
+    scheduler.report(job, done, force=True)
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+@lru_cache()
+def get_job_scheduler() -> JobScheduler:
+    settings = get_settings()
+    return JobScheduler(
+        run=run_download_job,
+        directory=os.path.join(settings.DOWNLOAD_DIR, "jobs"),
+        max_workers=settings.JOBS_MAX_WORKERS,
+        max_queue=settings.JOBS_MAX_QUEUE,
+        max_per_client=settings.JOBS_MAX_PER_CLIENT,
+        ttl=settings.JOBS_TTL,
+        retry_after=settings.EXTRACTION_RETRY_AFTER,
+        shared=shared_state_dir() is not None,
+    )
@@ -0,0 +1,295 @@
+"""
+Media Cache Module.
+
+Cache opcional em disco (dentro de `DOWNLOAD_DIR`) da mídia servida pelo
+`/stream`, indexado por (video_id, format_id).
+
+O primeiro stream de um formato é gravado em paralelo enquanto é enviado ao
+cliente ("tee"); os seguintes saem direto do arquivo local. A remoção é LRU
+com limite de tamanho total, e arquivos parciais (stream interrompido) nunca
+entram no índice.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+
+from app.core.config import get_settings
+
+_SAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]")
+PART_SUFFIX = ".part"
+
+
+def _safe(name: str) -> str:
+    return _SAFE_NAME_RE.sub("_", name)
+
+
+class CacheWriter:
+    """Grava um arquivo `.part` e só o publica no cache se ele ficar completo."""
+
+    def __init__(self, cache: "MediaCache", key: tuple[str, str], final_path: str, expected_size: Optional[int]):
+        self.cache = cache
+        self.key = key
+        self.final_path = final_path
+        self.expected_size = expected_size
+        self.part_path = f"{final_path}.{uuid.uuid4().hex}{PART_SUFFIX}"
+        self.written = 0
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        self._file = open(self.part_path, "wb")
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self.written += len(data)
+
+    def commit(self) -> bool:
+        try:
+            self._file.close()
+            if self.expected_size is not None and self.written != self.expected_size:
+                logger.warning(
+                    f"Cache de mídia: {self.key} com {self.written} bytes, esperado {self.expected_size}; descartando"
+                )
+                self._discard()
+                return False
+            os.replace(self.part_path, self.final_path)
+        except OSError:
+            self._discard()
+            raise
+        self.cache._register(self.key, self.final_path, self.written)
+        return True
+
+    def abort(self):
+        if self._file.closed:
+            # Já publicado ou descartado
+            return
+        try:
+            self._file.close()
+        except OSError:
+            # O flush do que ficou no buffer pode falhar de novo (disco cheio)
+            pass
+        self._discard()
+
+    def _discard(self):
+        try:
+            os.unlink(self.part_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Cache de mídia: não foi possível apagar {self.part_path}: {e!r}")
+        self.cache._release_writer(self.key)
+
+
+class MediaCache:
+    """
+    Índice LRU dos arquivos de mídia em disco.
+
+    O índice vive em memória e é reconstruído a partir do diretório (ordem por
+    mtime) na primeira consulta; cada hit atualiza o mtime do arquivo para que
+    a ordem sobreviva a reinícios.
+    """
+
+    def __init__(self, root: str, max_bytes: int, stale_part_age: float = 3600.0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stale_part_age = stale_part_age
+        self._index: "OrderedDict[tuple[str, str], tuple[str, int]]" = OrderedDict()
+        self._writing: set[tuple[str, str]] = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, video_id: str, format_id: str, ext: str) -> str:
+        return os.path.join(self.root, _safe(video_id), f"{_safe(format_id)}.{_safe(ext or 'bin')}")
+
+    def _adopt(self, key: tuple[str, str]) -> Optional[tuple[str, int]]:
+        """
+        Arquivo completo gravado por outro worker depois do `load` deste:
+        entra no índice local. Chamado com `_lock`.
+        """
+        try:
+            entries = list(os.scandir(os.path.join(self.root, key[0])))
+        except FileNotFoundError:
+            return None
+        for entry in entries:
+            if entry.name.endswith(PART_SUFFIX) or entry.name.rsplit(".", 1)[0] != key[1]:
+                continue
+            try:
+                size = entry.stat().st_size
+            except FileNotFoundError:
+                continue
+            self._index[key] = (entry.path, size)
+            self.total_bytes += size
+            return entry.path, size
+        return None
+
+    def load(self):
+        """Reconstrói o índice e apaga `.part` abandonados por streams interrompidos."""
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            entries = []
+            now = time.time()
+            for video_dir in os.scandir(self.root):
+                if not video_dir.is_dir():
+                    continue
+                for entry in os.scandir(video_dir.path):
+                    stat = entry.stat()
+                    if entry.name.endswith(PART_SUFFIX):
+                        # Partes recentes podem ser de outro worker gravando agora
+                        if now - stat.st_mtime > self.stale_part_age:
+                            os.unlink(entry.path)
+                        continue
+                    format_id = entry.name.rsplit(".", 1)[0]
+                    entries.append((stat.st_mtime, (video_dir.name, format_id), entry.path, stat.st_size))
+            for _, key, path, size in sorted(entries):
+                self._index[key] = (path, size)
+                self.total_bytes += size
+            self._loaded = True
+        self._evict()
+
+    def lookup(self, video_id: str, format_id: str) -> Optional[str]:
+        """Caminho do arquivo completo em cache, ou None."""
+        self.load()
+        key = (_safe(video_id), _safe(format_id))
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                entry = self._adopt(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            path, size = entry
+            if not os.path.exists(path):
+                del self._index[key]
+                self.total_bytes -= size
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    async def find(self, video_id: str, format_id: str) -> Optional[str]:
+        """Versão assíncrona de `lookup`: stat/utime (e o `load`) fora do event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.lookup, video_id, format_id)
+
+    def writer(self, video_id: str, format_id: str, ext: str, expected_size: Optional[int]) -> Optional[CacheWriter]:
+        """
+        Abre um writer para o formato, ou None se ele já estiver sendo gravado
+        por outro stream ou não couber no cache.
+        """
+        self.load()
+        key = (_safe(video_id), _safe(format_id))
+        if expected_size is not None and expected_size > self.max_bytes:
+            return None
+        with self._lock:
+            if key in self._writing or key in self._index:
+                return None
+            self._writing.add(key)
+        try:
+            return CacheWriter(self, key, self._path(video_id, format_id, ext), expected_size)
+        except OSError as e:
+            logger.warning(f"Cache de mídia: não foi possível gravar {key}: {e!r}")
+            self._release_writer(key)
+            return None
+
+    async def open_writer(
+        self, video_id: str, format_id: str, ext: str, expected_size: Optional[int]
+    ) -> Optional[CacheWriter]:
+        """Versão assíncrona de `writer`: mkdir/open do `.part` fora do event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.writer, video_id, format_id, ext, expected_size)
+
+    def _release_writer(self, key: tuple[str, str]):
+        with self._lock:
+            self._writing.discard(key)
+
+    def _register(self, key: tuple[str, str], path: str, size: int):
+        with self._lock:
+            self._writing.discard(key)
+            self._index[key] = (path, size)
+            self._index.move_to_end(key)
+            self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        removed = []
+        with self._lock:
+            while self.total_bytes > self.max_bytes and self._index:
+                key, (path, size) = self._index.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+                removed.append(path)
+        for path in removed:
+            # Streams já servindo o arquivo continuam com o fd aberto
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    async def tee(self, body: AsyncIterator[bytes], writer: CacheWriter) -> AsyncIterator[bytes]:
+        """
+        Repassa `body` ao cliente e grava cada pedaço no `.part` (fora do event
+        loop). Se o stream terminar incompleto ou o cliente desconectar, o
+        arquivo parcial é apagado. Um erro de disco (cheio, sem permissão)
+        só desiste do cache: o cliente continua recebendo o stream.
+        """
+        loop = asyncio.get_running_loop()
+        completed = False
+        try:
+            async for chunk in body:
+                if writer is not None:
+                    try:
+                        await loop.run_in_executor(None, writer.write, chunk)
+                    except OSError as e:
+                        logger.warning(f"Cache de mídia: falha ao gravar {writer.key}, seguindo sem cache: {e!r}")
+                        writer.abort()
+                        writer = None
+                yield chunk
+            completed = True
+        finally:
+            if writer is None:
+                pass
+            elif not completed:
+                writer.abort()
+            else:
+                try:
+                    await loop.run_in_executor(None, writer.commit)
+                except OSError as e:
+                    logger.warning(f"Cache de mídia: falha ao publicar {writer.key}: {e!r}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._index),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+@lru_cache()
+def get_media_cache() -> Optional[MediaCache]:
+    """Cache de mídia configurado, ou None se estiver desabilitado."""
+    settings = get_settings()
+    if not settings.MEDIA_CACHE_ENABLED:
+        return None
+    return MediaCache(
+        root=os.path.join(settings.DOWNLOAD_DIR, "media"),
+        max_bytes=settings.MEDIA_CACHE_MAX_BYTES,
+    )
@@ -0,0 +1,355 @@
+"""
+Media Proxy Module.
+
+Streaming dentro do processo do servidor: usa o info dict já extraído (e
+cacheado) para achar a URL direta do formato e repassa os bytes com um
+cliente HTTP assíncrono, sem subir um novo interpretador `python -m yt_dlp`.
+
+Cada formato sai pelo perfil de saída (`app.services.egress`) que o extraiu:
+o googlevideo só aceita a URL assinada vinda do mesmo IP.
+"""
+import re
+from dataclasses import dataclass
+from email.utils import formatdate
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from app.core.config import get_settings
+from app.services.egress import EgressProfile, get_egress_pool
+from app.services.format_index import format_index
+
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UpstreamError(Exception):
+    """O servidor de mídia respondeu com erro (URL expirada, 403, 5xx...)."""
+
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(message or f"Upstream respondeu {status_code}")
+        self.status_code = status_code
+
+
+class RangeNotSatisfiableError(Exception):
+    """O Range pedido começa depois do fim da mídia."""
+
+    def __init__(self, total_size: Optional[int]):
+        super().__init__("Range fora do tamanho da mídia")
+        self.total_size = total_size
+
+
+@dataclass(frozen=True)
+class ByteRange:
+    """
+    Um único intervalo de um header `Range: bytes=...`.
+
+    `start=None` representa um sufixo (`bytes=-N`: os últimos N bytes).
+    """
+    start: Optional[int]
+    end: Optional[int]
+
+    @classmethod
+    def parse(cls, header: Optional[str]) -> Optional["ByteRange"]:
+        """
+        Interpreta o header. Sintaxe inválida ou múltiplos intervalos retornam
+        None, e o pedido é tratado como se não tivesse Range (RFC 9110 14.2).
+        """
+        if not header:
+            return None
+        match = _RANGE_RE.match(header.strip().replace(" ", ""))
+        if not match or match.group(1) == match.group(2) == "":
+            return None
+        start = int(match.group(1)) if match.group(1) else None
+        end = int(match.group(2)) if match.group(2) else None
+        if start is not None and end is not None and end < start:
+            return None
+        return cls(start, end)
+
+    def resolve(self, total: Optional[int]) -> Optional[tuple[int, Optional[int]]]:
+        """
+        Converte para (início, fim inclusivo) dado o tamanho total, se conhecido.
+
+        Retorna None quando o intervalo não pode ser aplicado (sufixo sem
+        tamanho conhecido); nesse caso a mídia inteira é enviada.
+        """
+        if self.start is None:
+            if total is None:
+                return None
+            suffix = min(self.end, total)
+            if suffix == 0:
+                raise RangeNotSatisfiableError(total)
+            return total - suffix, total - 1
+        if total is not None:
+            if self.start >= total:
+                raise RangeNotSatisfiableError(total)
+            end = total - 1 if self.end is None else min(self.end, total - 1)
+            return self.start, end
+        return self.start, self.end
+
+
+def select_format(
+    info: dict,
+    mode: str,
+    quality: Optional[int] = None,
+    video_codec: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Escolhe o formato equivalente aos seletores usados no modo subprocess
+    (`bestaudio[ext=m4a]`, `bestvideo[height=N]` ou `bestvideo`), pelo
+    índice de formatos guardado com o info.
+    """
+    index = format_index(info)
+    return index.get(info, index.select(mode, quality, video_codec))
+
+
+def is_proxyable(fmt: dict) -> bool:
+    """Só formatos progressivos HTTP(S) podem ser repassados byte a byte (DASH/HLS não)."""
+    return (
+        bool(fmt.get('url'))
+        and fmt.get('protocol', 'https') in ('http', 'https')
+        and not fmt.get('fragments')
+    )
+
+
+def format_size(fmt: dict) -> Optional[int]:
+    """Tamanho exato do formato, quando o yt-dlp conhece (filesize_approx não serve)."""
+    size = fmt.get('filesize')
+    return size if isinstance(size, int) and size > 0 else None
+
+
+def format_last_modified_ts(fmt: dict) -> Optional[float]:
+    """Timestamp `lmt` (microssegundos) que o googlevideo põe na URL de cada formato."""
+    url = fmt.get('url') or ''
+    if 'lmt=' not in url:
+        return None
+    values = parse_qs(urlparse(url).query).get('lmt')
+    if not values or not values[0].isdigit():
+        return None
+    return int(values[0]) / 1_000_000
+
+
+def format_validators(video_id: Optional[str], fmt: dict) -> dict:
+    """
+    ETag e Last-Modified do formato.
+
+    O par (vídeo, format_id, lmt) identifica exatamente os bytes servidos, ao
+    contrário da URL assinada, que muda a cada extração.
+    """
+    lmt = format_last_modified_ts(fmt)
+    version = int(lmt * 1_000_000) if lmt else (format_size(fmt) or "")
+    headers = {"ETag": f'"{video_id or "media"}-{fmt.get("format_id")}-{version}"'}
+    if lmt:
+        headers["Last-Modified"] = formatdate(lmt, usegmt=True)
+    return headers
+
+
+@dataclass
+class ProxiedMedia:
+    """Resposta do upstream já aberta: intervalo efetivo, tamanho total (se conhecido) e o corpo."""
+    total_size: Optional[int]
+    start: int
+    end: Optional[int]
+    body: AsyncIterator[bytes]
+    ranged: bool = False  # O upstream honrou o Range (206)
+    closer: Optional[Callable[[], Awaitable[None]]] = None
+
+    async def aclose(self):
+        """
+        Fecha o upstream e devolve o perfil de saída sem ler o corpo (ou o
+        resto dele). Quem abre a mídia e não consome o corpo até o fim chama
+        isto; fechar de novo não faz nada.
+        """
+        aclose = getattr(self.body, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        if self.closer is not None:
+            await self.closer()
+
+    @property
+    def content_length(self) -> Optional[int]:
+        if self.end is None:
+            return None
+        return self.end - self.start + 1
+
+    def response_headers(self, partial: bool) -> dict:
+        """Headers de Content-Length/Content-Range para a resposta ao cliente."""
+        headers = {"Accept-Ranges": "bytes"}
+        if self.content_length is not None:
+            headers["Content-Length"] = str(self.content_length)
+        if partial:
+            total = "*" if self.total_size is None else str(self.total_size)
+            end = "" if self.end is None else str(self.end)
+            headers["Content-Range"] = f"bytes {self.start}-{end}/{total}"
+        return headers
+
+
+class MediaProxy:
+    """
+    Repassa mídia do googlevideo usando um `httpx.AsyncClient` compartilhado
+    (um por perfil de saída com proxy ou endereço próprio).
+
+    O YouTube limita a banda de GETs longos; por isso, assim como o próprio
+    yt-dlp (`http_chunk_size`), a mídia é pedida em fatias com `Range`.
+    """
+
+    def __init__(self, chunk_size: int = 10 * 1024 * 1024, timeout: float = 30.0):
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._routed: dict[str, httpx.AsyncClient] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=httpx.Timeout(self.timeout),
+            )
+        return self._client
+
+    def client_for(self, profile: Optional[EgressProfile]) -> httpx.AsyncClient:
+        """Cliente que sai pelo perfil (o compartilhado, se ele usa a conexão direta)."""
+        if profile is None or not profile.routed:
+            return self.client
+        client = self._routed.get(profile.name)
+        if client is None or client.is_closed:
+            transport = httpx.AsyncHTTPTransport(proxy=profile.proxy, local_address=profile.source_address)
+            client = self._routed[profile.name] = httpx.AsyncClient(
+                transport=transport,
+                follow_redirects=True,
+                timeout=httpx.Timeout(self.timeout),
+            )
+        return client
+
+    async def _request(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: dict,
+        start: int,
+        end: Optional[int],
+    ) -> httpx.Response:
+        range_headers = dict(headers)
+        range_headers['Range'] = f"bytes={start}-{'' if end is None else end}"
+        request = client.build_request("GET", url, headers=range_headers)
+        response = await client.send(request, stream=True)
+        if response.status_code >= 400:
+            await response.aclose()
+            raise UpstreamError(response.status_code)
+        return response
+
+    async def open(self, fmt: dict, start: int = 0, end: Optional[int] = None) -> ProxiedMedia:
+        """
+        Abre o primeiro pedaço antes de devolver, para que erros do upstream
+        (ex: 403 de URL expirada) apareçam antes de os headers irem ao cliente.
+
+        O stream conta como uso do perfil de saída do formato até o corpo
+        terminar; um 429 do upstream põe o perfil em quarentena.
+        """
+        url = fmt['url']
+        headers = dict(fmt.get('http_headers') or {})
+        chunk_size = (fmt.get('downloader_options') or {}).get('http_chunk_size') or self.chunk_size
+        egress = get_egress_pool()
+        profile = egress.hold(fmt.get('egress'))
+        client = self.client_for(profile)
+
+        released = False
+
+        def release(error: Optional[BaseException]):
+            nonlocal released
+            if profile is None or released:
+                return
+            released = True
+            blocked = isinstance(error, UpstreamError) and error.status_code == 429
+            egress.release(profile, "blocked" if blocked else ("ok" if error is None else None))
+
+        first_end = start + chunk_size - 1
+        if end is not None:
+            first_end = min(first_end, end)
+        try:
+            response = await self._request(client, url, headers, start, first_end)
+        except BaseException as e:
+            release(e)
+            raise
+
+        total = format_size(fmt)
+        ranged = response.status_code == 206
+        if ranged:
+            match = _CONTENT_RANGE_RE.match(response.headers.get('content-range', ''))
+            if match and match.group(3) != '*':
+                total = int(match.group(3))
+        else:
+            # Upstream ignorou o Range e vai mandar tudo de uma vez
+            if response.headers.get('content-length', '').isdigit():
+                total = int(response.headers['content-length'])
+            start = 0
+            end = None
+
+        last = end if end is not None else (total - 1 if total else None)
+        if total is not None and last is not None:
+            last = min(last, total - 1)
+
+        async def body():
+            resp = response
+            pos = start
+            requested = first_end - start + 1
+            error = None
+            try:
+                while True:
+                    received = 0
+                    async for data in resp.aiter_bytes():
+                        received += len(data)
+                        yield data
+                    pos += received
+                    await resp.aclose()
+                    if not ranged:
+                        break
+                    if last is not None:
+                        if pos > last:
+                            break
+                        next_end = min(pos + chunk_size - 1, last)
+                    else:
+                        # Tamanho desconhecido: uma fatia incompleta marca o fim
+                        if received < requested:
+                            break
+                        next_end = pos + chunk_size - 1
+                    try:
+                        resp = await self._request(client, url, headers, pos, next_end)
+                    except UpstreamError as e:
+                        if e.status_code == 416 and last is None:
+                            break
+                        raise
+                    requested = next_end - pos + 1
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                await resp.aclose()
+                release(error)
+
+        async def close():
+            # Corpo nunca iterado: o `finally` dele não roda, então solta aqui
+            release(None)
+            await response.aclose()
+
+        return ProxiedMedia(total_size=total, start=start, end=last, body=body(), ranged=ranged, closer=close)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        routed, self._routed = self._routed, {}
+        for client in routed.values():
+            await client.aclose()
+
+
+@lru_cache()
+def get_media_proxy() -> MediaProxy:
+    settings = get_settings()
+    return MediaProxy(
+        chunk_size=settings.STREAM_UPSTREAM_CHUNK_SIZE,
+        timeout=settings.STREAM_UPSTREAM_TIMEOUT,
+    )
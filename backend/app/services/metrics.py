@@ -0,0 +1,286 @@
+"""
+Metrics Module.
+
+Métricas no formato de texto do Prometheus (exposition format 0.0.4),
+servidas em `/metrics`, sem dependência extra.
+
+- `Counter` e `Histogram` com labels, seguros entre threads (o `get_info`
+  roda no pool de extração);
+- `stats_gauges` converte os `.stats()` dos pools/filas em gauges na hora da
+  coleta, então o `/metrics` mostra exatamente o que o `/health` mostra;
+- `MetricsMiddleware` mede cada request HTTP pelo template da rota (ex:
+  `/api/v1/download/stream/{video_id}`), até o último byte do corpo;
+- `instrument_stream` mede TTFB, duração, bytes e desconexões de um stream.
+
+As métricas são por processo: com o executor 'process', as fases do
+`get_info` ficam nos workers e só o tempo total aparece aqui.
+"""
+import math
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DURATION_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+THROUGHPUT_BUCKETS = tuple(float(10 ** e) * m for e in range(5, 9) for m in (1, 2.5, 5)) + (1e9,)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por label: contagem por bucket (não cumulativa), soma e total
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        lines = self.header()
+        inf = 'le="+Inf"'
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def stats_gauges(name: str, help: str, collect: Callable[[], dict]) -> Callable[[], list[str]]:
+    """
+    Coletor que vira cada campo numérico de `{componente: stats()}` em
+    `name{component="...",field="..."} valor`.
+    """
+    def render() -> list[str]:
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        for component, stats in collect().items():
+            if not isinstance(stats, dict):
+                continue
+            for field_name, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                labels = _format_labels(("component", "field"), (component, field_name))
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return lines
+    return render
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], list[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], list[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.register(Counter(
+    "vids_http_requests_total", "Requests HTTP por rota, método e status.", ("endpoint", "method", "status")))
+http_duration = REGISTRY.register(Histogram(
+    "vids_http_request_duration_seconds", "Duração do request até o último byte da resposta.", ("endpoint", "method")))
+
+extraction_duration = REGISTRY.register(Histogram(
+    "vids_extraction_duration_seconds", "Extração de metadados (fetch_info) fora do cache, ponta a ponta.", ("executor",)))
+extraction_phase = REGISTRY.register(Histogram(
+    "vids_extraction_phase_seconds",
+    "get_info por fase: 'network' (extract_info do yt-dlp) e 'processing' (índice de formatos e projeção).",
+    ("phase",)))
+extraction_results = REGISTRY.register(Counter(
+    "vids_extractions_total", "Extrações por resultado (ok, error, blocked).", ("outcome",)))
+
+rate_limited = REGISTRY.register(Counter(
+    "vids_rate_limited_total", "Requests recusados pelo limite de taxa, por escopo (client, global).",
+    ("endpoint", "scope")))
+upstream_throttled = REGISTRY.register(Counter(
+    "vids_upstream_throttled_total",
+    "Extrações adiadas pelo ritmo adaptativo ('open': circuito aberto por verificações do YouTube; 'rate': ritmo).",
+    ("reason",)))
+
+stream_ttfb = REGISTRY.register(Histogram(
+    "vids_stream_ttfb_seconds", "Do pedido de stream até o primeiro byte de mídia.", ("endpoint", "mode", "engine")))
+stream_duration = REGISTRY.register(Histogram(
+    "vids_stream_duration_seconds", "Duração total de cada stream.", ("endpoint", "mode", "engine"), DURATION_BUCKETS))
+stream_throughput = REGISTRY.register(Histogram(
+    "vids_stream_throughput_bytes_per_second", "Bytes/s médios de cada stream.", ("endpoint", "mode", "engine"),
+    THROUGHPUT_BUCKETS))
+stream_bytes = REGISTRY.register(Counter(
+    "vids_stream_bytes_total", "Bytes de mídia enviados.", ("endpoint", "mode", "engine")))
+stream_results = REGISTRY.register(Counter(
+    "vids_streams_total", "Streams por resultado (complete, disconnect, error).", ("endpoint", "mode", "engine", "outcome")))
+
+process_exits = REGISTRY.register(Counter(
+    "vids_subprocess_exits_total", "Saídas de subprocessos de stream por código ('killed': encerrado pelo supervisor).",
+    ("name", "code")))
+
+
+async def instrument_stream(
+    body: AsyncIterator[bytes],
+    endpoint: str,
+    mode: str,
+    engine: str,
+    started: Optional[float] = None,
+) -> AsyncIterator[bytes]:
+    """Repassa `body` medindo TTFB (a partir de `started`), duração, bytes e como terminou."""
+    labels = {"endpoint": endpoint, "mode": mode, "engine": engine}
+    started = time.perf_counter() if started is None else started
+    sent = 0
+    outcome = "disconnect"
+    try:
+        async for chunk in body:
+            if not sent:
+                stream_ttfb.observe(time.perf_counter() - started, **labels)
+            sent += len(chunk)
+            yield chunk
+        outcome = "complete"
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stream_duration.observe(elapsed, **labels)
+        stream_bytes.inc(sent, **labels)
+        if elapsed > 0:
+            stream_throughput.observe(sent / elapsed, **labels)
+        stream_results.inc(**labels, outcome=outcome)
+
+
+def route_template(scope) -> str:
+    """
+    Template da rota atendida (ex: `/api/v1/download/stream/{video_id}`), para
+    o label não explodir com um valor por vídeo.
+
+    Rotas de um router incluído podem trazer o path sem o prefixo; nesse caso
+    o prefixo é a parte do path do request antes do trecho que a rota casa.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.match(path):
+        for i, char in enumerate(path):
+            if i and char == "/" and regex.match(path[i:]):
+                return path[:i] + template
+    return template
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: conta e mede cada request HTTP pelo template da rota."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            endpoint = route_template(scope)
+            method = scope.get("method", "")
+            http_requests.inc(endpoint=endpoint, method=method, status=status[0])
+            http_duration.observe(time.perf_counter() - started, endpoint=endpoint, method=method)
@@ -0,0 +1,267 @@
+"""
+Playlist Module.
+
+Listagem preguiçosa de playlists e canais.
+
+A extração "flat" do yt-dlp com `process=False` devolve as entradas como um
+gerador que busca uma página do YouTube por vez; só o necessário para a
+página pedida é baixado, então o tempo até a primeira entrada não depende do
+tamanho da playlist. Os formatos de cada vídeo só são resolvidos quando o
+app pede o `/info` daquele vídeo.
+
+A paginação usa um cursor opaco. Enquanto a sessão de listagem está viva
+(em memória, com TTL), a próxima página continua do mesmo gerador; se ela
+expirou ou está em outro worker, a listagem é reaberta e pula até o offset.
+"""
+import base64
+import binascii
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Iterator, Optional
+
+from loguru import logger
+
+from app.core.config import get_settings
+from app.services.egress import EgressPool, EgressProfile, get_egress_pool
+from app.services.rate_limit import BotChallengeError, is_bot_challenge
+from app.services.ydl_pool import flat_ydl_options
+
+# Redirecionamentos (ex: canal -> aba de vídeos) seguidos até achar a playlist
+_MAX_REDIRECTS = 5
+
+
+class InvalidCursorError(ValueError):
+    """Cursor malformado ou de outra playlist."""
+
+
+def encode_cursor(url: str, offset: int, session: str) -> str:
+    raw = json.dumps({"u": url, "o": offset, "s": session}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, url: str) -> tuple[int, str]:
+    """(offset, sessão) do cursor, validando que ele pertence a `url`."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        offset, session = int(data["o"]), str(data["s"])
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Cursor inválido") from e
+    if data.get("u") != url or offset < 0:
+        raise InvalidCursorError("Cursor não pertence a esta playlist")
+    return offset, session
+
+
+def _flat_ydl(profile: Optional[EgressProfile]):
+    import yt_dlp
+
+    return yt_dlp.YoutubeDL(flat_ydl_options(profile.name if profile else None))
+
+
+def _iter_entries(entries) -> Iterator[dict]:
+    from yt_dlp.utils import PagedList
+
+    if isinstance(entries, PagedList):
+        # Página a página: indexar um PagedList item a item refaz a busca da página
+        start, step = 0, 50
+        while True:
+            page = entries.getslice(start, start + step)
+            yield from page
+            if len(page) < step:
+                return
+            start += step
+    if entries is not None:
+        yield from entries
+
+
+def lazy_entries(ydl, url: str) -> tuple[dict, Iterator[dict]]:
+    """(metadados da playlist, gerador das entradas) sem resolver cada vídeo."""
+    result = ydl.extract_info(url, download=False, process=False)
+    for _ in range(_MAX_REDIRECTS):
+        if result.get('_type') not in ('url', 'url_transparent'):
+            break
+        result = ydl.extract_info(result['url'], download=False, process=False)
+    entries = (e for e in _iter_entries(result.get('entries')) if e)
+    return result, entries
+
+
+def entry_url(entry: dict) -> Optional[str]:
+    url = entry.get('url') or entry.get('webpage_url')
+    if not url and entry.get('id'):
+        url = f"https://www.youtube.com/watch?v={entry['id']}"
+    return url
+
+
+def project_entry(entry: dict) -> dict:
+    """Só o que a lista do app mostra; o resto vem do `/info` do vídeo."""
+    thumbnails = entry.get('thumbnails') or []
+    return {
+        'id': entry.get('id'),
+        'url': entry_url(entry),
+        'title': entry.get('title'),
+        'duration': entry.get('duration'),
+        'uploader': entry.get('uploader') or entry.get('channel'),
+        'thumbnail': thumbnails[-1].get('url') if thumbnails else entry.get('thumbnail'),
+    }
+
+
+@dataclass
+class _Session:
+    ydl: Any
+    title: Optional[str]
+    entries: Iterator[dict]
+    offset: int
+    expires_at: float
+    profile: Optional[EgressProfile] = None
+
+
+@dataclass
+class PlaylistPage:
+    title: Optional[str]
+    entries: list[dict] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+class PlaylistPager:
+    """
+    Páginas de uma playlist a partir das sessões de listagem abertas.
+
+    Cada sessão tem a própria instância `YoutubeDL` (fora do pool): o gerador
+    de entradas continua usando a instância entre uma página e outra. Uma
+    sessão é retirada do registro enquanto uma página é lida, então duas
+    leituras do mesmo cursor nunca avançam o mesmo gerador.
+
+    Com `egress`, a sessão sai pelo perfil menos carregado na abertura e as
+    páginas seguintes pelo mesmo perfil; cada leitura conta como um uso dele.
+    """
+
+    def __init__(
+        self,
+        ydl_factory: Callable[[Optional[EgressProfile]], Any] = _flat_ydl,
+        max_sessions: int = 64,
+        ttl: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+        egress: Optional[EgressPool] = None,
+    ):
+        self.ydl_factory = ydl_factory
+        self.egress = egress
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._clock = clock
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.resumed = 0
+
+    def _open(self, url: str, offset: int, profile: Optional[EgressProfile]) -> _Session:
+        ydl = self.ydl_factory(profile)
+        try:
+            info, entries = lazy_entries(ydl, url)
+            # Sessão perdida: reabre e pula o que já foi entregue
+            entries = itertools.islice(entries, offset, None) if offset else entries
+        except BaseException:
+            self._close(ydl)
+            raise
+        self.opened += 1
+        return _Session(ydl, info.get('title'), entries, offset, 0.0, profile)
+
+    def _close(self, ydl):
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.warning(f"Erro ao fechar listagem de playlist: {e!r}")
+
+    def _take(self, session_id: str) -> Optional[_Session]:
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def _put(self, session_id: str, session: _Session):
+        session.expires_at = self._clock() + self.ttl
+        expired = []
+        with self._lock:
+            self._sessions[session_id] = session
+            now = self._clock()
+            for key, other in list(self._sessions.items()):
+                if other.expires_at <= now or len(self._sessions) > self.max_sessions:
+                    expired.append(self._sessions.pop(key))
+        for old in expired:
+            self._close(old.ydl)
+
+    def page(self, url: str, cursor: Optional[str] = None, limit: int = 50) -> PlaylistPage:
+        """
+        Lê `limit` entradas a partir do cursor (ou do início).
+
+        Raises:
+            InvalidCursorError: se o cursor for inválido ou de outra URL.
+            BotChallengeError: se o YouTube pediu login ou verificação anti-bot
+                (o perfil de saída entra em quarentena).
+        """
+        offset, session_id = decode_cursor(cursor, url) if cursor else (0, uuid.uuid4().hex)
+        session = self._take(session_id)
+        if session is not None and session.offset != offset:
+            self._close(session.ydl)
+            session = None
+
+        profile = None
+        if self.egress is not None:
+            if session is not None:
+                profile = self.egress.hold(session.profile.name if session.profile else None)
+            else:
+                profile = self.egress.acquire()
+        outcome = None
+        try:
+            if session is None:
+                session = self._open(url, offset, profile)
+            else:
+                self.resumed += 1
+            try:
+                # Uma entrada a mais para saber se existe próxima página
+                batch = list(itertools.islice(session.entries, limit + 1))
+            except BaseException:
+                self._close(session.ydl)
+                raise
+            outcome = "ok"
+        except Exception as e:
+            if not is_bot_challenge(e):
+                raise
+            outcome = "blocked"
+            raise BotChallengeError() from e
+        finally:
+            if profile is not None:
+                self.egress.release(profile, outcome)
+
+        entries = batch[:limit]
+        session.offset = offset + len(entries)
+        page = PlaylistPage(title=session.title, entries=[project_entry(e) for e in entries])
+        if len(batch) > limit:
+            session.entries = itertools.chain(batch[limit:], session.entries)
+            page.next_cursor = encode_cursor(url, session.offset, session_id)
+            self._put(session_id, session)
+        else:
+            self._close(session.ydl)
+        return page
+
+    def clear(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), OrderedDict()
+        for session in sessions:
+            self._close(session.ydl)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "opened": self.opened, "resumed": self.resumed}
+
+
+@lru_cache()
+def get_playlist_pager() -> PlaylistPager:
+    settings = get_settings()
+    return PlaylistPager(
+        max_sessions=settings.PLAYLIST_MAX_SESSIONS,
+        ttl=settings.PLAYLIST_SESSION_TTL,
+        egress=get_egress_pool(),
+    )
@@ -0,0 +1,206 @@
+"""
+Process Supervisor Module.
+
+Ciclo de vida dos subprocessos que alimentam streams (yt-dlp, ffmpeg).
+
+- stderr é drenado em paralelo para um buffer limitado (só o final fica
+  guardado), então um filho verboso nunca trava por pipe cheio;
+- se o cliente desconecta ou a task é cancelada, o filho recebe SIGTERM,
+  depois SIGKILL, e é sempre reaproveitado (`wait`), sem órfãos nem zumbis;
+- timeouts de inatividade (sem saída) e de duração total;
+- contagem dos filhos vivos, exposta no /health.
+"""
+import asyncio
+import os
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator
+
+from loguru import logger
+
+from app.core.config import get_settings
+from app.services import metrics
+from app.services.relay import PipeRelay, get_pipe_relay
+
+
+class ProcessFailedError(Exception):
+    """O subprocesso saiu com erro; a saída já enviada está incompleta."""
+
+    def __init__(self, name: str, returncode: int, stderr: str = ""):
+        super().__init__(f"{name} saiu com código {returncode}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class ProcessTimeoutError(Exception):
+    """O subprocesso ficou tempo demais sem saída ou passou da duração máxima."""
+
+
+class _StderrTail:
+    """Guarda só os últimos `limit` bytes do stderr."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._data = bytearray()
+
+    def feed(self, data: bytes):
+        self._data += data
+        if len(self._data) > self.limit:
+            del self._data[:len(self._data) - self.limit]
+
+    def text(self) -> str:
+        return self._data.decode(errors="replace")
+
+
+async def _drain(stream: asyncio.StreamReader, tail: _StderrTail):
+    while True:
+        data = await stream.read(16 * 1024)
+        if not data:
+            return
+        tail.feed(data)
+
+
+@dataclass
+class _Child:
+    name: str
+    process: asyncio.subprocess.Process
+    started_at: float
+
+
+class ProcessSupervisor:
+    """Roda comandos de stream e garante o encerramento de cada filho."""
+
+    def __init__(
+        self,
+        relay: PipeRelay,
+        idle_timeout: float = 60.0,
+        total_timeout: float = 3 * 3600.0,
+        stderr_limit: int = 64 * 1024,
+        kill_grace: float = 2.0,
+    ):
+        self.relay = relay
+        self.idle_timeout = idle_timeout
+        self.total_timeout = total_timeout
+        self.stderr_limit = stderr_limit
+        self.kill_grace = kill_grace
+        self._children: dict[int, _Child] = {}
+        self.started = 0
+        self.killed = 0
+        self.timeouts = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> int:
+        return len(self._children)
+
+    async def stream(self, cmd: list[str], name: str = "processo") -> AsyncIterator[bytes]:
+        """
+        Roda `cmd` e gera o stdout.
+
+        Raises:
+            ProcessFailedError: se o filho sair com código diferente de zero.
+            ProcessTimeoutError: se estourar o timeout de inatividade ou total.
+        """
+        read_fd, write_fd = self.relay.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=write_fd,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+
+        child = _Child(name, process, time.monotonic())
+        self._children[process.pid] = child
+        self.started += 1
+        tail = _StderrTail(self.stderr_limit)
+        stderr_task = asyncio.ensure_future(_drain(process.stderr, tail))
+        deadline = child.started_at + self.total_timeout
+        try:
+            async with aclosing(self.relay.stream(read_fd)) as body:
+                while True:
+                    timeout = min(self.idle_timeout, deadline - time.monotonic())
+                    try:
+                        async with asyncio.timeout(max(timeout, 0)):
+                            chunk = await anext(body)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.timeouts += 1
+                        reason = "duração máxima" if time.monotonic() >= deadline else "inatividade"
+                        raise ProcessTimeoutError(f"{name} (pid {process.pid}) encerrado por {reason}")
+                    yield chunk
+            await process.wait()
+            # Um neto que herdou o stderr não pode segurar o stream
+            await asyncio.wait({stderr_task}, timeout=self.kill_grace)
+            if process.returncode != 0:
+                self.failed += 1
+                stderr = tail.text()
+                logger.error(f"{name} falhou ({process.returncode}): {stderr[-2000:]}")
+                raise ProcessFailedError(name, process.returncode, stderr)
+        finally:
+            await self._reap(child)
+            stderr_task.cancel()
+
+    async def _reap(self, child: _Child):
+        """SIGTERM, espera `kill_grace`, SIGKILL; sempre termina com o filho reaproveitado."""
+        process = child.process
+        killed = process.returncode is None
+        try:
+            if killed:
+                self.killed += 1
+                logger.info(f"Encerrando {child.name} (pid {process.pid}) antes do fim")
+                try:
+                    process.terminate()
+                    await asyncio.wait_for(asyncio.shield(process.wait()), self.kill_grace)
+                except ProcessLookupError:
+                    pass
+                except asyncio.TimeoutError:
+                    process.kill()
+            await asyncio.shield(process.wait())
+        finally:
+            self._children.pop(process.pid, None)
+            code = "killed" if killed else str(process.returncode)
+            metrics.process_exits.inc(name=child.name, code=code)
+
+    def kill_all(self):
+        """No shutdown: mata os filhos que ainda estiverem rodando."""
+        for child in list(self._children.values()):
+            if child.process.returncode is None:
+                try:
+                    child.process.kill()
+                except ProcessLookupError:
+                    pass
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "running": self.running,
+            "started": self.started,
+            "killed": self.killed,
+            "timeouts": self.timeouts,
+            "failed": self.failed,
+            "children": [
+                {"pid": pid, "name": c.name, "age": round(now - c.started_at, 1)}
+                for pid, c in self._children.items()
+            ],
+        }
+
+
+@lru_cache()
+def get_process_supervisor() -> ProcessSupervisor:
+    settings = get_settings()
+    return ProcessSupervisor(
+        relay=get_pipe_relay(),
+        idle_timeout=settings.STREAM_PROCESS_IDLE_TIMEOUT,
+        total_timeout=settings.STREAM_PROCESS_TOTAL_TIMEOUT,
+        stderr_limit=settings.STREAM_PROCESS_STDERR_LIMIT,
+        kill_grace=settings.STREAM_PROCESS_KILL_GRACE,
+    )
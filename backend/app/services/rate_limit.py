@@ -0,0 +1,331 @@
+"""
+Rate Limit Module.
+
+Duas proteções independentes:
+
+- `RateLimiter`: token bucket por cliente (IP) e um global na frente do
+  `/info` e do `/stream`. Um cliente que dispara requests em laço recebe 429
+  com `Retry-After` sem gastar extração, e o total do servidor nunca passa do
+  ritmo global (503);
+- `AdaptiveThrottle`: ritmo das extrações que vão ao YouTube (cache hits não
+  passam por aqui). Quando a fração de erros de verificação ("Sign in",
+  "bot", "challenge") na janela passa do limite, o circuito abre: extrações
+  param por um backoff com jitter, que dobra a cada reabertura seguida, e o
+  ritmo permitido cai pela metade. Depois disso o circuito fica meio aberto
+  (a primeira extração que passar fecha, a que for bloqueada reabre) e o
+  ritmo volta a subir aos poucos enquanto não houver bloqueios.
+
+Recusas viram `UpstreamThrottledError`, um `PoolSaturatedError`: as rotas
+respondem 503 com `Retry-After` e os jobs voltam para a fila, como quando
+falta vaga no pool. Com vários workers (`SHARED_STATE_DIR`), os ritmos
+globais são divididos entre eles e o resto é por worker.
+"""
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Callable, Optional
+
+from loguru import logger
+
+from app.core.config import get_settings
+from app.services.extraction_pool import PoolSaturatedError
+from app.services.shared_state import shared_state_dir
+
+
+class UpstreamThrottledError(PoolSaturatedError):
+    """Extração adiada: o YouTube está pedindo verificação ou o ritmo está no limite."""
+
+    def __init__(self, retry_after: float, message: Optional[str] = None):
+        Exception.__init__(
+            self, message or "YouTube bloqueou o acesso temporariamente. Tente novamente mais tarde."
+        )
+        self.retry_after = max(math.ceil(retry_after), 1)
+
+
+class BotChallengeError(Exception):
+    """O YouTube pediu login ou verificação anti-bot na extração."""
+
+    def __init__(self, message: str = "YouTube bloqueou o acesso. Tente novamente."):
+        super().__init__(message)
+
+
+def is_bot_challenge(error: BaseException) -> bool:
+    """O erro do yt-dlp é o YouTube pedindo login ou verificação anti-bot."""
+    message = str(error)
+    return "Sign" in message or "challenge" in message or "bot" in message.lower()
+
+
+class TokenBucket:
+    """`rate` fichas por segundo, acumulando até `burst`."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self.tokens = burst
+        self._updated = clock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> float:
+        """0 se pegou uma ficha; senão, segundos até a próxima."""
+        now = self._clock()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def set_rate(self, rate: float, burst: Optional[float] = None):
+        self._refill(self._clock())
+        self.rate = rate
+        if burst is not None:
+            self.burst = burst
+            self.tokens = min(self.tokens, burst)
+
+
+class RateLimiter:
+    """
+    Bucket por cliente e bucket global.
+
+    Os buckets dos clientes ficam num LRU limitado a `max_clients`: um
+    cliente esquecido volta com o bucket cheio, o que só é generoso.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        global_rate: float,
+        global_burst: int,
+        max_clients: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._clock = clock
+        self._global = TokenBucket(global_rate, global_burst, clock)
+        self._clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.allowed = 0
+        self.limited_client = 0
+        self.limited_global = 0
+
+    def check(self, client: str) -> tuple[Optional[str], float]:
+        """
+        (None, 0) se o request pode seguir; senão (escopo, segundos de espera),
+        com escopo 'client' ou 'global'.
+        """
+        bucket = self._clients.get(client)
+        if bucket is None:
+            bucket = self._clients[client] = TokenBucket(self.rate, self.burst, self._clock)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+
+        wait = bucket.take()
+        if wait:
+            self.limited_client += 1
+            return "client", wait
+        wait = self._global.take()
+        if wait:
+            # A ficha do cliente não foi usada
+            bucket.refund()
+            self.limited_global += 1
+            return "global", wait
+        self.allowed += 1
+        return None, 0.0
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "global_rate": self._global.rate,
+            "clients": len(self._clients),
+            "allowed": self.allowed,
+            "limited_client": self.limited_client,
+            "limited_global": self.limited_global,
+        }
+
+
+class AdaptiveThrottle:
+    """
+    Circuito e ritmo adaptativo das extrações (ver o docstring do módulo).
+
+    `acquire` antes de extrair, `record` com o resultado (ou `refund`, se a
+    extração foi recusada antes de ir ao YouTube). Thread-safe: o
+    `record` pode vir do pool de extração.
+    """
+
+    def __init__(
+        self,
+        max_rate: float,
+        min_rate: float,
+        threshold: float = 0.2,
+        min_challenges: int = 3,
+        window: float = 60.0,
+        backoff: float = 10.0,
+        max_backoff: float = 300.0,
+        recovery: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+        jitter: Callable[[], float] = random.random,
+    ):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.threshold = threshold
+        self.min_challenges = min_challenges
+        self.window = window
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.recovery = recovery
+        self._clock = clock
+        self._jitter = jitter
+        self._lock = threading.Lock()
+        self.rate = max_rate
+        self._bucket = TokenBucket(max_rate, max(max_rate, 1.0), clock)
+        self._samples: deque[tuple[float, bool]] = deque()
+        self._adjusted = clock()
+        self.state = "closed"  # closed, open, half_open
+        self.open_until = 0.0
+        self.consecutive_trips = 0
+        self.trips = 0
+        self.challenges = 0
+        self.throttled = 0
+
+    def _recover(self, now: float):
+        # Aumento linear enquanto o circuito está fechado
+        if self.state == "closed" and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + (now - self._adjusted) * self.recovery)
+            self._bucket.set_rate(self.rate, max(self.rate, 1.0))
+            if self.rate >= self.max_rate:
+                self.consecutive_trips = 0
+        self._adjusted = now
+
+    def _trip(self, now: float):
+        self.trips += 1
+        self.consecutive_trips += 1
+        self.rate = max(self.rate / 2, self.min_rate)
+        self._bucket.set_rate(self.rate, max(self.rate, 1.0))
+        self._bucket.tokens = 0.0
+        delay = min(self.backoff * 2 ** (self.consecutive_trips - 1), self.max_backoff)
+        # "Equal jitter": metade fixa, metade aleatória, para os clientes não voltarem juntos
+        delay = delay / 2 + self._jitter() * delay / 2
+        self.open_until = now + delay
+        self.state = "open"
+        self._samples.clear()
+        self._adjusted = now
+        logger.warning(
+            f"Verificações do YouTube em excesso: extrações pausadas por {delay:.0f}s, "
+            f"ritmo reduzido para {self.rate:.2f}/s"
+        )
+
+    def acquire(self) -> float:
+        """0 se a extração pode ir ao YouTube agora; senão, segundos de espera."""
+        with self._lock:
+            now = self._clock()
+            if self.state == "open":
+                if now < self.open_until:
+                    self.throttled += 1
+                    return self.open_until - now
+                self.state = "half_open"
+            self._recover(now)
+            wait = self._bucket.take()
+            if wait:
+                self.throttled += 1
+            return wait
+
+    def refund(self):
+        """Devolve a ficha de um `acquire` cuja extração nem saiu (pool sem vaga)."""
+        with self._lock:
+            self._bucket.refund()
+
+    def record(self, blocked: bool):
+        with self._lock:
+            now = self._clock()
+            if blocked:
+                self.challenges += 1
+            if self.state == "half_open":
+                if blocked:
+                    self._trip(now)
+                else:
+                    logger.info(f"Extrações voltaram a passar; ritmo em {self.rate:.2f}/s")
+                    self.state = "closed"
+                    self._adjusted = now
+                return
+            self._samples.append((now, blocked))
+            while self._samples and self._samples[0][0] < now - self.window:
+                self._samples.popleft()
+            if blocked and self.state == "closed":
+                challenges = sum(1 for _, b in self._samples if b)
+                if challenges >= self.min_challenges and challenges / len(self._samples) >= self.threshold:
+                    self._trip(now)
+
+    def retry_after(self) -> float:
+        """Espera sugerida ao cliente depois de um bloqueio."""
+        with self._lock:
+            if self.state == "open":
+                return max(self.open_until - self._clock(), 1.0)
+            return max(1 / self.rate, 1.0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            self._recover(now)
+            return {
+                "state": self.state,
+                "open": 1 if self.state == "open" and now < self.open_until else 0,
+                "rate": round(self.rate, 3),
+                "max_rate": self.max_rate,
+                "reopens_in": round(max(self.open_until - now, 0.0), 1) if self.state == "open" else 0,
+                "trips": self.trips,
+                "challenges": self.challenges,
+                "throttled": self.throttled,
+            }
+
+
+def _worker_share(rate: float) -> float:
+    """Parte de um ritmo global que cabe a este worker."""
+    if shared_state_dir() is None:
+        return rate
+    return rate / max(get_settings().SERVER_WORKERS, 1)
+
+
+@lru_cache()
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """None com `RATE_LIMIT_ENABLED=false`."""
+    settings = get_settings()
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    return RateLimiter(
+        rate=settings.RATE_LIMIT_PER_CLIENT,
+        burst=settings.RATE_LIMIT_CLIENT_BURST,
+        global_rate=_worker_share(settings.RATE_LIMIT_GLOBAL),
+        global_burst=max(_worker_share(settings.RATE_LIMIT_GLOBAL_BURST), 1.0),
+        max_clients=settings.RATE_LIMIT_MAX_CLIENTS,
+    )
+
+
+@lru_cache()
+def get_upstream_throttle() -> AdaptiveThrottle:
+    settings = get_settings()
+    return AdaptiveThrottle(
+        max_rate=_worker_share(settings.UPSTREAM_MAX_RATE),
+        min_rate=_worker_share(settings.UPSTREAM_MIN_RATE),
+        threshold=settings.UPSTREAM_CHALLENGE_THRESHOLD,
+        min_challenges=settings.UPSTREAM_MIN_CHALLENGES,
+        window=settings.UPSTREAM_WINDOW,
+        backoff=settings.UPSTREAM_BACKOFF,
+        max_backoff=settings.UPSTREAM_MAX_BACKOFF,
+        recovery=_worker_share(settings.UPSTREAM_RECOVERY),
+    )
@@ -0,0 +1,85 @@
+"""
+Runtime Probe Module.
+
+Verifica uma única vez (no startup) se o runtime JS exigido pelo yt-dlp está
+disponível e memoriza o resultado. Só volta a executar `node --version` depois
+de uma falha ou quando um admin pede explicitamente.
+"""
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from loguru import logger
+
+
+@dataclass(frozen=True)
+class RuntimeStatus:
+    available: bool
+    path: Optional[str]
+    version: Optional[str]
+    error: Optional[str]
+    checked_at: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class NodeRuntimeProbe:
+    """Probe memoizado do Node.js."""
+
+    def __init__(self, executable: str = "node", timeout: float = 5.0, retry_interval: float = 30.0):
+        self.executable = executable
+        self.timeout = timeout
+        # Após uma falha, espera ao menos isso antes de tentar de novo, para
+        # não voltar a fazer um fork por request enquanto o node estiver ausente.
+        self.retry_interval = retry_interval
+        self._status: Optional[RuntimeStatus] = None
+        self._lock = threading.Lock()
+
+    @property
+    def last(self) -> Optional[RuntimeStatus]:
+        return self._status
+
+    def probe(self) -> RuntimeStatus:
+        """Executa o probe de fato e atualiza o resultado memorizado."""
+        path = shutil.which(self.executable)
+        if path is None:
+            status = RuntimeStatus(False, None, None, f"'{self.executable}' não encontrado no PATH", time.time())
+        else:
+            try:
+                result = subprocess.run(
+                    [path, "--version"],
+                    capture_output=True,
+                    text=True,
+                    timeout=self.timeout,
+                    check=True,
+                )
+                status = RuntimeStatus(True, path, result.stdout.strip(), None, time.time())
+            except (OSError, subprocess.SubprocessError) as e:
+                status = RuntimeStatus(False, path, None, repr(e), time.time())
+
+        if status.available:
+            logger.info(f"Runtime JS: {status.path} {status.version}")
+        else:
+            logger.error(f"Runtime JS indisponível: {status.error}")
+        self._status = status
+        return status
+
+    def status(self) -> RuntimeStatus:
+        """Resultado memorizado; só refaz o probe se ainda não houver um ou se o último falhou."""
+        status = self._status
+        if status is not None and status.available:
+            return status
+        with self._lock:
+            status = self._status
+            if status is None or (
+                not status.available and time.time() - status.checked_at >= self.retry_interval
+            ):
+                status = self.probe()
+        return status
+
+
+node_runtime = NodeRuntimeProbe()
@@ -0,0 +1,212 @@
+"""
+Shared State Module.
+
+Coordenação entre os workers do servidor (`python -m app.server`) sem
+serviço externo: arquivos em `SHARED_STATE_DIR` (de preferência em
+`/dev/shm`) com `flock`.
+
+- `SharedSlots`: semáforo entre processos com N arquivos de vaga. Ocupar uma
+  vaga é ter o `flock` exclusivo de um dos arquivos; se o worker morrer, o
+  kernel solta o lock, então uma vaga nunca fica presa. É o que mantém
+  `EXTRACTION_MAX_WORKERS`, `FFMPEG_MAX_PROCESSES` e
+  `TRANSCODE_MAX_PROCESSES` globais com vários workers;
+- `key_lock`: exclusão mútua por chave (ex: extração do mesmo vídeo em dois
+  workers: o segundo espera e lê o resultado do cache compartilhado). Um
+  arquivo de lock por chave, apagado ao soltar.
+
+Com `SHARED_STATE_DIR` vazio (um só worker) os getters devolvem None e nada
+disso é usado.
+"""
+import asyncio
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional
+
+from app.core.config import get_settings
+
+# Intervalo entre tentativas de pegar um lock ocupado
+_POLL_INTERVAL = 0.02
+
+
+def _try_flock(fd: int) -> bool:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+class SharedSlots:
+    """
+    `slots` vagas compartilhadas entre processos.
+
+    Cada vaga é aberta uma vez por processo; o `flock` vale por descritor,
+    então duas tasks do mesmo worker também disputam as vagas entre si.
+    """
+
+    def __init__(self, directory: str, name: str, slots: int, poll_interval: float = _POLL_INTERVAL):
+        self.directory = directory
+        self.name = name
+        self.slots = slots
+        self.poll_interval = poll_interval
+        os.makedirs(directory, exist_ok=True)
+        self._fds = [
+            os.open(os.path.join(directory, f"{name}.{i}.slot"), os.O_RDWR | os.O_CREAT, 0o600)
+            for i in range(slots)
+        ]
+        self._held: set[int] = set()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+
+    def try_acquire(self) -> Optional[int]:
+        """Número da vaga obtida, ou None se todas estiverem ocupadas (em qualquer worker)."""
+        with self._lock:
+            for i, fd in enumerate(self._fds):
+                if i not in self._held and _try_flock(fd):
+                    self._held.add(i)
+                    self.acquired += 1
+                    return i
+        return None
+
+    async def acquire(self) -> int:
+        """Espera uma vaga (tentando a cada `poll_interval`); cancelável."""
+        slot = self.try_acquire()
+        if slot is not None:
+            return slot
+        self.waited += 1
+        while slot is None:
+            await asyncio.sleep(self.poll_interval)
+            slot = self.try_acquire()
+        return slot
+
+    def release(self, slot: int):
+        # Pode vir de outra thread (callback do executor de extração)
+        with self._lock:
+            if slot in self._held:
+                fcntl.flock(self._fds[slot], fcntl.LOCK_UN)
+                self._held.discard(slot)
+
+    @asynccontextmanager
+    async def hold(self):
+        slot = await self.acquire()
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def busy(self) -> int:
+        """Vagas ocupadas em todos os workers (testa cada arquivo sem ficar com ele)."""
+        busy = len(self._held)
+        with self._lock:
+            for i, fd in enumerate(self._fds):
+                if i in self._held:
+                    continue
+                if _try_flock(fd):
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    busy += 1
+        return busy
+
+    def close(self):
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+        self._held.clear()
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "held_here": len(self._held),
+            "busy": self.busy(),
+            "acquired": self.acquired,
+            "waited": self.waited,
+        }
+
+
+def _key_path(directory: str, key: str) -> str:
+    return os.path.join(directory, f"key-{hashlib.sha1(key.encode()).hexdigest()}.lock")
+
+
+def _try_key_flock(path: str) -> Optional[int]:
+    """
+    Descritor com o `flock` do arquivo da chave, ou None se outro worker o tem.
+
+    Quem solta o lock apaga o arquivo: se o arquivo travado aqui já não é o
+    que está no caminho, outro worker entrou com um arquivo novo e a
+    tentativa é refeita.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    if not _try_flock(fd):
+        os.close(fd)
+        return None
+    try:
+        current = os.stat(path)
+    except FileNotFoundError:
+        current = None
+    if current is None or current.st_ino != os.fstat(fd).st_ino:
+        os.close(fd)
+        return None
+    return fd
+
+
+# Locks de `key_lock` dentro deste worker: chave -> (lock, tasks usando)
+_local_key_locks: dict[str, list] = {}
+
+
+@asynccontextmanager
+async def _local_key_lock(key: str):
+    entry = _local_key_locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _local_key_locks[key]
+
+
+@asynccontextmanager
+async def key_lock(directory: str, key: str, poll_interval: float = _POLL_INTERVAL):
+    """
+    Lock exclusivo de `key` entre processos, esperando sem bloquear o loop.
+
+    Dentro do worker a espera é num `asyncio.Lock` por chave (sem polling);
+    só a task da frente disputa o `flock` do arquivo da chave com os outros
+    workers. O arquivo é apagado ao soltar, então o diretório não cresce com
+    o número de chaves, e chaves diferentes nunca esperam uma pela outra.
+    """
+    async with _local_key_lock(key):
+        os.makedirs(directory, exist_ok=True)
+        path = _key_path(directory, key)
+        fd = _try_key_flock(path)
+        while fd is None:
+            await asyncio.sleep(poll_interval)
+            fd = _try_key_flock(path)
+        try:
+            yield
+        finally:
+            # Apaga ainda com o lock; fechar o descritor solta o flock
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+
+def shared_state_dir() -> Optional[str]:
+    return get_settings().SHARED_STATE_DIR or None
+
+
+@lru_cache()
+def get_shared_slots(name: str, slots: int) -> Optional[SharedSlots]:
+    """Vagas globais `name` (None com um só worker ou `slots` <= 0)."""
+    directory = shared_state_dir()
+    if directory is None or slots <= 0:
+        return None
+    return SharedSlots(os.path.join(directory, "slots"), name, slots)
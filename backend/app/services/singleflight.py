@@ -0,0 +1,53 @@
+"""
+Single-Flight Module.
+
+Coalesce chamadas concorrentes com a mesma chave em uma única execução:
+quem chega enquanto a extração de um vídeo está em andamento espera por ela
+e recebe o mesmo resultado (ou a mesma exceção).
+"""
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplicação de trabalho assíncrono por chave.
+
+    A execução compartilhada roda em uma task própria. Cada chamador espera por
+    ela via `asyncio.shield`, então cancelar um chamador (ex: cliente que
+    desconectou) não cancela o trabalho dos demais.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.shared = 0  # Chamadas que reaproveitaram uma execução em andamento
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Evita o aviso "exception was never retrieved" quando todos os
+        # chamadores cancelaram antes do fim.
+        if not task.cancelled():
+            task.exception()
+
+
+extraction_flights = SingleFlight()
+stream_flights = SingleFlight()
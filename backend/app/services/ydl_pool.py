@@ -0,0 +1,270 @@
+"""
+YoutubeDL Pool Module.
+
+Mantém instâncias `YoutubeDL` pré-inicializadas e reaproveitáveis, para que
+sessões HTTP (curl_cffi), conexões TLS, cookies e extratores já instanciados
+sobrevivam entre requests em vez de serem recriados a cada `get_info`.
+
+O `yt_dlp` (e o curl_cffi que vem com ele) só é importado na primeira
+instância, não no import do app: o `/health` responde antes disso e o
+`app.server` com `SERVER_PRELOAD` importa tudo uma vez via `preload` antes
+de criar os workers.
+
+Cada perfil de saída (`app.services.egress`) tem o seu pool: sessões,
+cookies e o proxy/endereço de origem ficam presos à instância, então uma
+instância nunca troca de IP no meio do caminho.
+"""
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from typing import Any, Callable, Iterator, Optional
+
+from loguru import logger
+
+from app.core.config import get_settings
+from app.services.egress import get_egress_pool
+
+# Módulos pesados usados na extração: yt-dlp, o extrator do YouTube e o
+# handler curl_cffi da impersonação
+PRELOAD_MODULES = (
+    "yt_dlp",
+    "yt_dlp.extractor.youtube",
+    "yt_dlp.networking._curlcffi",
+)
+
+
+def preload() -> list[str]:
+    """Importa `PRELOAD_MODULES` agora; devolve os que não estão disponíveis."""
+    missing = []
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            missing.append(module)
+    return missing
+
+
+def base_ydl_options() -> dict:
+    """Opções usadas por todas as instâncias de extração."""
+    from yt_dlp.networking.impersonate import ImpersonateTarget
+
+    return {
+        'quiet': True,
+        'no_warnings': True,
+        'impersonate': ImpersonateTarget(client='chrome'),
+        'js_runtimes': {'node': {}},
+    }
+
+
+def profile_ydl_options(profile: str) -> dict:
+    """`base_ydl_options` com proxy, endereço, impersonação e cookies do perfil."""
+    options = base_ydl_options()
+    egress = get_egress_pool().get(profile)
+    if egress is not None:
+        options.update(egress.ydl_options())
+    return options
+
+
+def flat_ydl_options(profile: Optional[str] = None) -> dict:
+    """Listagem de playlists: só as entradas (id, título), sem resolver cada vídeo."""
+    return {**profile_ydl_options(profile), 'extract_flat': 'in_playlist'}
+
+
+def _keeps_instance_healthy(exc: BaseException) -> bool:
+    """
+    Erros "esperados" do extrator (vídeo privado, removido...) não dizem nada
+    sobre a sessão. Qualquer outro erro (rede, bloqueio, challenge) recicla a
+    instância para que o próximo request comece com sessão e cookies limpos.
+    """
+    from yt_dlp.utils import DownloadError, ExtractorError
+
+    cause = exc
+    if isinstance(exc, DownloadError) and exc.exc_info:
+        cause = exc.exc_info[1]
+    return isinstance(cause, ExtractorError) and bool(cause.expected)
+
+
+@dataclass
+class PooledYDL:
+    ydl: Any
+    handle: Any  # Retorno de __enter__ (a própria instância em yt-dlp)
+    created_at: float
+    uses: int = 0
+
+
+class YoutubeDLPool:
+    """
+    Pool de instâncias `YoutubeDL` com checkout/checkin.
+
+    - Instâncias ociosas são reaproveitadas na ordem LIFO (a mais quente primeiro).
+    - Uma instância é descartada ao exceder `max_age` segundos ou `max_uses`
+      extrações, ou quando a extração falha de um jeito que indica sessão ruim.
+    - No máximo `max_size` instâncias ficam ociosas; o número em uso é limitado
+      pelo pool de extração.
+    """
+
+    def __init__(
+        self,
+        options_factory: Callable[[], dict] = base_ydl_options,
+        max_size: int = 4,
+        max_age: float = 900.0,
+        max_uses: int = 200,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.options_factory = options_factory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self._clock = clock
+        self._idle: list[PooledYDL] = []
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+
+    def _create(self) -> PooledYDL:
+        import yt_dlp
+
+        ydl = yt_dlp.YoutubeDL(self.options_factory())
+        handle = ydl.__enter__()
+        self.created += 1
+        return PooledYDL(ydl=ydl, handle=handle, created_at=self._clock())
+
+    def _expired(self, item: PooledYDL) -> bool:
+        return (
+            self._clock() - item.created_at >= self.max_age
+            or item.uses >= self.max_uses
+        )
+
+    def _close(self, item: PooledYDL):
+        try:
+            item.ydl.__exit__(None, None, None)
+        except Exception as e:
+            logger.warning(f"Erro ao fechar instância do yt-dlp: {e!r}")
+
+    def checkout(self) -> PooledYDL:
+        stale = []
+        item = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.pop()
+                if self._expired(candidate):
+                    stale.append(candidate)
+                    continue
+                item = candidate
+                self.reused += 1
+                break
+            self.in_use += 1
+            self.recycled += len(stale)
+        for old in stale:
+            self._close(old)
+        if item is None:
+            try:
+                item = self._create()
+            except Exception:
+                with self._lock:
+                    self.in_use -= 1
+                raise
+        item.uses += 1
+        return item
+
+    def checkin(self, item: PooledYDL, healthy: bool = True):
+        with self._lock:
+            self.in_use -= 1
+            keep = healthy and not self._expired(item) and len(self._idle) < self.max_size
+            if keep:
+                self._idle.append(item)
+            else:
+                self.recycled += 1
+        if not keep:
+            self._close(item)
+
+    @contextmanager
+    def lease(self) -> Iterator[Any]:
+        """Empresta uma instância pronta para `extract_info` e a devolve ao final."""
+        item = self.checkout()
+        try:
+            yield item.handle
+        except BaseException as e:
+            healthy = isinstance(e, Exception) and _keeps_instance_healthy(e)
+            self.checkin(item, healthy=healthy)
+            raise
+        else:
+            self.checkin(item)
+
+    def prewarm(self, count: int):
+        """Cria instâncias antecipadamente (no startup) até `count` ociosas."""
+        created = []
+        for _ in range(max(0, min(count, self.max_size) - len(self._idle))):
+            created.append(self._create())
+        with self._lock:
+            self._idle.extend(created)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for item in idle:
+            self._close(item)
+
+    def stats(self) -> dict:
+        return {
+            "idle": len(self._idle),
+            "in_use": self.in_use,
+            "max_size": self.max_size,
+            "created": self.created,
+            "reused": self.reused,
+            "recycled": self.recycled,
+        }
+
+
+@lru_cache()
+def _profile_ydl_pool(profile: str) -> YoutubeDLPool:
+    settings = get_settings()
+    return YoutubeDLPool(
+        options_factory=partial(profile_ydl_options, profile),
+        max_size=settings.YDL_POOL_MAX_SIZE,
+        max_age=settings.YDL_POOL_MAX_AGE,
+        max_uses=settings.YDL_POOL_MAX_USES,
+    )
+
+
+def get_ydl_pool(profile: Optional[str] = None) -> YoutubeDLPool:
+    """Pool das instâncias que saem pelo perfil `profile`; None = só as opções base."""
+    return _profile_ydl_pool(profile or "")
+
+
+def clear_ydl_pools():
+    """Fecha as instâncias ociosas (extração e listagem) do pool sem perfil e dos de cada perfil."""
+    for profile in ("", *get_egress_pool().profiles):
+        get_ydl_pool(profile).clear()
+        get_flat_ydl_pool(profile).clear()
+
+
+def ydl_pools_stats() -> dict:
+    """`stats` somado dos pools de todos os perfis de saída."""
+    total = {"pools": 0}
+    for profile in get_egress_pool().profiles:
+        total["pools"] += 1
+        for key, value in get_ydl_pool(profile).stats().items():
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+@lru_cache()
+def _profile_flat_ydl_pool(profile: str) -> YoutubeDLPool:
+    settings = get_settings()
+    return YoutubeDLPool(
+        options_factory=partial(flat_ydl_options, profile),
+        max_size=settings.YDL_POOL_MAX_SIZE,
+        max_age=settings.YDL_POOL_MAX_AGE,
+        max_uses=settings.YDL_POOL_MAX_USES,
+    )
+
+
+def get_flat_ydl_pool(profile: Optional[str] = None) -> YoutubeDLPool:
+    """Pool das instâncias de listagem 'flat' que saem pelo perfil `profile`."""
+    return _profile_flat_ydl_pool(profile or "")
@@ -1,131 +1,739 @@
-import yt_dlp
 from loguru import logger
 import asyncio
-from yt_dlp.networking.impersonate import ImpersonateTarget
+import itertools
+import os
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+from app.core.config import get_settings
+from app.services.extraction_pool import get_extraction_pool, PoolSaturatedError, ExtractionTimeoutError
+from app.services.info_cache import cache_key, canonical_video_id, get_info_cache, info_ttl, is_playlist_url
+from app.services.singleflight import extraction_flights, stream_flights
+from app.services.broadcast import get_broadcast_hub
+from app.services.ffmpeg_service import (
+    AUDIO_CODECS,
+    FfmpegService,
+    ffmpeg_can_fetch,
+    get_ffmpeg_limiter,
+    get_transcode_limiter,
+)
+from app.services import metrics
+from app.services.format_index import FormatIndex
+from app.services.info_projection import SlimInfo, project_info
+from app.services.playlist import PlaylistPage, entry_url, get_playlist_pager, lazy_entries
+from app.services.process_supervisor import get_process_supervisor
+from app.services.egress import get_egress_pool
+from app.services.rate_limit import BotChallengeError, UpstreamThrottledError, get_upstream_throttle, is_bot_challenge
+from app.services.shared_state import key_lock, shared_state_dir
+from app.services.runtime_probe import node_runtime
+from app.services.ydl_pool import get_flat_ydl_pool, get_ydl_pool
+from app.services.media_cache import get_media_cache
+from app.services.media_proxy import (
+    ByteRange,
+    ProxiedMedia,
+    RangeNotSatisfiableError,
+    UpstreamError,
+    format_size,
+    format_validators,
+    get_media_proxy,
+    is_proxyable,
+    select_format,
+)
+
+
+@dataclass
+class MediaStream:
+    """Stream pronto para virar resposta HTTP."""
+    body: Optional[AsyncIterator[bytes]]
+    media_type: str
+    filename: str
+    engine: str
+    status_code: int = 200
+    headers: dict = field(default_factory=dict)
+    file_path: Optional[str] = None  # Servir direto do disco (cache de mídia)
+    close: Optional[Callable[[], Awaitable[None]]] = None
+
+    async def aclose(self):
+        """
+        Fecha o corpo e solta o que ele segura (upstream, perfil de saída,
+        `.part` do cache), tenha ele sido lido ou não. Quem serve o stream
+        chama isto no fim, inclusive quando o cliente sai antes do primeiro
+        pedaço; fechar de novo não faz nada.
+        """
+        aclose = getattr(self.body, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        if self.close is not None:
+            await self.close()
+
+
+T = TypeVar("T")
+
+
+async def _throttled(call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Roda `call` (uma ida ao YouTube) no ritmo que ele está aceitando: sem
+    ficha no `UpstreamThrottle` recusa de imediato, e o resultado alimenta o
+    circuito. Um desafio anti-bot vira `UpstreamThrottledError` (Retry-After
+    em vez de 400: retentar na hora só piora o bloqueio).
+    """
+    throttle = get_upstream_throttle()
+    wait = throttle.acquire()
+    if wait:
+        metrics.upstream_throttled.inc(reason="open" if throttle.state == "open" else "rate")
+        raise UpstreamThrottledError(wait)
+    try:
+        result = await call()
+    except BotChallengeError as e:
+        throttle.record(blocked=True)
+        raise UpstreamThrottledError(throttle.retry_after(), str(e)) from e
+    except ExtractionTimeoutError:
+        # Demora não diz se o YouTube está bloqueando
+        raise
+    except PoolSaturatedError:
+        # Recusada antes de ir ao YouTube: a ficha do ritmo volta
+        throttle.refund()
+        raise
+    except Exception:
+        throttle.record(blocked=False)
+        raise
+    throttle.record(blocked=False)
+    return result
+
+
+def _media_closer(media: ProxiedMedia, writer) -> Callable[[], Awaitable[None]]:
+    """Solta a mídia do proxy e o `.part` do cache, tenham sido lidos ou não."""
+    async def close():
+        if writer is not None:
+            # Um tee nunca iterado não roda o próprio `finally`
+            writer.abort()
+        await media.aclose()
+    return close
+
+
+@dataclass
+class StreamTarget:
+    """Formato escolhido para um stream, resolvido antes de abrir o upstream."""
+    url: str
+    format_str: str
+    media_type: str
+    filename: str
+    fmt: Optional[dict] = None  # None: só o subprocess sabe servir
+    video_id: Optional[str] = None
+    audio_fmt: Optional[dict] = None  # Só no modo 'muxed' (fmt é o vídeo)
+    codec: Optional[str] = None  # Só no modo 'audio' com conversão no servidor
+    bitrate: Optional[int] = None
+
+    @property
+    def muxed(self) -> bool:
+        return self.fmt is not None and self.audio_fmt is not None
+
+    @property
+    def transcoded(self) -> bool:
+        return self.fmt is not None and self.codec is not None
+
+    @property
+    def proxyable(self) -> bool:
+        return not self.muxed and not self.transcoded and self.fmt is not None and is_proxyable(self.fmt)
+
+    @property
+    def size(self) -> Optional[int]:
+        return format_size(self.fmt) if self.fmt else None
+
+    def validators(self) -> dict:
+        """ETag/Last-Modified; vazio quando o stream vai pelo subprocess."""
+        return format_validators(self.video_id, self.fmt) if self.proxyable else {}
+
+
+@dataclass
+class BatchItem:
+    """Resultado de uma URL do lote: `info` ou `error`."""
+    index: int
+    url: str
+    info: Optional[dict] = None
+    error: Optional[Exception] = None
+
 
 class YtDlpService:
     @staticmethod
     def validate_integrity():
-        """Verifica se o ambiente tem os requisitos mínimos (Node.js)"""
-        try:
-            import subprocess
-            subprocess.check_call(["node", "--version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except (OSError, subprocess.CalledProcessError):
+        """
+        Verifica se o ambiente tem os requisitos mínimos (Node.js).
+
+        Usa o resultado memorizado do probe de startup, sem fork por request.
+        """
+        status = node_runtime.status()
+        if not status.available:
             raise RuntimeError("Node.js não encontrado ou não executável. O backend não pode processar downloads sem um runtime JS válido.")
 
     @staticmethod
-    def get_info(url: str):
+    def get_info(url: str, egress: Optional[str] = None):
         """
         Extrai informações do vídeo usando yt-dlp.
 
         Args:
             url (str): URL do vídeo do YouTube.
+            egress (str): Perfil de saída (proxy/IP, impersonação, cookies) usado na extração.
 
         Returns:
             dict: Dicionário contendo metadados e formatos filtrados.
         """
         YtDlpService.validate_integrity()
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'impersonate': ImpersonateTarget(client='chrome'),
-            'js_runtimes': {'node': {}},
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # Instância quente do pool: reaproveita sessão HTTP, cookies e extratores
+        with get_ydl_pool(egress).lease() as ydl:
             try:
+                started = time.perf_counter()
                 info = ydl.extract_info(url, download=False)
+                extracted = time.perf_counter()
+                metrics.extraction_phase.observe(extracted - started, phase="network")
 
-                formats = info.get('formats', [])
-                # Use a dictionary to keep unique heights, keeping the best format for that height
-                # Key: height, Value: {id, filesize, ...}
-                unique_qualities = {}
-                best_audio_size = 0
-
-                logger.info(f"Processando {len(formats)} formatos para {url}")
-
-                for f in formats:
-                    height = f.get('height')
-                    vcodec = f.get('vcodec')
-                    acodec = f.get('acodec')
-                    filesize = f.get('filesize') or f.get('filesize_approx') or 0
-                    ext = f.get('ext')
-
-                    # Logic for Video Qualities
-                    if height and isinstance(height, int) and height > 0:
-                         if vcodec is None or vcodec != 'none':
-                            # Prefer format with filesize if available
-                            current = unique_qualities.get(height)
-                            # If we don't have this height yet, OR if the new one has a filesize (and existing didn't)
-                            if not current or (filesize > 0 and current['filesize'] == 0):
-                                unique_qualities[height] = {
-                                    'height': height,
-                                    'filesize': filesize,
-                                    'format_id': f.get('format_id')
-                                }
-
-                    # Logic for Audio Size
-                    # We look for 'audio only' formats (vcodec='none')
-                    # We prioritize m4a since that's what we stream
-                    if vcodec == 'none' and acodec != 'none' and filesize > 0:
-                        if ext == 'm4a':
-                             # Found m4a audio, update if it's larger (likely higher quality)
-                             if filesize > best_audio_size:
-                                 best_audio_size = filesize
-                        elif best_audio_size == 0:
-                             # If we haven't found any m4a yet, take this (e.g. webm) as a weak fallback estimate
-                             best_audio_size = filesize
-
-                # Convert to list and sort
-                final_mx = []
-                for h in sorted(unique_qualities.keys(), reverse=True):
-                    final_mx.append(unique_qualities[h])
-
-                info['qualities'] = final_mx
-                info['audio_filesize'] = best_audio_size
+                # Índice montado uma vez e guardado com o info: qualidades do
+                # /info e o format_id exato de cada stream saem dele
+                index = FormatIndex.build(info.get('formats'))
+                logger.info(f"Indexados {len(index.positions)} formatos para {url}")
+
+                info['format_index'] = index
+                info['qualities'] = index.qualities
+                info['audio_filesize'] = index.audio_filesize
+                metrics.extraction_phase.observe(time.perf_counter() - extracted, phase="processing")
+                metrics.extraction_results.inc(outcome="ok")
                 return info
             except Exception as e:
                 logger.error(f"Erro ao obter info do vídeo: {e}")
-                error_msg = str(e)
-                if "Sign" in error_msg or "challenge" in error_msg or "bot" in error_msg.lower():
-                    raise Exception("YouTube bloqueou o acesso. Tente novamente.")
+                if is_bot_challenge(e):
+                    metrics.extraction_results.inc(outcome="blocked")
+                    raise BotChallengeError()
+                metrics.extraction_results.inc(outcome="error")
                 raise e
 
     @staticmethod
-    async def stream_video(url: str, format_str: str):
-        """Gera um stream de bytes diretamente do stdout do yt-dlp."""
-        import sys
+    def get_slim_info(url: str, egress: Optional[str] = None) -> SlimInfo:
+        """
+        `get_info` já projetado para o `SlimInfo`.
 
-        cmd = [
-            sys.executable, "-m", "yt_dlp",
-            "--quiet", "--no-warnings",
-            "-f", format_str,
-            "-o", "-",
-            url
-        ]
+        Roda dentro do worker de extração: o dict bruto é descartado ali mesmo
+        e nem atravessa o pool de processos. Só o nome do perfil de saída
+        atravessa; o worker monta as opções dele.
+        """
+        return project_info(YtDlpService.get_info(url, egress), egress)
 
-        logger.info(f"Iniciando stream: {' '.join(cmd)}")
+    @staticmethod
+    async def fetch_info(url: str) -> SlimInfo:
+        """
+        Versão assíncrona de `get_info`, devolvendo a projeção `SlimInfo`.
 
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+        A extração roda no pool de extração, fora do event loop, para que um
+        vídeo lento não trave os demais requests do worker. O resultado fica
+        no cache de metadados, indexado pelo ID canônico do vídeo, e requests
+        concorrentes do mesmo vídeo aguardam a mesma extração.
 
-        try:
-            while True:
-                chunk = await process.stdout.read(64 * 1024)
-                if not chunk:
-                    break
-                yield chunk
+        Cada extração sai pelo perfil de saída menos carregado; um bloqueio
+        põe o perfil em quarentena e as próximas vão pelos outros.
+        """
+        settings = get_settings()
+        key = cache_key(url)
+        cache = get_info_cache() if settings.INFO_CACHE_ENABLED else None
 
-            await process.wait()
+        if cache is not None:
+            info = cache.get(key)
+            if info is not None:
+                logger.debug(f"Cache hit: {key}")
+                return info
+
+        async def extract_via_egress() -> SlimInfo:
+            egress = get_egress_pool()
+            profile = egress.acquire()
+            outcome = None  # Falta de vaga no pool não diz nada sobre o perfil
+            try:
+                info = await get_extraction_pool().run(partial(YtDlpService.get_slim_info, egress=profile.name), url)
+                outcome = "ok"
+            except BotChallengeError:
+                outcome = "blocked"
+                raise
+            except PoolSaturatedError:
+                raise
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                egress.release(profile, outcome)
+            return info
 
-            if process.returncode != 0:
-                stderr = await process.stderr.read()
-                logger.error(f"Stream falhou: {stderr.decode()}")
+        async def extract():
+            # Cache miss: a extração vai ao YouTube no ritmo que ele está aceitando
+            started = time.perf_counter()
+            info = await _throttled(extract_via_egress)
+            metrics.extraction_duration.observe(time.perf_counter() - started, executor=settings.EXTRACTION_EXECUTOR)
+            if cache is not None:
+                cache.set(key, info, info_ttl(info, settings.INFO_CACHE_TTL, settings.INFO_CACHE_EXPIRY_MARGIN))
+            return info
 
+        async def extract_once_across_workers():
+            # Com vários workers e cache compartilhado: um worker extrai, os
+            # outros esperam o lock e encontram o resultado no cache
+            async with key_lock(os.path.join(shared_dir, "flights"), key):
+                info = cache.get(key)
+                if info is not None:
+                    return info
+                return await extract()
+
+        shared_dir = shared_state_dir()
+        flight = extract_once_across_workers if shared_dir and cache is not None else extract
+        # Requests simultâneos do mesmo vídeo compartilham uma única extração
+        return await extraction_flights.do(key, flight)
+
+    @staticmethod
+    def list_playlist(url: str, limit: Optional[int] = None) -> list[str]:
+        """
+        URLs dos primeiros `limit` vídeos de uma playlist/canal, via extração
+        'flat' preguiçosa: só as páginas necessárias são buscadas. Sai pelo
+        perfil de saída menos carregado, como as extrações.
+
+        Raises:
+            BotChallengeError: se o YouTube pediu login ou verificação anti-bot
+                (o perfil de saída entra em quarentena).
+        """
+        YtDlpService.validate_integrity()
+        egress = get_egress_pool()
+        profile = egress.acquire()
+        outcome = None
+        try:
+            with get_flat_ydl_pool(profile.name).lease() as ydl:
+                _, entries = lazy_entries(ydl, url)
+                urls = (entry_url(e) for e in entries)
+                result = list(itertools.islice((u for u in urls if u), limit))
+            outcome = "ok"
+            return result
         except Exception as e:
-            logger.error(f"Erro durante stream: {e}")
-            if process.returncode is None:
-                process.terminate()
-            raise e
+            if not is_bot_challenge(e):
+                raise
+            outcome = "blocked"
+            raise BotChallengeError() from e
+        finally:
+            egress.release(profile, outcome)
+
+    @staticmethod
+    def list_playlist_page(url: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> PlaylistPage:
+        """
+        Uma página da listagem de uma playlist/canal (entradas leves, sem formatos).
+
+        Raises:
+            InvalidCursorError: se o cursor for inválido ou de outra URL.
+        """
+        YtDlpService.validate_integrity()
+        settings = get_settings()
+        limit = min(limit or settings.PLAYLIST_PAGE_SIZE, settings.PLAYLIST_MAX_PAGE_SIZE)
+        return get_playlist_pager().page(url, cursor, limit)
+
+    @staticmethod
+    async def fetch_playlist_page(url: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> PlaylistPage:
+        """
+        Versão assíncrona de `list_playlist_page`, no pool de extração e no
+        ritmo do `UpstreamThrottle`, como as extrações.
+        """
+        return await _throttled(partial(get_extraction_pool().run, YtDlpService.list_playlist_page, url, cursor, limit))
+
+    @staticmethod
+    async def fetch_playlist(url: str, limit: Optional[int] = None) -> list[str]:
+        """Versão assíncrona de `list_playlist`, no pool de extração e no ritmo do `UpstreamThrottle`."""
+        return await _throttled(partial(get_extraction_pool().run, YtDlpService.list_playlist, url, limit))
+
+    @staticmethod
+    async def fetch_info_batch(
+        urls: list[str],
+        max_items: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[BatchItem]:
+        """
+        `fetch_info` de várias URLs, gerando os resultados na ordem em que ficam
+        prontos (não na ordem pedida).
+
+        Playlists/canais são expandidos nos seus vídeos. Até `concurrency`
+        extrações do lote rodam ao mesmo tempo; um erro vira um item com
+        `error`, sem interromper os demais. Se o gerador for fechado (cliente
+        desconectou), as extrações pendentes do lote são canceladas.
+        """
+        settings = get_settings()
+        limit = min(max_items or settings.BATCH_INFO_MAX_ITEMS, settings.BATCH_INFO_MAX_ITEMS)
+
+        expanded: list[tuple[str, Optional[Exception]]] = []
+        for url in urls:
+            if len(expanded) >= limit:
+                break
+            if not is_playlist_url(url):
+                expanded.append((url, None))
+                continue
+            try:
+                entries = await YtDlpService.fetch_playlist(url, limit - len(expanded))
+                expanded.extend((entry, None) for entry in entries)
+            except Exception as e:
+                logger.warning(f"Falha ao listar playlist {url}: {e!r}")
+                expanded.append((url, e))
+        expanded = expanded[:limit]
+
+        semaphore = asyncio.Semaphore(concurrency or settings.BATCH_INFO_CONCURRENCY)
+
+        async def extract(index: int, url: str, error: Optional[Exception]) -> BatchItem:
+            if error is not None:
+                return BatchItem(index, url, error=error)
+            async with semaphore:
+                try:
+                    return BatchItem(index, url, info=await YtDlpService.fetch_info(url))
+                except Exception as e:
+                    return BatchItem(index, url, error=e)
+
+        tasks = [asyncio.ensure_future(extract(i, url, error)) for i, (url, error) in enumerate(expanded)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def stream_target(mode: str, quality: Optional[int] = None):
+        """Seletor do yt-dlp, media type e nome de arquivo para o modo pedido."""
+        if mode == 'audio':
+            return "bestaudio[ext=m4a]", "audio/mp4", "audio.m4a"
+        if mode == 'muxed':
+            # Fallback sem ffmpeg: formato progressivo que já tem áudio
+            if quality:
+                return f"best[height<={quality}][ext=mp4]/best[ext=mp4]/best", "video/mp4", "video.mp4"
+            return "best[ext=mp4]/best", "video/mp4", "video.mp4"
+        # Video mode
+        if quality:
+            return f"bestvideo[height={quality}]", "video/mp4", "video.mp4"
+        return "bestvideo", "video/mp4", "video.mp4"
+
+    @staticmethod
+    async def resolve_stream(
+        url: str,
+        mode: str,
+        quality: Optional[int] = None,
+        codec: Optional[str] = None,
+        bitrate: Optional[int] = None,
+        video_codec: Optional[str] = None,
+    ) -> StreamTarget:
+        """
+        Resolve qual formato será servido, sem abrir o upstream.
+
+        No modo 'proxy' usa o info dict (normalmente já no cache). Se a extração
+        falhar por outro motivo que não falta de capacidade, o alvo fica sem
+        formato e o stream vai pelo subprocess. Um `codec` no modo 'audio' pede
+        conversão no servidor; sem formato de áudio repassável, o stream sai
+        no m4a original. O mesmo vale (e o 'muxed' vai pelo subprocess) quando
+        o perfil de saída do info usa proxy SOCKS ou endereço de origem, que o
+        ffmpeg não sabe usar.
+
+        O formato vem do índice guardado com o info, e o fallback pelo
+        subprocess recebe o `format_id` exato em vez de um seletor.
+        """
+        format_str, media_type, filename = YtDlpService.stream_target(mode, quality)
+        target = StreamTarget(url, format_str, media_type, filename, video_id=canonical_video_id(url))
+
+        if get_settings().STREAM_ENGINE == 'proxy':
+            try:
+                info = await YtDlpService.fetch_info(url)
+                target.video_id = info.get('id') or target.video_id
+                if mode == 'muxed':
+                    video = select_format(info, 'video', quality, video_codec)
+                    audio = select_format(info, 'audio')
+                    if video and audio and is_proxyable(video) and is_proxyable(audio):
+                        if ffmpeg_can_fetch(video) and ffmpeg_can_fetch(audio):
+                            target.fmt, target.audio_fmt = video, audio
+                        else:
+                            logger.info(f"Perfil de saída de {url} não serve ao ffmpeg; muxed pelo subprocess")
+                else:
+                    target.fmt = select_format(info, mode, quality, video_codec)
+                    if target.fmt:
+                        target.format_str = target.fmt['format_id']
+                    if mode == 'audio' and codec in AUDIO_CODECS and target.fmt and is_proxyable(target.fmt):
+                        if ffmpeg_can_fetch(target.fmt):
+                            spec = AUDIO_CODECS[codec]
+                            target.codec, target.bitrate = codec, bitrate or spec.default_bitrate
+                            target.media_type, target.filename = spec.media_type, f"audio.{spec.ext}"
+                        else:
+                            logger.info(f"Perfil de saída de {url} não serve ao ffmpeg; áudio no formato original")
+            except (PoolSaturatedError, ExtractionTimeoutError):
+                # Sem capacidade de extração: não adianta abrir um subprocess que extrai de novo
+                raise
+            except Exception as e:
+                logger.warning(f"Falha ao resolver formato de {url}, usando subprocess: {e!r}")
+        return target
+
+    @staticmethod
+    async def open_stream(
+        url: str,
+        mode: str,
+        quality: Optional[int] = None,
+        byte_range: Optional[ByteRange] = None,
+        target: Optional[StreamTarget] = None,
+        codec: Optional[str] = None,
+        bitrate: Optional[int] = None,
+        video_codec: Optional[str] = None,
+    ) -> MediaStream:
+        """
+        Abre o stream de mídia.
+
+        No modo 'proxy', usa a URL direta do formato resolvido e repassa os
+        bytes dentro do processo. Um `byte_range` é repassado ao upstream como
+        Range, então um download retomado só transfere o que falta. Se o
+        formato não puder ser repassado (DASH/HLS) ou o upstream falhar ao
+        abrir, cai para o subprocess do yt-dlp, que sempre manda o arquivo
+        inteiro.
+
+        Raises:
+            RangeNotSatisfiableError: se o Range começa depois do fim da mídia.
+        """
+        if target is None:
+            target = await YtDlpService.resolve_stream(url, mode, quality, codec, bitrate, video_codec)
+
+        if target.muxed:
+            return YtDlpService._open_muxed_stream(target)
+
+        if target.transcoded:
+            return await YtDlpService._open_transcoded_stream(target, get_media_cache() if target.video_id else None)
+
+        if target.proxyable:
+            fmt = target.fmt
+            media_cache = get_media_cache() if target.video_id else None
+            if media_cache is not None:
+                path = await media_cache.find(target.video_id, fmt.get('format_id'))
+                if path is not None:
+                    logger.info(f"Stream do cache em disco: {path}")
+                    return MediaStream(
+                        None,
+                        target.media_type,
+                        target.filename,
+                        engine='disk',
+                        headers=target.validators(),
+                        file_path=path,
+                    )
+            try:
+                resolved = byte_range.resolve(target.size) if byte_range else None
+                if resolved is None and get_settings().STREAM_BROADCAST_ENABLED:
+                    return await YtDlpService._open_shared_proxy_stream(target, media_cache)
+
+                start, end = resolved or (0, None)
+                media = await get_media_proxy().open(fmt, start, end)
+                writer = None
+                try:
+                    partial = resolved is not None and media.ranged
+                    logger.info(f"Stream via proxy: formato {fmt.get('format_id')} de {url} (bytes {media.start}-{media.end or ''})")
+                    headers = media.response_headers(partial)
+                    headers.update(target.validators())
+                    body = media.body
+                    if media_cache is not None and resolved is None and media.start == 0:
+                        # Download completo: grava no disco enquanto serve o cliente
+                        writer = await media_cache.open_writer(target.video_id, fmt.get('format_id'), fmt.get('ext'), media.total_size)
+                        if writer is not None:
+                            body = media_cache.tee(body, writer)
+                except BaseException:
+                    await _media_closer(media, writer)()
+                    raise
+                return MediaStream(
+                    body,
+                    target.media_type,
+                    target.filename,
+                    engine='proxy',
+                    status_code=206 if partial else 200,
+                    headers=headers,
+                    close=_media_closer(media, writer),
+                )
+            except RangeNotSatisfiableError:
+                raise
+            except UpstreamError as e:
+                if e.status_code == 416:
+                    raise RangeNotSatisfiableError(None) from e
+                logger.warning(f"Upstream recusou o stream de {url}, usando subprocess: {e!r}")
+                get_info_cache().delete(cache_key(url))
+            except Exception as e:
+                logger.warning(f"Proxy de mídia falhou para {url}, usando subprocess: {e!r}")
+                get_info_cache().delete(cache_key(url))
+        elif get_settings().STREAM_ENGINE == 'proxy':
+            logger.info(f"Formato não repassável para {url}; usando subprocess")
+
+        headers = {"Accept-Ranges": "none"}
+        if get_settings().STREAM_BROADCAST_ENABLED:
+            # Um subprocess por mídia distinta, não por cliente
+            hub = get_broadcast_hub()
+            key = ('subprocess', target.video_id or url, target.format_str)
+            broadcast = hub.join(key) or hub.publish(key, YtDlpService.stream_video(url, target.format_str), headers)
+            body = broadcast.subscribe()
+        else:
+            body = YtDlpService.stream_video(url, target.format_str)
+        return MediaStream(body, target.media_type, target.filename, engine='subprocess', headers=headers)
+
+    @staticmethod
+    def _open_muxed_stream(target: StreamTarget) -> MediaStream:
+        """
+        Vídeo + áudio juntos no servidor pelo ffmpeg (stream copy, MP4
+        fragmentado), em vez de o app baixar os dois e juntar no celular.
+
+        Raises:
+            PoolSaturatedError: se todos os ffmpeg estiverem ocupados e a fila cheia.
+        """
+        limiter = get_ffmpeg_limiter()
+        key = ('ffmpeg', target.video_id or target.url, target.fmt.get('format_id'), target.audio_fmt.get('format_id'))
+        headers = {"Accept-Ranges": "none"}
+        hub = get_broadcast_hub() if get_settings().STREAM_BROADCAST_ENABLED else None
+
+        broadcast = hub.join(key) if hub is not None else None
+        if broadcast is None:
+            ticket = limiter.reserve()
+            cmd = FfmpegService.mux_command(target.fmt, target.audio_fmt)
+            logger.info(f"Stream muxed: {target.fmt.get('format_id')}+{target.audio_fmt.get('format_id')} de {target.url}")
+            body = FfmpegService.stream(cmd, limiter, ticket)
+            if hub is None:
+                return MediaStream(body, "video/mp4", "video.mp4", engine='ffmpeg', headers=headers, close=ticket.aclose)
+            broadcast = hub.publish(key, body, headers, close=ticket.aclose)
+        return MediaStream(broadcast.subscribe(), "video/mp4", "video.mp4", engine='ffmpeg', headers=headers)
+
+    @staticmethod
+    async def _open_transcoded_stream(target: StreamTarget, media_cache) -> MediaStream:
+        """
+        Áudio convertido para mp3/opus pelo ffmpeg, em vez de no celular.
+
+        As conversões passam pela fila do `get_transcode_limiter` (uma por
+        núcleo); o header `X-Queue-Position` diz quantas estavam na frente
+        (0: começou de imediato). A saída é gravada no cache de mídia com
+        `format_id` "<codec>-<bitrate>k", então o mesmo pedido depois sai do
+        disco, e pedidos simultâneos iguais compartilham uma conversão.
+
+        Raises:
+            PoolSaturatedError: se todas as vagas e a fila de conversão estiverem ocupadas.
+        """
+        spec = AUDIO_CODECS[target.codec]
+        variant = f"{target.codec}-{target.bitrate}k"
+        if media_cache is not None:
+            path = await media_cache.find(target.video_id, variant)
+            if path is not None:
+                logger.info(f"Áudio convertido do cache em disco: {path}")
+                return MediaStream(None, target.media_type, target.filename, engine='disk', file_path=path)
+
+        limiter = get_transcode_limiter()
+        key = ('transcode', target.video_id or target.url, target.fmt.get('format_id'), variant)
+        headers = {"Accept-Ranges": "none"}
+        hub = get_broadcast_hub() if get_settings().STREAM_BROADCAST_ENABLED else None
+
+        # O writer abre antes do join: entre o join e o publish não pode haver await
+        writer = None
+        if media_cache is not None:
+            writer = await media_cache.open_writer(target.video_id, variant, spec.ext, None)
+        broadcast = hub.join(key) if hub is not None else None
+        if broadcast is None:
+            try:
+                ticket = limiter.reserve()
+            except PoolSaturatedError:
+                if writer is not None:
+                    writer.abort()
+                raise
+            cmd = FfmpegService.transcode_command(target.fmt, target.codec, target.bitrate)
+            logger.info(f"Conversão {variant}: formato {target.fmt.get('format_id')} de {target.url} (fila: {ticket.position})")
+            body = FfmpegService.stream(cmd, limiter, ticket)
+            if writer is not None:
+                body = media_cache.tee(body, writer)
+
+            async def close():
+                if writer is not None:
+                    # Um tee nunca iterado não roda o próprio `finally`
+                    writer.abort()
+                await ticket.aclose()
+
+            if hub is not None:
+                body = hub.publish(key, body, headers, close=close).subscribe()
+                close = None
+            return MediaStream(
+                body,
+                target.media_type,
+                target.filename,
+                engine='ffmpeg',
+                headers={**headers, "X-Queue-Position": str(ticket.position)},
+                close=close,
+            )
+        if writer is not None:
+            writer.abort()
+        return MediaStream(broadcast.subscribe(), target.media_type, target.filename, engine='ffmpeg', headers=headers)
+
+    @staticmethod
+    async def _open_shared_proxy_stream(target: StreamTarget, media_cache) -> MediaStream:
+        """
+        Download completo via proxy, compartilhado entre clientes simultâneos.
+
+        Só o primeiro cliente abre o upstream (e grava no cache em disco, se
+        houver); quem chega enquanto o início ainda está no buffer lê do mesmo
+        broadcast. Um cliente lento demais segue sozinho com um Range a partir
+        de onde parou.
+        """
+        fmt = target.fmt
+        hub = get_broadcast_hub()
+        key = ('proxy', target.video_id or target.url, fmt.get('format_id'))
+
+        async def resume(pos: int):
+            media = await get_media_proxy().open(fmt, pos)
+            try:
+                async for chunk in media.body:
+                    yield chunk
+            finally:
+                await media.aclose()
+
+        async def open_broadcast():
+            media = await get_media_proxy().open(fmt)
+            writer = None
+            try:
+                logger.info(f"Stream via proxy: formato {fmt.get('format_id')} de {target.url}")
+                headers = media.response_headers(False)
+                headers.update(target.validators())
+                body = media.body
+                if media_cache is not None:
+                    writer = await media_cache.open_writer(target.video_id, fmt.get('format_id'), fmt.get('ext'), media.total_size)
+                    if writer is not None:
+                        body = media_cache.tee(body, writer)
+            except BaseException:
+                await _media_closer(media, writer)()
+                raise
+            return hub.publish(key, body, headers, fallback=resume, close=_media_closer(media, writer))
+
+        broadcast = hub.join(key)
+        if broadcast is None:
+            broadcast = await stream_flights.do(key, open_broadcast)
+        else:
+            logger.info(f"Stream compartilhado: {key}")
+        return MediaStream(
+            broadcast.subscribe(),
+            target.media_type,
+            target.filename,
+            engine='proxy',
+            headers=dict(broadcast.headers),
+        )
+
+    @staticmethod
+    async def stream_video(url: str, format_str: str):
+        """
+        Gera um stream de bytes diretamente do stdout do yt-dlp.
+
+        O yt-dlp extrai de novo, então sai pelo perfil de saída menos
+        carregado no momento, ocupado até o fim do stream.
+        """
+        import sys
+
+        with get_egress_pool().lease() as profile:
+            cmd = [
+                sys.executable, "-m", "yt_dlp",
+                "--quiet", "--no-warnings",
+                *profile.cli_args(),
+                "-f", format_str,
+                "-o", "-",
+                url
+            ]
+
+            # Sem as opções do perfil no log: a URL do proxy pode ter credenciais
+            logger.info(f"Iniciando stream: yt-dlp -f {format_str} {url} (perfil '{profile.name}')")
+
+            # O supervisor drena o stderr em paralelo e encerra o yt-dlp se o
+            # cliente desconectar, em vez de deixá-lo baixando órfão
+            async with aclosing(get_process_supervisor().stream(cmd, "yt-dlp")) as body:
+                async for chunk in body:
+                    yield chunk
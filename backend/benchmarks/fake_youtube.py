@@ -0,0 +1,384 @@
+"""
+Stand-in local do YouTube para os benchmarks.
+
+- `FakeMediaServer`: servidor HTTP/1.1 mínimo (asyncio) que serve bytes
+  sintéticos em `/media/<video_id>/<format_id>?size=N`, com Range, keep-alive,
+  latência até o primeiro byte e banda limitada por conexão;
+- `FakeYoutubeDL`: substitui `yt_dlp.YoutubeDL` no processo do app. O
+  `extract_info` espera a latência configurada e devolve uma lista de formatos
+  parecida com a do YouTube (áudio m4a/webm, vídeo avc1/vp9 de 144p a 1080p,
+  um formato progressivo), com URLs apontando para o servidor acima;
+- `StubProxy`: proxy HTTP de encaminhamento com banda total limitada e, se
+  configurado, 429 depois de N requests, no papel de um IP de saída. Com um
+  proxy por perfil em `EGRESS_PROFILES` dá para medir a vazão crescendo com
+  os perfis e a quarentena de um perfil bloqueado. Um proxy listado em
+  `FakeYoutubeDL.blocked` faz a extração falhar com o erro de "bot".
+
+Nada sai para a rede, então os números dependem só do código do backend e
+dos parâmetros escolhidos.
+
+Uso (de dentro de backend/; o `benchmarks.load` sobe os dois sozinho):
+    python -m benchmarks.fake_youtube media --port 8901 --latency-ms 20 --bandwidth-mbps 100
+    python -m benchmarks.fake_youtube app --port 8900 --media-url http://127.0.0.1:8901 --extract-latency-ms 300
+    python -m benchmarks.fake_youtube proxy --port 8910 --bandwidth-mbps 50
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+# Bloco repetido como conteúdo da mídia; o byte N de qualquer formato é _BLOCK[N % len]
+_BLOCK = bytes(range(256)) * 4096
+_SEND_CHUNK = 64 * 1024
+
+# (format_id, ext, vcodec, acodec, height, fração do tamanho base)
+FORMATS = (
+    ('139', 'm4a', 'none', 'mp4a.40.5', None, 0.4),
+    ('249', 'webm', 'none', 'opus', None, 0.5),
+    ('140', 'm4a', 'none', 'mp4a.40.2', None, 1.0),
+    ('251', 'webm', 'none', 'opus', None, 1.1),
+    ('18', 'mp4', 'avc1.42001E', 'mp4a.40.2', 360, 3.0),
+    ('160', 'mp4', 'avc1.4d400c', 'none', 144, 0.8),
+    ('278', 'webm', 'vp09.00.10.08', 'none', 144, 0.7),
+    ('133', 'mp4', 'avc1.4d4015', 'none', 240, 1.5),
+    ('242', 'webm', 'vp09.00.20.08', 'none', 240, 1.3),
+    ('134', 'mp4', 'avc1.4d401e', 'none', 360, 2.5),
+    ('243', 'webm', 'vp09.00.21.08', 'none', 360, 2.2),
+    ('135', 'mp4', 'avc1.4d401f', 'none', 480, 4.0),
+    ('244', 'webm', 'vp09.00.30.08', 'none', 480, 3.5),
+    ('136', 'mp4', 'avc1.64001F', 'none', 720, 8.0),
+    ('247', 'webm', 'vp09.00.31.08', 'none', 720, 7.0),
+    ('137', 'mp4', 'avc1.640028', 'none', 1080, 15.0),
+    ('248', 'webm', 'vp09.00.40.08', 'none', 1080, 13.0),
+)
+
+
+def video_id_from_url(url: str) -> str:
+    parsed = urlparse(url)
+    values = parse_qs(parsed.query).get('v')
+    return values[0] if values else parsed.path.rstrip('/').rsplit('/', 1)[-1]
+
+
+def synthetic_info(video_id: str, media_url: str, base_size: int, ttl: float = 6 * 3600) -> dict:
+    """Info dict no formato do yt-dlp; `base_size` é o tamanho do áudio 140."""
+    expire = int(time.time() + ttl)
+    formats = []
+    for format_id, ext, vcodec, acodec, height, factor in FORMATS:
+        size = int(base_size * factor)
+        formats.append({
+            'format_id': format_id,
+            'url': f"{media_url}/media/{video_id}/{format_id}?size={size}&expire={expire}",
+            'ext': ext,
+            'vcodec': vcodec,
+            'acodec': acodec,
+            'height': height,
+            'width': height * 16 // 9 if height else None,
+            'filesize': size,
+            'tbr': size * 8 / 1000 / 300,
+            'protocol': 'https',
+            'http_headers': {'User-Agent': 'Mozilla/5.0 (benchmark)'},
+            'downloader_options': {'http_chunk_size': 10 * 1024 * 1024},
+        })
+    return {
+        'id': video_id,
+        'title': f"Vídeo sintético {video_id}",
+        'thumbnail': f"{media_url}/thumb/{video_id}.jpg",
+        'duration': 300,
+        'uploader': 'Canal de Benchmark',
+        'view_count': 1000,
+        'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+        'formats': formats,
+    }
+
+
+class FakeYoutubeDL:
+    """Mesma interface usada pelo backend (`extract_info`, contexto, `close`)."""
+
+    media_url = "http://127.0.0.1:8901"
+    extract_latency = 0.0
+    base_size = 4 * 1024 * 1024
+    # Proxies (params['proxy']) que o "YouTube" está bloqueando
+    blocked: set = set()
+
+    def __init__(self, params: Optional[dict] = None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def extract_info(self, url: str, download: bool = False, process: bool = True, **kwargs) -> dict:
+        if self.extract_latency:
+            time.sleep(self.extract_latency)
+        if self.params.get('proxy') in self.blocked:
+            from yt_dlp.utils import DownloadError
+
+            raise DownloadError("ERROR: [youtube] Sign in to confirm you're not a bot")
+        return synthetic_info(video_id_from_url(url), self.media_url, self.base_size)
+
+
+def install(media_url: str, extract_latency: float = 0.0, base_size: int = 4 * 1024 * 1024):
+    """Troca `yt_dlp.YoutubeDL` pelo stand-in (antes de o app criar instâncias)."""
+    import yt_dlp
+
+    FakeYoutubeDL.media_url = media_url.rstrip('/')
+    FakeYoutubeDL.extract_latency = extract_latency
+    FakeYoutubeDL.base_size = base_size
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    if not header or not header.startswith('bytes='):
+        return None
+    first, _, last = header[6:].split(',')[0].strip().partition('-')
+    if not first:
+        return (max(size - int(last), 0), size - 1) if last else None
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+class FakeMediaServer:
+    """
+    Servidor de mídia sintética.
+
+    `latency`: segundos antes dos headers de cada resposta (RTT + servidor);
+    `bandwidth`: bytes/s por conexão (0 = sem limite).
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0.0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.bytes_sent = 0
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.base_events.Server:
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode('latin-1').split("\r\n")
+                method, target, _ = lines[0].split(' ', 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, _, value = line.partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, method, target, headers)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, method: str, target: str, headers: dict):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        parsed = urlparse(target)
+        size_values = parse_qs(parsed.query).get('size')
+        if not parsed.path.startswith('/media/') or not size_values:
+            status = "204 No Content" if parsed.path == '/ping' else "404 Not Found"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n\r\n".encode())
+            await writer.drain()
+            return
+
+        size = int(size_values[0])
+        byte_range = _parse_range(headers.get('range'), size)
+        if byte_range is not None and byte_range[0] >= size:
+            writer.write(f"HTTP/1.1 416 Range Not Satisfiable\r\nContent-Range: bytes */{size}\r\nContent-Length: 0\r\n\r\n".encode())
+            await writer.drain()
+            return
+        start, end = byte_range if byte_range is not None else (0, size - 1)
+        status = "206 Partial Content" if byte_range is not None else "200 OK"
+        lines = [
+            f"HTTP/1.1 {status}",
+            "Content-Type: application/octet-stream",
+            "Accept-Ranges: bytes",
+            f"Content-Length: {end - start + 1}",
+        ]
+        if byte_range is not None:
+            lines.append(f"Content-Range: bytes {start}-{end}/{size}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        if method != 'HEAD':
+            await self._send_body(writer, start, end)
+        await writer.drain()
+
+    async def _send_body(self, writer: asyncio.StreamWriter, start: int, end: int):
+        view = memoryview(_BLOCK)
+        began = time.monotonic()
+        sent = 0
+        pos = start
+        while pos <= end:
+            offset = pos % len(_BLOCK)
+            n = min(_SEND_CHUNK, end - pos + 1, len(_BLOCK) - offset)
+            writer.write(view[offset:offset + n])
+            await writer.drain()
+            pos += n
+            sent += n
+            if self.bandwidth:
+                # Banda limitada: espera até o tempo "devido" pelos bytes já enviados
+                ahead = sent / self.bandwidth - (time.monotonic() - began)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+        self.bytes_sent += sent
+
+
+async def _read_head(reader: asyncio.StreamReader) -> tuple[str, str, dict]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode('latin-1').split("\r\n")
+    method, target, _ = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, _, value = line.partition(':')
+            headers[name.strip()] = value.strip()
+    return method, target, headers
+
+
+class StubProxy:
+    """
+    Proxy HTTP de encaminhamento (só `GET http://...` em forma absoluta).
+
+    `bandwidth`: bytes/s somando todas as conexões (0 = sem limite), como o
+    link de um IP de saída; `throttle_after`: a partir desse número de
+    requests responde 429, como o googlevideo limitando um IP.
+    """
+
+    def __init__(self, bandwidth: float = 0.0, throttle_after: Optional[int] = None):
+        self.bandwidth = bandwidth
+        self.throttle_after = throttle_after
+        self.requests = 0
+        self.bytes_sent = 0
+        self._free_at = 0.0
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.base_events.Server:
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                method, target, headers = await _read_head(reader)
+                keep_alive = headers.get('Proxy-Connection', headers.get('Connection', '')).lower() != 'close'
+                await self._forward(writer, method, target, headers)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _reply(self, writer: asyncio.StreamWriter, status: str):
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n\r\n".encode())
+        await writer.drain()
+
+    async def _forward(self, writer: asyncio.StreamWriter, method: str, target: str, headers: dict):
+        parsed = urlparse(target)
+        if not parsed.scheme:
+            # Request direto ao proxy: só o /ping de prontidão
+            await self._reply(writer, "204 No Content" if parsed.path == '/ping' else "404 Not Found")
+            return
+        if parsed.scheme != 'http' or method not in ('GET', 'HEAD'):
+            await self._reply(writer, "405 Method Not Allowed")
+            return
+        self.requests += 1
+        if self.throttle_after is not None and self.requests > self.throttle_after:
+            await self._reply(writer, "429 Too Many Requests")
+            return
+
+        upstream_reader, upstream_writer = await asyncio.open_connection(parsed.hostname, parsed.port or 80)
+        try:
+            path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+            forwarded = {k: v for k, v in headers.items() if k.lower() not in ('connection', 'proxy-connection')}
+            lines = [f"{method} {path} HTTP/1.1", *(f"{k}: {v}" for k, v in forwarded.items()), "Connection: close"]
+            upstream_writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+            await upstream_writer.drain()
+            # O upstream fecha depois da resposta; o tamanho está no Content-Length dela
+            while True:
+                data = await upstream_reader.read(_SEND_CHUNK)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+                self.bytes_sent += len(data)
+                if self.bandwidth:
+                    # Banda total do proxy: cada pedaço ocupa o link por len/banda segundos
+                    now = time.monotonic()
+                    self._free_at = max(self._free_at, now) + len(data) / self.bandwidth
+                    if self._free_at > now:
+                        await asyncio.sleep(self._free_at - now)
+        finally:
+            upstream_writer.close()
+
+
+def expected_bytes(start: int, length: int) -> bytes:
+    """Conteúdo que o `FakeMediaServer` serve a partir de `start` (para conferir)."""
+    out = bytearray()
+    pos = start
+    while len(out) < length:
+        offset = pos % len(_BLOCK)
+        piece = _BLOCK[offset:offset + length - len(out)]
+        out += piece
+        pos += len(piece)
+    return bytes(out)
+
+
+async def _run_media(port: int, latency: float, bandwidth: float):
+    server = await FakeMediaServer(latency, bandwidth).serve(port=port)
+    async with server:
+        await server.serve_forever()
+
+
+async def _run_proxy(port: int, bandwidth: float, throttle_after: Optional[int]):
+    server = await StubProxy(bandwidth, throttle_after).serve(port=port)
+    async with server:
+        await server.serve_forever()
+
+
+def _run_app(port: int, media_url: str, extract_latency: float, base_size: int):
+    install(media_url, extract_latency, base_size)
+    import uvicorn
+
+    from app.main import app
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    media = sub.add_parser("media", help="servidor de mídia sintética")
+    media.add_argument("--port", type=int, default=8901)
+    media.add_argument("--latency-ms", type=float, default=0.0)
+    media.add_argument("--bandwidth-mbps", type=float, default=0.0, help="por conexão; 0 = sem limite")
+    app = sub.add_parser("app", help="backend com o yt-dlp trocado pelo stand-in")
+    app.add_argument("--port", type=int, default=8900)
+    app.add_argument("--media-url", default="http://127.0.0.1:8901")
+    app.add_argument("--extract-latency-ms", type=float, default=0.0)
+    app.add_argument("--base-size-kb", type=int, default=4096, help="tamanho do áudio 140; os outros formatos escalam")
+    proxy = sub.add_parser("proxy", help="proxy de saída (um perfil de EGRESS_PROFILES)")
+    proxy.add_argument("--port", type=int, default=8910)
+    proxy.add_argument("--bandwidth-mbps", type=float, default=0.0, help="total do proxy; 0 = sem limite")
+    proxy.add_argument("--throttle-after", type=int, default=None, help="responde 429 depois de N requests")
+    args = parser.parse_args()
+
+    if args.command == "media":
+        asyncio.run(_run_media(args.port, args.latency_ms / 1000, args.bandwidth_mbps * 1_000_000 / 8))
+    elif args.command == "proxy":
+        asyncio.run(_run_proxy(args.port, args.bandwidth_mbps * 1_000_000 / 8, args.throttle_after))
+    else:
+        _run_app(args.port, args.media_url, args.extract_latency_ms / 1000, args.base_size_kb * 1024)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Driver de carga do backend contra o stand-in local do YouTube.
+
+Sobe dois processos, o servidor de mídia sintética e o app (uvicorn) com o
+`yt_dlp.YoutubeDL` trocado pelo `FakeYoutubeDL`
+(`benchmarks/fake_youtube.py`), e mede:
+
+- `/info` frio (uma URL nova por request, passa pela extração) e quente
+  (mesma URL, sai do cache): RPS, p50, p99;
+- `/stream/{video_id}` com N streams simultâneos: throughput agregado, TTFB
+  (p50/p99) e RSS do processo do app por stream (pico menos repouso).
+
+Com `--profiles N` o app sai por N proxies locais (`StubProxy`, um por
+perfil de `EGRESS_PROFILES`), cada um com `--profile-bandwidth-mbps` de banda
+total: o throughput de stream deve crescer com N até o limite do servidor de
+mídia ou da CPU.
+
+Os resultados vão para `benchmarks/results/<data>-<commit>.json` com
+`--save`; `--compare <arquivo>` mostra a variação contra uma execução
+anterior (ex: do commit antes de uma mudança no `YtDlpService`).
+
+Uso (de dentro de backend/):
+    python -m benchmarks.load --save
+    python -m benchmarks.load --streams 32 --bandwidth-mbps 50 --compare benchmarks/results/<arquivo>.json
+    python -m benchmarks.load --streams 32 --profiles 4 --profile-bandwidth-mbps 200
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+RESULTS_DIR = Path(__file__).parent / "results"
+API = "/api/v1/download"
+
+# Métricas comparadas no --compare: (seção, campo, maior é melhor)
+COMPARED = (
+    ("info_cold", "rps", True),
+    ("info_cold", "p99_ms", False),
+    ("info_hot", "rps", True),
+    ("info_hot", "p99_ms", False),
+    ("stream", "throughput_mbit_s", True),
+    ("stream", "ttfb_p50_ms", False),
+    ("stream", "ttfb_p99_ms", False),
+    ("stream", "rss_per_stream_kb", False),
+)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Percentil por posição (nearest-rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def rss_kb(pid: int) -> Optional[int]:
+    """VmRSS do processo (Linux); None se /proc não estiver disponível."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_revision() -> dict:
+    def run(*args) -> str:
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {"commit": run("rev-parse", "--short", "HEAD"), "dirty": bool(run("status", "--porcelain", "--", "app"))}
+
+
+def video_url(i: int, prefix: str) -> str:
+    # IDs de 11 caracteres, como os do YouTube
+    return f"https://www.youtube.com/watch?v={prefix}{i:0{11 - len(prefix)}d}"
+
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                response = await client.get(url)
+                if response.status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} não respondeu em {timeout:.0f}s")
+            await asyncio.sleep(0.1)
+
+
+async def run_info(client: httpx.AsyncClient, urls: list[str], concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(url: str):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(f"{API}/info", json={"url": url})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(url) for url in urls))
+    wall = time.perf_counter() - started
+    return {
+        "requests": len(urls),
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": len(urls) / wall,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+async def run_streams(client: httpx.AsyncClient, app_pid: int, urls: list[str], mode: str) -> dict:
+    # Metadados já no cache: o que se mede aqui é só o caminho de streaming
+    await asyncio.gather(*(client.post(f"{API}/info", json={"url": url}) for url in urls))
+    await asyncio.sleep(0.5)
+    idle_rss = rss_kb(app_pid)
+    peak_rss = idle_rss
+    done = asyncio.Event()
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while not done.is_set():
+            current = rss_kb(app_pid)
+            if current is not None and (peak_rss is None or current > peak_rss):
+                peak_rss = current
+            await asyncio.sleep(0.05)
+
+    ttfbs: list[float] = []
+    total_bytes = 0
+    errors = 0
+
+    async def one(url: str):
+        nonlocal total_bytes, errors
+        video_id = url.rsplit("=", 1)[-1]
+        started = time.perf_counter()
+        first = True
+        async with client.stream("GET", f"{API}/stream/{video_id}", params={"mode": mode}) as response:
+            if response.status_code != 200:
+                errors += 1
+                await response.aread()
+                return
+            async for chunk in response.aiter_raw():
+                if first:
+                    ttfbs.append(time.perf_counter() - started)
+                    first = False
+                total_bytes += len(chunk)
+
+    sampler = asyncio.ensure_future(sample_rss())
+    started = time.perf_counter()
+    await asyncio.gather(*(one(url) for url in urls))
+    wall = time.perf_counter() - started
+    done.set()
+    await sampler
+
+    result = {
+        "streams": len(urls),
+        "mode": mode,
+        "errors": errors,
+        "bytes": total_bytes,
+        "throughput_mbit_s": total_bytes * 8 / wall / 1e6,
+        "ttfb_p50_ms": percentile(ttfbs, 50) * 1000,
+        "ttfb_p99_ms": percentile(ttfbs, 99) * 1000,
+    }
+    if idle_rss is not None and peak_rss is not None:
+        result["rss_idle_kb"] = idle_rss
+        result["rss_peak_kb"] = peak_rss
+        result["rss_per_stream_kb"] = (peak_rss - idle_rss) / max(len(urls), 1)
+    return result
+
+
+def _spawn(*args: str, env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", "benchmarks.fake_youtube", *args], env=env)
+
+
+async def run(args) -> dict:
+    media_port, app_port = free_port(), free_port()
+    media_url = f"http://127.0.0.1:{media_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    env = {
+        **os.environ,
+        # Configuração fixa: os números de um commit para outro só mudam pelo código
+        "EXTRACTION_EXECUTOR": "thread",
+        "STREAM_ENGINE": "proxy",
+        "MEDIA_CACHE_ENABLED": "false",
+        "INFO_CACHE_ENABLED": "true",
+    }
+    proxy_ports = [free_port() for _ in range(args.profiles)]
+    proxies = [
+        _spawn("proxy", "--port", str(port), "--bandwidth-mbps", str(args.profile_bandwidth_mbps), env=env)
+        for port in proxy_ports
+    ]
+    if proxies:
+        env["EGRESS_PROFILES"] = json.dumps(
+            [{"name": f"proxy-{i}", "proxy": f"http://127.0.0.1:{port}"} for i, port in enumerate(proxy_ports)]
+        )
+    media = _spawn(
+        "media", "--port", str(media_port),
+        "--latency-ms", str(args.latency_ms), "--bandwidth-mbps", str(args.bandwidth_mbps),
+        env=env,
+    )
+    app = _spawn(
+        "app", "--port", str(app_port), "--media-url", media_url,
+        "--extract-latency-ms", str(args.extract_latency_ms), "--base-size-kb", str(args.size_kb),
+        env=env,
+    )
+    try:
+        await wait_ready(f"{media_url}/ping")
+        for port in proxy_ports:
+            await wait_ready(f"http://127.0.0.1:{port}/ping")
+        await wait_ready(f"{app_url}/health")
+        limits = httpx.Limits(max_connections=max(args.concurrency, args.streams) * 2)
+        async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=httpx.Timeout(120.0)) as client:
+            cold = [video_url(i, "c") for i in range(args.info_requests)]
+            hot = [video_url(0, "h")] * args.info_requests
+            await client.post(f"{API}/info", json={"url": hot[0]})
+            results = {
+                "info_cold": await run_info(client, cold, args.concurrency),
+                "info_hot": await run_info(client, hot, args.concurrency),
+                "stream": await run_streams(
+                    client, app.pid, [video_url(i, "s") for i in range(args.streams)], args.mode
+                ),
+            }
+    finally:
+        for process in (app, media, *proxies):
+            process.terminate()
+        for process in (app, media, *proxies):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    results["meta"] = {
+        **git_revision(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {
+            "info_requests": args.info_requests,
+            "concurrency": args.concurrency,
+            "streams": args.streams,
+            "mode": args.mode,
+            "size_kb": args.size_kb,
+            "latency_ms": args.latency_ms,
+            "bandwidth_mbps": args.bandwidth_mbps,
+            "extract_latency_ms": args.extract_latency_ms,
+            "profiles": args.profiles,
+            "profile_bandwidth_mbps": args.profile_bandwidth_mbps,
+        },
+    }
+    return results
+
+
+def report(results: dict, baseline: Optional[dict] = None):
+    meta = results["meta"]
+    print(f"commit {meta['commit']}{' (modificado)' if meta['dirty'] else ''}, {meta['config']}")
+    for section, field, higher_is_better in COMPARED:
+        value = results.get(section, {}).get(field)
+        if value is None:
+            continue
+        line = f"{section + '.' + field:<32} {value:12.2f}"
+        old = (baseline or {}).get(section, {}).get(field)
+        if old:
+            change = (value - old) / old * 100
+            worse = change < 0 if higher_is_better else change > 0
+            line += f"  antes {old:12.2f}  {change:+7.1f}%{'  <- pior' if worse and abs(change) >= 5 else ''}"
+        print(line)
+    for section in ("info_cold", "info_hot", "stream"):
+        if results[section].get("errors"):
+            print(f"AVISO: {results[section]['errors']} erros em {section}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--info-requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--streams", type=int, default=16)
+    parser.add_argument("--mode", choices=("audio", "video"), default="audio")
+    parser.add_argument("--size-kb", type=int, default=4096, help="tamanho do áudio 140 servido")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="latência do servidor de mídia")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="banda por conexão de mídia; 0 = sem limite")
+    parser.add_argument("--extract-latency-ms", type=float, default=200.0, help="duração de cada extract_info")
+    parser.add_argument("--profiles", type=int, default=0, help="proxies de saída locais; 0 = conexão direta")
+    parser.add_argument("--profile-bandwidth-mbps", type=float, default=0.0, help="banda total de cada proxy; 0 = sem limite")
+    parser.add_argument("--save", action="store_true", help=f"grava o JSON em {RESULTS_DIR}")
+    parser.add_argument("--compare", type=Path, help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    report(results, baseline)
+    if args.save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = RESULTS_DIR / f"{stamp}-{results['meta']['commit'] or 'sem-git'}.json"
+        path.write_text(json.dumps(results, indent=2))
+        print(f"salvo em {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark do relay de pipes.
+
+Compara o laço antigo (`process.stdout.read(64 * 1024)` via StreamReader) com
+o `PipeRelay` lendo o stdout de um subprocesso que escreve o mais rápido que
+pode. Reporta throughput e Gbit/s por segundo de CPU do processo consumidor
+(o produtor roda em outro processo e não entra na conta).
+
+Uso (de dentro de backend/):
+    python -m benchmarks.relay_bench --size-mb 2048 --runs 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from app.services.relay import PipeRelay
+
+PRODUCER = (
+    "import os, sys\n"
+    "total = int(sys.argv[1])\n"
+    "buf = b'x' * (1 << 20)\n"
+    "while total > 0:\n"
+    "    total -= os.write(1, buf[:total])\n"
+)
+
+
+async def legacy(size: int) -> int:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", PRODUCER, str(size), stdout=asyncio.subprocess.PIPE
+    )
+    received = 0
+    while True:
+        chunk = await process.stdout.read(64 * 1024)
+        if not chunk:
+            break
+        received += len(chunk)
+    await process.wait()
+    return received
+
+
+async def relay(size: int, chunk_size: int, high_water: int) -> int:
+    pipe_relay = PipeRelay(chunk_size=chunk_size, high_water=high_water)
+    read_fd, write_fd = pipe_relay.pipe()
+    try:
+        process = await asyncio.create_subprocess_exec(sys.executable, "-c", PRODUCER, str(size), stdout=write_fd)
+    finally:
+        os.close(write_fd)
+    received = 0
+    async for chunk in pipe_relay.stream(read_fd):
+        received += len(chunk)
+    await process.wait()
+    return received
+
+
+def measure(name: str, factory, size: int, runs: int) -> dict:
+    best = None
+    for _ in range(runs):
+        wall, cpu = time.perf_counter(), time.process_time()
+        received = asyncio.run(factory())
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        assert received == size, f"{name}: {received} != {size}"
+        result = {
+            "name": name,
+            "wall_s": wall,
+            "cpu_s": cpu,
+            "gbit_s": size * 8 / wall / 1e9,
+            "gbit_per_cpu_s": size * 8 / max(cpu, 1e-9) / 1e9,
+        }
+        if best is None or result["cpu_s"] < best["cpu_s"]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=256 * 1024)
+    parser.add_argument("--high-water", type=int, default=1024 * 1024)
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    results = [
+        measure("legacy 64KiB StreamReader", lambda: legacy(size), size, args.runs),
+        measure(
+            f"PipeRelay chunk={args.chunk_size} high_water={args.high_water}",
+            lambda: relay(size, args.chunk_size, args.high_water),
+            size,
+            args.runs,
+        ),
+    ]
+    print(f"{args.size_mb} MiB, melhor de {args.runs} execuções")
+    for r in results:
+        print(f"{r['name']:<50} {r['gbit_s']:6.2f} Gbit/s  {r['gbit_per_cpu_s']:6.2f} Gbit/s por CPU-s  (cpu {r['cpu_s']:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Micro-benchmarks do `YtDlpService` com pytest-benchmark (grupo `bench`).
+
+Uso (de dentro de backend/):
+    python -m pytest benchmarks --benchmark-autosave
+    python -m pytest benchmarks --benchmark-compare
+"""
+from unittest.mock import patch
+
+import pytest
+import yt_dlp
+
+pytest.importorskip("pytest_benchmark")
+
+from app.services.format_index import FormatIndex
+from app.services.info_projection import project_info
+from app.services.ydl_pool import get_ydl_pool
+from app.services.ytdlp_service import YtDlpService
+from benchmarks.fake_youtube import install, synthetic_info
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+MEDIA_URL = "http://127.0.0.1:8901"
+
+
+@pytest.fixture
+def fake_youtube(monkeypatch):
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", yt_dlp.YoutubeDL)  # desfeito no teardown
+    install(MEDIA_URL)
+    get_ydl_pool().clear()
+    with patch("app.services.ytdlp_service.node_runtime"):
+        yield
+    get_ydl_pool().clear()
+
+
+def test_get_info(benchmark, fake_youtube):
+    info = benchmark(YtDlpService.get_info, URL)
+    assert info['qualities']
+
+
+def test_get_slim_info(benchmark, fake_youtube):
+    slim = benchmark(YtDlpService.get_slim_info, URL)
+    assert slim.format_index is not None
+
+
+def test_format_index_build(benchmark):
+    formats = synthetic_info("abcdefghijk", MEDIA_URL, 4 << 20)['formats']
+    index = benchmark(FormatIndex.build, formats)
+    assert index.select('video', 720, 'vp9') == '247'
+
+
+def test_project_info(benchmark):
+    info = synthetic_info("abcdefghijk", MEDIA_URL, 4 << 20)
+    info['format_index'] = FormatIndex.build(info['formats'])
+    slim = benchmark(project_info, info)
+    assert len(slim.formats) == len(info['formats'])
+
+
+def test_select_stream_format(benchmark, fake_youtube):
+    slim = YtDlpService.get_slim_info(URL)
+
+    def resolve():
+        index = slim.format_index
+        return index.get(slim, index.select('video', 1080, 'avc1'))
+
+    fmt = benchmark(resolve)
+    assert fmt['format_id'] == '137'
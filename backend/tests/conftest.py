@@ -0,0 +1,16 @@
+import pytest
+from app.services.egress import get_egress_pool
+from app.services.rate_limit import get_rate_limiter, get_upstream_throttle
+from app.services.ydl_pool import clear_ydl_pools
+
+
+@pytest.fixture(autouse=True)
+def fresh_ydl_pool():
+    # Os testes fazem patch de yt_dlp.YoutubeDL; instâncias do pool não podem vazar entre eles
+    clear_ydl_pools()
+    # Limites, circuito e perfis de saída começam zerados em cada teste
+    get_rate_limiter.cache_clear()
+    get_upstream_throttle.cache_clear()
+    get_egress_pool.cache_clear()
+    yield
+    clear_ydl_pools()
@@ -63,3 +63,17 @@ def test_start_download_success():
         task_id = data["task_id"]
         mock_download.assert_called_with("http://youtube.com/v/123", task_id, 1080)
 
+
+def test_get_info_pool_saturated_returns_503():
+    from app.services.extraction_pool import PoolSaturatedError
+
+    with patch(f"{SERVICE_MOCK_PATH}.fetch_info", new_callable=AsyncMock) as mock_fetch:
+        mock_fetch.side_effect = PoolSaturatedError(retry_after=3)
+
+        response = client.post(
+            "/api/v1/download/info",
+            json={"url": "http://youtube.com/v/123"}
+        )
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "3"
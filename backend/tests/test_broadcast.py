@@ -0,0 +1,236 @@
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock
+from app.services.broadcast import BroadcastHub, ConsumerDetachedError
+from app.services.media_proxy import ProxiedMedia
+from app.services.ytdlp_service import YtDlpService
+
+CHUNKS = [bytes([i]) * 10 for i in range(20)]
+MEDIA = b"".join(CHUNKS)
+
+
+class CountingSource:
+    def __init__(self, chunks=CHUNKS, delay=0):
+        self.chunks = chunks
+        self.delay = delay
+        self.iterations = 0
+        self.produced = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        self.iterations += 1
+        try:
+            for chunk in self.chunks:
+                await asyncio.sleep(self.delay)
+                self.produced += 1
+                yield chunk
+        finally:
+            self.closed = True
+
+
+async def _drain(body, delay=0):
+    out = []
+    async for chunk in body:
+        out.append(chunk)
+        await asyncio.sleep(delay)
+    return b"".join(out)
+
+
+@pytest.mark.asyncio
+async def test_consumers_share_one_upstream_read():
+    hub = BroadcastHub(window=1000)
+    source = CountingSource()
+    broadcast = hub.publish("k", source.__aiter__())
+
+    first = broadcast.subscribe()
+    joined = hub.join("k")
+    second = joined.subscribe()
+
+    results = await asyncio.gather(_drain(first), _drain(second))
+
+    assert results == [MEDIA, MEDIA]
+    assert source.iterations == 1
+    assert hub.stats()["active"] == 0
+    assert hub.stats()["joined"] == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_detached_and_resumes_from_fallback():
+    hub = BroadcastHub(window=30)
+    resumed_at = []
+
+    async def fallback(pos):
+        resumed_at.append(pos)
+        yield MEDIA[pos:]
+
+    broadcast = hub.publish("k", CountingSource().__aiter__(), fallback=fallback)
+    fast = broadcast.subscribe()
+    slow = broadcast.subscribe()
+
+    fast_data, slow_data = await asyncio.gather(_drain(fast), _drain(slow, delay=0.01))
+
+    assert fast_data == MEDIA
+    assert slow_data == MEDIA
+    assert len(resumed_at) == 1 and 0 < resumed_at[0] < len(MEDIA)
+    assert broadcast.detached == 1
+
+
+@pytest.mark.asyncio
+async def test_detached_consumer_without_fallback_errors():
+    hub = BroadcastHub(window=30)
+    broadcast = hub.publish("k", CountingSource().__aiter__())
+    fast = broadcast.subscribe()
+    slow = broadcast.subscribe()
+
+    fast_data, slow_result = await asyncio.gather(
+        _drain(fast), _drain(slow, delay=0.01), return_exceptions=True
+    )
+
+    assert fast_data == MEDIA
+    assert isinstance(slow_result, ConsumerDetachedError)
+
+
+@pytest.mark.asyncio
+async def test_producer_reads_only_a_few_chunks_ahead_of_a_slow_consumer():
+    hub = BroadcastHub(window=1000, read_ahead=30)
+    source = CountingSource()
+    body = hub.publish("k", source.__aiter__()).subscribe()
+
+    received = 0
+    async for chunk in body:
+        received += len(chunk)
+        await asyncio.sleep(0.005)
+        # A janela de 1000 bytes caberia a mídia toda; a leitura para 30 bytes à frente
+        assert source.produced * 10 - received <= 30
+        if received >= 50:
+            break
+    await body.aclose()
+
+    assert source.produced < len(CHUNKS)
+
+
+@pytest.mark.asyncio
+async def test_subscriber_that_never_reads_does_not_stall_the_others():
+    hub = BroadcastHub(window=1000, read_ahead=30)
+    broadcast = hub.publish("k", CountingSource().__aiter__())
+    idle = broadcast.subscribe()  # Ex: cliente que desconectou antes do primeiro byte
+    active = broadcast.subscribe()
+
+    assert await asyncio.wait_for(_drain(active), timeout=1) == MEDIA
+    assert broadcast.consumers == 0
+    await idle.aclose()
+
+
+@pytest.mark.asyncio
+async def test_upstream_stops_when_every_consumer_leaves():
+    hub = BroadcastHub(window=1000)
+    source = CountingSource(delay=0.01)
+    broadcast = hub.publish("k", source.__aiter__())
+    body = broadcast.subscribe()
+
+    await body.__anext__()
+    await body.aclose()
+    await asyncio.sleep(0.05)
+
+    assert source.closed
+    assert hub.join("k") is None
+
+
+@pytest.mark.asyncio
+async def test_joined_subscriber_keeps_upstream_when_first_consumer_leaves():
+    hub = BroadcastHub(window=1000, read_ahead=30)
+    source = CountingSource(delay=0.01)
+    broadcast = hub.publish("k", source.__aiter__())
+    first = broadcast.subscribe()
+    second = hub.join("k").subscribe()
+
+    # O primeiro sai no meio do stream antes de o segundo ler o primeiro byte
+    await first.__anext__()
+    await first.__anext__()
+    await first.aclose()
+    await asyncio.sleep(0.05)
+
+    assert not source.closed
+    assert await asyncio.wait_for(_drain(second), timeout=1) == MEDIA
+    assert source.iterations == 1
+    assert broadcast.detached == 0
+
+
+@pytest.mark.asyncio
+async def test_late_joiner_starts_fresh_when_start_left_the_buffer():
+    hub = BroadcastHub(window=30)
+    broadcast = hub.publish("k", CountingSource().__aiter__())
+    body = broadcast.subscribe()
+
+    await _drain(body)
+
+    assert hub.join("k") is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_streams_open_upstream_once():
+    opened = 0
+
+    async def open_media(fmt, start=0, end=None):
+        nonlocal opened
+        opened += 1
+        await asyncio.sleep(0.01)
+        return ProxiedMedia(len(MEDIA), 0, len(MEDIA) - 1, CountingSource().__aiter__(), ranged=True)
+
+    proxy = AsyncMock()
+    proxy.open.side_effect = open_media
+    info = {'id': 'dQw4w9WgXcQ', 'formats': [
+        {'format_id': '136', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'none', 'height': 720, 'url': 'https://media/136'},
+    ]}
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", AsyncMock(return_value=info)), \
+         patch("app.services.ytdlp_service.get_media_proxy", return_value=proxy), \
+         patch("app.services.ytdlp_service.get_broadcast_hub", return_value=BroadcastHub(window=1000)):
+        streams = await asyncio.gather(*[
+            YtDlpService.open_stream("https://youtu.be/dQw4w9WgXcQ", "video", 720) for _ in range(5)
+        ])
+        results = await asyncio.gather(*[_drain(s.body) for s in streams])
+
+    assert opened == 1
+    assert results == [MEDIA] * 5
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_closed_before_reading_close_the_upstream():
+    hub = BroadcastHub(window=1000)
+    closed = []
+
+    async def close():
+        closed.append(True)
+
+    broadcast = hub.publish("k", CountingSource().__aiter__(), close=close)
+    first = broadcast.subscribe()
+    second = hub.join("k").subscribe()
+
+    await first.aclose()
+    assert not closed  # Ainda há uma inscrição
+    await second.aclose()
+    await second.aclose()
+
+    assert closed == [True]
+    assert hub.stats()["active"] == 0
+    assert hub.join("k") is None
+
+
+@pytest.mark.asyncio
+async def test_single_consumer_buffer_shrinks_to_read_ahead_once_not_joinable():
+    chunks = [bytes([i % 256]) * 10 for i in range(100)]
+    hub = BroadcastHub(window=100, read_ahead=30)
+    broadcast = hub.publish("k", CountingSource(chunks).__aiter__())
+    peaks = []
+
+    out = []
+    async for chunk in broadcast.subscribe():
+        out.append(chunk)
+        peaks.append(broadcast.buffered)
+        await asyncio.sleep(0)
+
+    assert b"".join(out) == b"".join(chunks)
+    assert max(peaks) <= 100 + 10  # Só a janela de entrada no começo
+    # Depois que o início saiu do buffer, só o que o cliente ainda não leu
+    assert max(peaks[20:]) <= 30 + 10
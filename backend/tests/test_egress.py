@@ -0,0 +1,222 @@
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import yt_dlp
+
+from app.core.config import get_settings
+from app.services.egress import EgressPool, EgressProfile, get_egress_pool, parse_profiles
+from app.services.ffmpeg_service import FfmpegService
+from app.services.info_cache import MemoryInfoCache
+from app.services.media_proxy import MediaProxy, UpstreamError
+from app.services.rate_limit import UpstreamThrottledError
+from app.services.ydl_pool import clear_ydl_pools
+from app.services.ytdlp_service import YtDlpService
+from benchmarks.fake_youtube import FakeMediaServer, FakeYoutubeDL, StubProxy, expected_bytes, install
+
+
+def _pool(now, *names, **kwargs):
+    return EgressPool([EgressProfile(name) for name in names], clock=lambda: now[0], **kwargs)
+
+
+def test_acquire_picks_least_loaded_then_least_recent():
+    now = [0.0]
+    pool = _pool(now, "a", "b", "c")
+
+    first = pool.acquire()
+    now[0] = 1.0
+    second = pool.acquire()
+    now[0] = 2.0
+    third = pool.acquire()
+    assert {first.name, second.name, third.name} == {"a", "b", "c"}
+
+    pool.release(second)
+    now[0] = 3.0
+    assert pool.acquire() is second
+    pool.release(first)
+    pool.release(third)
+    # Empate em uso: vai o usado há mais tempo
+    now[0] = 4.0
+    assert pool.acquire() is first
+
+
+def test_unhealthy_profile_gets_less_load():
+    now = [0.0]
+    pool = _pool(now, "a", "b")
+    for _ in range(8):
+        pool.release(pool.hold("a"), "error")
+    assert pool.profiles["a"].score == pytest.approx(0.8 ** 8)
+
+    pool.profiles["a"].score = 0.2
+    picked = [pool.acquire().name for _ in range(6)]
+    # Com saúde 0.2, um uso em 'a' pesa como cinco em 'b'
+    assert picked == ["b", "b", "b", "b", "a", "b"]
+
+
+def test_blocked_profile_is_quarantined_with_growing_delay():
+    now = [0.0]
+    pool = _pool(now, "a", "b", quarantine=10, max_quarantine=25)
+    a = pool.profiles["a"]
+
+    pool.release(pool.hold("a"), "blocked")
+    assert a.quarantined_until == 10
+    assert [pool.acquire().name for _ in range(3)] == ["b", "b", "b"]
+    assert pool.stats()["quarantined"] == 1
+
+    now[0] = 10.0
+    assert pool.acquire() is a
+    assert a.score == pytest.approx(0.5)  # Volta com saúde pela metade
+
+    pool.release(a, "blocked")
+    assert a.quarantined_until == 30  # 10 + 2 * 10
+    now[0] = 30.0
+    pool.release(pool.hold("a"), "blocked")
+    assert a.quarantined_until == 55  # 30 + min(40, 25)
+
+    now[0] = 60.0
+    pool.release(pool.hold("a"), "ok")
+    assert a.strikes == 0
+
+
+def test_last_available_profile_is_never_quarantined():
+    now = [0.0]
+    pool = _pool(now, "a", "b")
+    pool.release(pool.hold("a"), "blocked")
+    pool.release(pool.hold("b"), "blocked")
+
+    assert pool.profiles["b"].quarantined_until == 0
+    assert pool.acquire().name == "b"
+
+    single = _pool(now, "default")
+    single.release(single.acquire(), "blocked")
+    assert single.stats()["quarantined"] == 0
+
+
+def test_profile_options():
+    profile = EgressProfile("p", proxy="http://user:pw@10.0.0.1:3128", source_address="10.0.0.2",
+                            impersonate="safari", cookies="/run/cookies.txt")
+
+    options = profile.ydl_options()
+    assert options["proxy"] == "http://user:pw@10.0.0.1:3128"
+    assert options["source_address"] == "10.0.0.2"
+    assert options["cookiefile"] == "/run/cookies.txt"
+    assert options["impersonate"].client == "safari"
+    assert profile.cli_args() == [
+        "--impersonate", "safari", "--proxy", "http://user:pw@10.0.0.1:3128",
+        "--source-address", "10.0.0.2", "--cookies", "/run/cookies.txt",
+    ]
+    assert profile.ffmpeg_args() == ["-http_proxy", "http://user:pw@10.0.0.1:3128"]
+    assert EgressProfile("s", proxy="socks5://10.0.0.1:1080").ffmpeg_args() == []
+    assert EgressProfile("d", impersonate=None).cli_args() == []
+
+    assert [p.name for p in parse_profiles([{"proxy": "http://a:1"}, {"name": "x"}])] == ["egress-0", "x"]
+    with pytest.raises(ValueError):
+        parse_profiles([{"name": "x", "porxy": "http://a:1"}])
+
+
+@pytest.fixture
+def egress_profiles(monkeypatch):
+    """Configura `EGRESS_PROFILES` (e desfaz) com os perfis passados."""
+    def configure(profiles: list[dict]) -> EgressPool:
+        monkeypatch.setenv("EGRESS_PROFILES", json.dumps(profiles))
+        get_settings.cache_clear()
+        get_egress_pool.cache_clear()
+        return get_egress_pool()
+
+    yield configure
+    clear_ydl_pools()
+    get_settings.cache_clear()
+    get_egress_pool.cache_clear()
+
+
+async def test_fetch_info_moves_off_a_blocked_profile(egress_profiles, monkeypatch):
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", yt_dlp.YoutubeDL)  # desfeito no teardown
+    monkeypatch.setattr(FakeYoutubeDL, "blocked", {"http://127.0.0.1:1"})
+    install("http://127.0.0.1:9")
+    pool = egress_profiles([
+        {"name": "a", "proxy": "http://127.0.0.1:1"},
+        {"name": "b", "proxy": "http://127.0.0.1:2"},
+    ])
+
+    with patch("app.services.ytdlp_service.get_info_cache", return_value=MemoryInfoCache(max_entries=8)), \
+         patch("app.services.ytdlp_service.node_runtime"):
+        pool.profiles["b"].last_used = 1.0  # 'a' é o primeiro da fila
+        with pytest.raises(UpstreamThrottledError):
+            await YtDlpService.fetch_info("https://youtu.be/aaaaaaaaaaa")
+        info = await YtDlpService.fetch_info("https://youtu.be/bbbbbbbbbbb")
+
+    assert pool.stats()["by_profile"]["a"]["quarantined_for"] > 0
+    assert {f["egress"] for f in info.formats} == {"b"}
+    # O ffmpeg sai pelo mesmo proxy que extraiu a URL
+    cmd = FfmpegService.transcode_command(info.formats[0], "mp3", 128)
+    assert cmd[cmd.index("-http_proxy") + 1] == "http://127.0.0.1:2"
+
+
+@pytest.fixture
+async def stub_network():
+    """Servidor de mídia sintética e dois proxies de saída na frente dele."""
+    media = FakeMediaServer()
+    proxies = [StubProxy(), StubProxy(throttle_after=0)]
+    servers = [await media.serve()] + [await proxy.serve() for proxy in proxies]
+    ports = [server.sockets[0].getsockname()[1] for server in servers]
+    yield media, proxies, [f"http://127.0.0.1:{port}" for port in ports]
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+
+
+async def test_media_proxy_streams_through_the_profile_that_extracted(egress_profiles, stub_network):
+    media, (ok_proxy, throttled_proxy), (media_url, ok_url, throttled_url) = stub_network
+    pool = egress_profiles([
+        {"name": "ok", "proxy": ok_url},
+        {"name": "throttled", "proxy": throttled_url},
+    ])
+    url = f"{media_url}/media/abc/140?size=300000"
+    proxy = MediaProxy(chunk_size=64 * 1024)
+    try:
+        opened = await proxy.open({"format_id": "140", "url": url, "egress": "ok"})
+        assert pool.profiles["ok"].in_flight == 1
+        body = b"".join([chunk async for chunk in opened.body])
+        assert body == expected_bytes(0, 300000)
+        assert pool.profiles["ok"].in_flight == 0
+        # Cinco fatias de 64 KiB, todas pelo proxy do perfil
+        assert ok_proxy.requests == media.requests == 5
+
+        with pytest.raises(UpstreamError) as exc:
+            await proxy.open({"format_id": "140", "url": url, "egress": "throttled"})
+        assert exc.value.status_code == 429
+    finally:
+        await proxy.close()
+
+    assert throttled_proxy.requests == 1
+    assert media.requests == 5
+    assert pool.stats()["by_profile"]["throttled"]["quarantined_for"] > 0
+    assert pool.acquire().name == "ok"
+
+
+async def test_ffmpeg_modes_skip_profiles_ffmpeg_cannot_use(egress_profiles):
+    egress_profiles([{"name": "socks", "proxy": "socks5://127.0.0.1:1080"}])
+    video = {'format_id': '136', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'none', 'height': 720,
+             'url': 'https://media/136', 'egress': 'socks'}
+    audio = {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a',
+             'url': 'https://media/140', 'egress': 'socks'}
+    info = {'id': 'dQw4w9WgXcQ', 'formats': [audio, video]}
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", AsyncMock(return_value=info)), \
+         patch("app.services.ytdlp_service.YtDlpService.stream_video") as mock_subprocess, \
+         patch("app.services.ytdlp_service.FfmpegService.stream") as mock_ffmpeg:
+        # Sem -http_proxy possível, o ffmpeg sairia direto e levaria 403: vai pelo subprocess
+        stream = await YtDlpService.open_stream("https://youtu.be/dQw4w9WgXcQ", "muxed", 720)
+        assert stream.engine == 'subprocess'
+        await stream.aclose()
+
+        # Conversão: fica no formato original, pelo proxy de mídia (que usa o SOCKS)
+        target = await YtDlpService.resolve_stream("https://youtu.be/dQw4w9WgXcQ", "audio", codec="mp3")
+        assert not target.transcoded and target.proxyable
+        assert target.filename == "audio.m4a"
+
+    mock_subprocess.assert_called_once()
+    mock_ffmpeg.assert_not_called()
+    assert EgressProfile("h", proxy="http://127.0.0.1:3128", source_address="10.0.0.2").ffmpeg_supported
+    assert EgressProfile("d").ffmpeg_supported
+    assert not EgressProfile("ip", source_address="10.0.0.2").ffmpeg_supported
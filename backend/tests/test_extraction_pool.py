@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.services.extraction_pool import (
+    ExtractionPool,
+    PoolSaturatedError,
+    ExtractionTimeoutError,
+)
+
+
+@pytest.mark.asyncio
+async def test_run_returns_result_off_loop():
+    pool = ExtractionPool(max_workers=1, max_queue=0, timeout=5)
+    loop_thread = threading.get_ident()
+
+    result = await pool.run(lambda x: (x * 2, threading.get_ident()), 21)
+
+    assert result[0] == 42
+    assert result[1] != loop_thread
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_saturated_pool_rejects_with_retry_after():
+    pool = ExtractionPool(max_workers=1, max_queue=1, timeout=5, retry_after=7)
+    release = threading.Event()
+
+    running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(PoolSaturatedError) as exc:
+        await pool.run(release.wait)
+    assert exc.value.retry_after == 7
+
+    release.set()
+    await asyncio.gather(*running)
+    assert pool.pending == 0
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_timeout_keeps_slot_until_worker_finishes():
+    pool = ExtractionPool(max_workers=1, max_queue=0, timeout=0.05)
+
+    with pytest.raises(ExtractionTimeoutError):
+        await pool.run(time.sleep, 0.3)
+
+    # O worker ainda está ocupado: a vaga não pode ser reaproveitada antes dele terminar
+    with pytest.raises(PoolSaturatedError):
+        await pool.run(lambda: None)
+
+    await asyncio.sleep(0.4)
+    assert pool.pending == 0
+    pool.shutdown()
@@ -0,0 +1,69 @@
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+import yt_dlp
+
+from app.services.media_proxy import MediaProxy, select_format
+from app.services.ytdlp_service import YtDlpService
+from benchmarks.fake_youtube import FakeMediaServer, FakeYoutubeDL, expected_bytes, install
+
+
+@pytest.fixture
+async def media_server():
+    server = FakeMediaServer()
+    tcp = await server.serve()
+    port = tcp.sockets[0].getsockname()[1]
+    yield server, f"http://127.0.0.1:{port}"
+    tcp.close()
+    await tcp.wait_closed()
+
+
+async def test_media_server_serves_ranges(media_server):
+    _, url = media_server
+    async with httpx.AsyncClient() as client:
+        full = await client.get(f"{url}/media/abc/140?size=300000")
+        part = await client.get(f"{url}/media/abc/140?size=300000", headers={"Range": "bytes=1000-1999"})
+        beyond = await client.get(f"{url}/media/abc/140?size=300000", headers={"Range": "bytes=300000-"})
+
+    assert full.status_code == 200
+    assert full.content == expected_bytes(0, 300000)
+    assert part.status_code == 206
+    assert part.headers["content-range"] == "bytes 1000-1999/300000"
+    assert part.content == expected_bytes(1000, 1000)
+    assert beyond.status_code == 416
+
+
+async def test_media_server_limits_bandwidth(media_server):
+    server, url = media_server
+    server.bandwidth = 1_000_000  # 1 MB/s
+    async with httpx.AsyncClient() as client:
+        started = time.monotonic()
+        response = await client.get(f"{url}/media/abc/140?size=300000")
+        elapsed = time.monotonic() - started
+
+    assert len(response.content) == 300000
+    assert elapsed >= 0.25
+
+
+async def test_backend_streams_synthetic_formats_through_proxy(media_server, monkeypatch):
+    _, url = media_server
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", yt_dlp.YoutubeDL)  # desfeito no teardown
+    install(url, base_size=200000)
+    assert yt_dlp.YoutubeDL is FakeYoutubeDL
+
+    with patch("app.services.ytdlp_service.node_runtime"):
+        full = YtDlpService.get_info("https://www.youtube.com/watch?v=abcdefghijk")
+    assert [q["height"] for q in full["qualities"]] == [1080, 720, 480, 360, 240, 144]
+    assert full["audio_filesize"] == 200000
+
+    fmt = select_format(full, "audio")
+    proxy = MediaProxy(chunk_size=64 * 1024)
+    try:
+        media = await proxy.open(fmt)
+        body = b"".join([chunk async for chunk in media.body])
+    finally:
+        await proxy.close()
+    assert fmt["format_id"] == "140"
+    assert body == expected_bytes(0, 200000)
@@ -0,0 +1,221 @@
+import asyncio
+import sys
+import pytest
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.extraction_pool import PoolSaturatedError
+from app.services.ffmpeg_service import FfmpegService, FfmpegError, ProcessLimiter, FRAGMENTED_MP4_FLAGS
+from app.services.media_cache import MediaCache
+from app.services.ytdlp_service import YtDlpService
+
+VIDEO = {'format_id': '136', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'none', 'height': 720,
+         'url': 'https://media/136', 'http_headers': {'User-Agent': 'UA'}}
+AUDIO = {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a', 'url': 'https://media/140'}
+
+
+def test_mux_command_stream_copies_into_fragmented_mp4():
+    cmd = FfmpegService.mux_command(VIDEO, AUDIO)
+
+    assert cmd[cmd.index("-headers") + 1] == "User-Agent: UA\r\n"
+    assert cmd.index("-headers") < cmd.index("https://media/136")
+    assert cmd[cmd.index("-c") + 1] == "copy"
+    assert cmd[cmd.index("-movflags") + 1] == FRAGMENTED_MP4_FLAGS
+    assert cmd[-3:] == ["-f", "mp4", "pipe:1"]
+    assert ["-map", "0:v:0", "-map", "1:a:0"] == cmd[cmd.index("-map"):cmd.index("-map") + 4]
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_when_running_and_queue_are_full():
+    limiter = ProcessLimiter(max_processes=1, max_queue=1, retry_after=9)
+    first = limiter.reserve()
+
+    async with limiter.slot(first):
+        queued = limiter.reserve()  # Ainda cabe um na fila
+        with pytest.raises(PoolSaturatedError) as exc:
+            limiter.reserve()  # A reserva já ocupa a fila, antes de pedir vaga
+        assert exc.value.retry_after == 9
+        waiter = asyncio.create_task(limiter.slot(queued).__aenter__())
+        await asyncio.sleep(0)
+        with pytest.raises(PoolSaturatedError):
+            limiter.reserve()
+    await waiter
+
+
+@pytest.mark.asyncio
+async def test_stream_kills_process_when_client_disconnects():
+    limiter = ProcessLimiter(max_processes=1, max_queue=0)
+    endless = [sys.executable, "-c", "import sys\nwhile True: sys.stdout.buffer.write(b'x' * 65536)"]
+
+    body = FfmpegService.stream(endless, limiter)
+    assert await body.__anext__()
+    assert limiter.running == 1
+
+    await body.aclose()
+    assert limiter.running == 0
+
+
+@pytest.mark.asyncio
+async def test_open_stream_muxed_uses_ffmpeg():
+    info = {'id': 'dQw4w9WgXcQ', 'formats': [AUDIO, VIDEO]}
+
+    async def fake_stream(cmd, limiter=None, ticket=None):
+        yield b"muxed"
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", AsyncMock(return_value=info)), \
+         patch("app.services.ytdlp_service.FfmpegService.stream", side_effect=fake_stream) as mock_stream:
+        stream = await YtDlpService.open_stream("https://youtu.be/dQw4w9WgXcQ", "muxed", 720)
+        data = b"".join([c async for c in stream.body])
+
+    assert stream.engine == 'ffmpeg'
+    assert stream.media_type == 'video/mp4'
+    assert data == b"muxed"
+    cmd = mock_stream.call_args[0][0]
+    assert "https://media/136" in cmd and "https://media/140" in cmd
+
+
+@pytest.mark.asyncio
+async def test_open_stream_muxed_falls_back_to_progressive_format():
+    info = {'id': 'dQw4w9WgXcQ', 'formats': [VIDEO]}  # Sem áudio separado
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", AsyncMock(return_value=info)), \
+         patch("app.services.ytdlp_service.YtDlpService.stream_video") as mock_subprocess:
+        stream = await YtDlpService.open_stream("https://youtu.be/dQw4w9WgXcQ", "muxed", 720)
+
+    assert stream.engine == 'subprocess'
+    mock_subprocess.assert_called_once_with(
+        "https://youtu.be/dQw4w9WgXcQ", "best[height<=720][ext=mp4]/best[ext=mp4]/best"
+    )
+
+
+def test_transcode_command_uses_codec_and_bitrate():
+    cmd = FfmpegService.transcode_command(AUDIO, "opus", 96)
+
+    assert cmd[cmd.index("-i") + 1] == "https://media/140"
+    assert cmd[cmd.index("-c:a") + 1] == "libopus"
+    assert cmd[cmd.index("-b:a") + 1] == "96k"
+    assert cmd[-3:] == ["-f", "ogg", "pipe:1"]
+
+
+@pytest.mark.asyncio
+async def test_limiter_reports_queue_position():
+    limiter = ProcessLimiter(max_processes=1, max_queue=2)
+    first = limiter.reserve()
+    assert first.position == 0
+
+    async with limiter.slot(first):
+        second = limiter.reserve()
+        assert second.position == 1
+        third = limiter.reserve()
+        assert third.position == 2
+        third.release()  # Cliente que saiu antes de o processo começar
+        waiter = asyncio.create_task(limiter.slot(second).__aenter__())
+        await asyncio.sleep(0)
+        assert limiter.reserve().position == 2
+    await waiter
+
+
+@pytest.mark.asyncio
+async def test_concurrent_muxed_opens_beyond_the_queue_are_rejected():
+    limiter = ProcessLimiter(max_processes=1, max_queue=1)
+    urls = [f"https://youtu.be/video{i:06d}" for i in range(4)]
+
+    async def fetch_info(url, *args, **kwargs):
+        return {'id': url[-11:], 'formats': [AUDIO, VIDEO]}
+
+    async def fake_stream(cmd, limiter=None, ticket=None):
+        yield b"muxed"
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", AsyncMock(side_effect=fetch_info)), \
+         patch("app.services.ytdlp_service.get_ffmpeg_limiter", return_value=limiter), \
+         patch("app.services.ytdlp_service.FfmpegService.stream", side_effect=fake_stream):
+        results = await asyncio.gather(
+            *(YtDlpService.open_stream(url, "muxed", 720) for url in urls), return_exceptions=True
+        )
+
+    opened = [r for r in results if not isinstance(r, BaseException)]
+    assert len(opened) == 2  # Um rodando e um na fila
+    assert sum(isinstance(r, PoolSaturatedError) for r in results) == 2
+    assert limiter.reserved == 2
+
+    # Clientes que saem antes do primeiro byte devolvem a reserva
+    for stream in opened:
+        await stream.aclose()
+    assert limiter.reserved == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_raises_when_process_fails():
+    limiter = ProcessLimiter(max_processes=1, max_queue=0)
+    failing = [sys.executable, "-c", "import sys\nsys.stdout.write('x')\nsys.exit(3)"]
+
+    with pytest.raises(FfmpegError):
+        async for _ in FfmpegService.stream(failing, limiter):
+            pass
+    assert limiter.running == 0
+
+
+@pytest.mark.asyncio
+async def test_transcoded_audio_is_cached_by_codec_and_bitrate(tmp_path):
+    info = {'id': 'dQw4w9WgXcQ', 'formats': [AUDIO, VIDEO]}
+    cache = MediaCache(str(tmp_path), max_bytes=1 << 20)
+
+    async def fake_stream(cmd, limiter=None, ticket=None):
+        yield b"mp3-"
+        yield b"data"
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", AsyncMock(return_value=info)), \
+         patch("app.services.ytdlp_service.get_media_cache", return_value=cache), \
+         patch("app.services.ytdlp_service.FfmpegService.stream", side_effect=fake_stream) as mock_stream:
+        first = await YtDlpService.open_stream("https://youtu.be/dQw4w9WgXcQ", "audio", codec="mp3", bitrate=128)
+        data = b"".join([c async for c in first.body])
+        second = await YtDlpService.open_stream("https://youtu.be/dQw4w9WgXcQ", "audio", codec="mp3", bitrate=128)
+        other = await YtDlpService.open_stream("https://youtu.be/dQw4w9WgXcQ", "audio", codec="mp3", bitrate=320)
+
+    assert first.engine == 'ffmpeg'
+    assert first.media_type == 'audio/mpeg' and first.filename == 'audio.mp3'
+    assert first.headers["X-Queue-Position"] == "0"
+    assert data == b"mp3-data"
+    assert "128k" in mock_stream.call_args_list[0][0][0]
+    assert second.engine == 'disk'
+    assert open(second.file_path, "rb").read() == b"mp3-data"
+    assert other.engine == 'ffmpeg'
+    await other.body.aclose()
+
+
+@pytest.mark.asyncio
+async def test_transcode_burst_gets_queue_positions_and_is_rejected_past_the_queue(tmp_path):
+    limiter = ProcessLimiter(max_processes=1, max_queue=2)
+    cache = MediaCache(str(tmp_path), max_bytes=1 << 20)
+    urls = [f"https://youtu.be/video{i:06d}" for i in range(5)]
+
+    async def fetch_info(url, *args, **kwargs):
+        return {'id': url[-11:], 'formats': [AUDIO, VIDEO]}
+
+    async def fake_stream(cmd, limiter=None, ticket=None):
+        yield b"mp3"
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", AsyncMock(side_effect=fetch_info)), \
+         patch("app.services.ytdlp_service.get_media_cache", return_value=cache), \
+         patch("app.services.ytdlp_service.get_transcode_limiter", return_value=limiter), \
+         patch("app.services.ytdlp_service.FfmpegService.stream", side_effect=fake_stream):
+        results = await asyncio.gather(
+            *(YtDlpService.open_stream(url, "audio", codec="mp3", bitrate=128) for url in urls),
+            return_exceptions=True,
+        )
+
+    opened = [r for r in results if not isinstance(r, BaseException)]
+    assert sorted(s.headers["X-Queue-Position"] for s in opened) == ["0", "1", "2"]
+    assert sum(isinstance(r, PoolSaturatedError) for r in results) == 2
+
+    # Saindo antes do primeiro byte: reserva devolvida e nenhum .part esquecido
+    for stream in opened:
+        await stream.aclose()
+    assert limiter.reserved == 0
+    assert not list(tmp_path.rglob("*.part"))
+
+
+def test_stream_endpoint_rejects_unknown_codec():
+    client = TestClient(app)
+    response = client.post("/api/v1/download/stream", json={"url": "https://youtu.be/dQw4w9WgXcQ", "mode": "audio", "codec": "flac"})
+    assert response.status_code == 422
@@ -0,0 +1,64 @@
+import pickle
+from app.services.format_index import FormatIndex, codec_family, format_index
+
+FORMATS = [
+    {'format_id': '18', 'ext': 'mp4', 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'height': 360, 'filesize': 0},
+    {'format_id': '249', 'ext': 'webm', 'vcodec': 'none', 'acodec': 'opus', 'filesize': 500},
+    {'format_id': '139', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.5', 'filesize': 800},
+    {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'filesize': 1500},
+    {'format_id': '134', 'ext': 'mp4', 'vcodec': 'avc1.4d401e', 'acodec': 'none', 'height': 360, 'filesize': 3000},
+    {'format_id': '136', 'ext': 'mp4', 'vcodec': 'avc1.4d401f', 'acodec': 'none', 'height': 720, 'filesize_approx': 9000},
+    {'format_id': '247', 'ext': 'webm', 'vcodec': 'vp09.00.31.08', 'acodec': 'none', 'height': 720, 'filesize': 8000},
+    {'format_id': '398', 'ext': 'mp4', 'vcodec': 'av01.0.05M.08', 'acodec': 'none', 'height': 720, 'filesize': 7000},
+    {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1.640028', 'acodec': 'none', 'height': 1080},
+]
+
+
+def test_qualities_and_audio_size_match_legacy_rules():
+    index = FormatIndex.build(FORMATS)
+
+    # 360p: o progressivo '18' veio primeiro sem tamanho e é trocado pelo '134'
+    assert index.qualities == [
+        {'height': 1080, 'filesize': 0, 'format_id': '137'},
+        {'height': 720, 'filesize': 9000, 'format_id': '136'},
+        {'height': 360, 'filesize': 3000, 'format_id': '134'},
+    ]
+    assert index.audio_filesize == 1500
+
+
+def test_select_maps_request_to_exact_format_id():
+    index = FormatIndex.build(FORMATS)
+
+    assert index.select('audio') == '140'
+    assert index.select('video') == '137'
+    assert index.select('video', 720) == '398'
+    assert index.select('video', 720, 'avc1') == '136'
+    assert index.select('video', 720, 'vp9') == '247'
+    assert index.select('video', 1080, 'vp9') == '137'  # Sem vp9 em 1080p: melhor disponível
+    assert index.select('video', 2160) is None
+
+
+def test_get_returns_full_format_dict():
+    info = {'formats': FORMATS}
+    index = FormatIndex.build(FORMATS)
+    assert index.get(info, '247') is FORMATS[6]
+    assert index.get(info, 'nope') is None
+    assert index.get(info, None) is None
+
+
+def test_format_index_prefers_stored_index():
+    stored = FormatIndex.build(FORMATS)
+    assert format_index({'formats': FORMATS, 'format_index': stored}) is stored
+    assert format_index({'formats': FORMATS}).select('audio') == '140'
+
+
+def test_index_survives_pickle_for_process_pool():
+    index = pickle.loads(pickle.dumps(FormatIndex.build(FORMATS)))
+    assert index.select('video', 720, 'avc1') == '136'
+
+
+def test_codec_family():
+    assert codec_family('avc1.64001F') == 'avc1'
+    assert codec_family('vp9') == 'vp9'
+    assert codec_family('vp09.00.40.08') == 'vp9'
+    assert codec_family('none') is None
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.extraction_pool import PoolSaturatedError
+from app.services.info_cache import is_playlist_url
+from app.services.ytdlp_service import YtDlpService
+
+client = TestClient(app)
+
+DELAYS = {"https://youtu.be/slowslowslo": 0.2, "https://youtu.be/fastfastfas": 0.0}
+
+
+def _info(url):
+    return {'title': url[-11:], 'thumbnail': '', 'duration': 1, 'uploader': 'u', 'view_count': 0,
+            'webpage_url': url, 'qualities': [], 'audio_filesize': 0}
+
+
+async def fake_fetch_info(url):
+    if "broken" in url:
+        raise Exception("Vídeo indisponível")
+    if "busybusybus" in url:
+        raise PoolSaturatedError(5)
+    await asyncio.sleep(DELAYS.get(url, 0.05))
+    return _info(url)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize("url,expected", [
+    ("https://www.youtube.com/playlist?list=PL123", True),
+    ("https://www.youtube.com/@canal/videos", True),
+    ("https://www.youtube.com/channel/UC123", True),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123", False),
+    ("https://youtu.be/dQw4w9WgXcQ", False),
+    ("https://vimeo.com/123", False),
+])
+def test_is_playlist_url(url, expected):
+    assert is_playlist_url(url) is expected
+
+
+def test_batch_streams_ndjson_in_completion_order():
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", side_effect=fake_fetch_info):
+        response = client.post("/api/v1/download/info/batch", json={"urls": [
+            "https://youtu.be/slowslowslo",
+            "https://youtu.be/brokenbroke",
+            "https://youtu.be/fastfastfas",
+            "https://youtu.be/busybusybus",
+        ]})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = _lines(response)
+    assert [line["index"] for line in lines][-1] == 0  # O mais lento chega por último
+    by_index = {line["index"]: line for line in lines}
+    assert by_index[0]["info"]["title"] == "slowslowslo"
+    assert by_index[1]["status"] == 400 and "indisponível" in by_index[1]["error"]
+    assert by_index[2]["info"]["webpage_url"] == "https://youtu.be/fastfastfas"
+    assert by_index[3]["status"] == 503
+
+
+def test_batch_expands_playlists_and_caps_items():
+    entries = [f"https://www.youtube.com/watch?v=video{i:06d}" for i in range(10)]
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", side_effect=fake_fetch_info), \
+         patch("app.services.ytdlp_service.YtDlpService.list_playlist", return_value=entries[:3]) as mock_list:
+        response = client.post("/api/v1/download/info/batch", json={
+            "urls": ["https://youtu.be/fastfastfas", "https://www.youtube.com/playlist?list=PL123"],
+            "max_items": 4,
+        })
+
+    mock_list.assert_called_once_with("https://www.youtube.com/playlist?list=PL123", 3)
+    lines = _lines(response)
+    assert sorted(line["url"] for line in lines) == sorted(["https://youtu.be/fastfastfas"] + entries[:3])
+
+
+@pytest.mark.asyncio
+async def test_batch_bounds_concurrency():
+    running = peak = 0
+
+    async def tracking_fetch(url):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return _info(url)
+
+    urls = [f"https://youtu.be/video{i:06d}" for i in range(12)]
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", side_effect=tracking_fetch):
+        items = [item async for item in YtDlpService.fetch_info_batch(urls, concurrency=3)]
+
+    assert len(items) == 12
+    assert peak == 3
+
+
+def test_list_playlist_uses_flat_entries():
+    with patch("yt_dlp.YoutubeDL") as mock_ydl:
+        instance = mock_ydl.return_value
+        instance.__enter__.return_value = instance
+        instance.extract_info.return_value = {'entries': [
+            {'id': 'aaaaaaaaaaa', 'url': 'https://www.youtube.com/watch?v=aaaaaaaaaaa'},
+            {'id': 'bbbbbbbbbbb'},
+            None,
+        ]}
+        with patch("app.services.ytdlp_service.YtDlpService.validate_integrity"):
+            urls = YtDlpService.list_playlist("https://www.youtube.com/playlist?list=PL123")
+
+    assert urls == ["https://www.youtube.com/watch?v=aaaaaaaaaaa", "https://www.youtube.com/watch?v=bbbbbbbbbbb"]
+    assert mock_ydl.call_args[0][0]['extract_flat'] == 'in_playlist'
@@ -0,0 +1,78 @@
+import pytest
+from unittest.mock import patch, AsyncMock
+from app.services.info_cache import (
+    MemoryInfoCache,
+    cache_key,
+    canonical_video_id,
+    info_ttl,
+)
+from app.services.ytdlp_service import YtDlpService
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtube.com/watch?v=dQw4w9WgXcQ&t=10",
+    "https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ?si=abc",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+    "https://music.youtube.com/watch?v=dQw4w9WgXcQ&list=RD",
+    " https://www.youtube.com/embed/dQw4w9WgXcQ ",
+])
+def test_canonical_video_id_variants(url):
+    assert canonical_video_id(url) == "dQw4w9WgXcQ"
+    assert cache_key(url) == "yt:dQw4w9WgXcQ"
+
+
+def test_cache_key_falls_back_to_url():
+    assert canonical_video_id("http://test.com/video") is None
+    assert cache_key("http://test.com/video") == "url:http://test.com/video"
+
+
+def test_info_ttl_respects_signed_url_expiry():
+    info = {"formats": [
+        {"url": "https://rr1.googlevideo.com/videoplayback?expire=2000&id=1"},
+        {"url": "https://rr1.googlevideo.com/videoplayback?expire=1500&id=2"},
+        {"url": None},
+    ]}
+    assert info_ttl(info, default_ttl=3600, margin=100, now=1000) == 400
+    assert info_ttl({"formats": []}, default_ttl=3600, margin=100, now=1000) == 3600
+    assert info_ttl(info, default_ttl=3600, margin=100, now=5000) == 0
+
+
+def test_memory_cache_lru_and_ttl():
+    now = [0.0]
+    cache = MemoryInfoCache(max_entries=2, clock=lambda: now[0])
+
+    cache.set("a", 1, ttl=10)
+    cache.set("b", 2, ttl=10)
+    assert cache.get("a") == 1  # 'a' vira o mais recente
+    cache.set("c", 3, ttl=10)  # expulsa 'b'
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    now[0] = 11
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_info_hits_cache_for_url_variants():
+    cache = MemoryInfoCache(max_entries=8)
+    info = {"id": "dQw4w9WgXcQ", "title": "Cached", "formats": []}
+
+    with patch("app.services.ytdlp_service.get_info_cache", return_value=cache), \
+         patch("app.services.ytdlp_service.get_extraction_pool") as mock_pool:
+        mock_pool.return_value.run = AsyncMock(return_value=info)
+
+        first = await YtDlpService.fetch_info("https://youtu.be/dQw4w9WgXcQ")
+        second = await YtDlpService.fetch_info("https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=10")
+
+    assert first is second
+    assert mock_pool.return_value.run.await_count == 1
+    assert cache.stats()["hits"] == 1
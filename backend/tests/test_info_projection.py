@@ -0,0 +1,70 @@
+import pickle
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.format_index import FormatIndex
+from app.services.info_projection import SlimInfo, project_info
+from app.services.media_proxy import is_proxyable, select_format
+
+RAW = {
+    'id': 'dQw4w9WgXcQ',
+    'title': 'Vídeo',
+    'thumbnail': 'https://i.ytimg.com/x.jpg',
+    'duration': 212,
+    'uploader': 'Canal',
+    'view_count': 10,
+    'webpage_url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'description': 'x' * 50000,
+    'thumbnails': [{'url': f'https://i.ytimg.com/{i}.jpg'} for i in range(40)],
+    'automatic_captions': {'en': [{'url': 'https://captions'}] * 20},
+    'heatmap': [{'start_time': i, 'value': 0.5} for i in range(100)],
+    'formats': [
+        {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'filesize': 1500,
+         'url': 'https://media/140', 'http_headers': {'User-Agent': 'UA'}, 'tbr': 129.5, 'quality': 3,
+         'fragments': None, 'format_note': 'medium'},
+        {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1.640028', 'acodec': 'none', 'height': 1080,
+         'url': 'https://media/137', 'protocol': 'http_dash_segments', 'fragments': [{'path': 'a'}] * 50},
+    ],
+}
+
+
+def test_projection_keeps_only_what_is_served():
+    slim = project_info(RAW)
+
+    assert isinstance(slim, SlimInfo)
+    assert not hasattr(slim, '__dict__')
+    assert slim.title == 'Vídeo' and slim.id == 'dQw4w9WgXcQ'
+    assert slim.formats[0] == {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2',
+                               'filesize': 1500, 'url': 'https://media/140', 'http_headers': {'User-Agent': 'UA'}}
+    assert slim.formats[1]['fragments'] is True
+    assert len(pickle.dumps(slim)) < len(pickle.dumps(RAW)) / 10
+
+
+def test_projection_still_serves_streaming_lookups():
+    slim = project_info(RAW)
+
+    assert isinstance(slim.format_index, FormatIndex)
+    assert select_format(slim, 'audio')['url'] == 'https://media/140'
+    assert not is_proxyable(select_format(slim, 'video'))
+    assert slim.qualities == [{'height': 1080, 'filesize': 0, 'format_id': '137'}]
+    assert slim.get('audio_filesize') == 1500
+    assert slim.get('description', 'n/a') == 'n/a'
+    assert project_info(slim) is slim
+
+
+def test_info_etag_and_304():
+    client = TestClient(app)
+    with patch("app.api.v1.endpoints.download.YtDlpService.fetch_info", new_callable=AsyncMock) as mock_fetch:
+        mock_fetch.return_value = project_info(RAW)
+        first = client.post("/api/v1/download/info", json={"url": "https://youtu.be/dQw4w9WgXcQ"})
+        again = client.post("/api/v1/download/info", json={"url": "https://youtu.be/dQw4w9WgXcQ"},
+                            headers={"If-None-Match": first.headers["etag"]})
+        stale = client.post("/api/v1/download/info", json={"url": "https://youtu.be/dQw4w9WgXcQ"},
+                            headers={"If-None-Match": '"outra-versao"'})
+
+    assert first.status_code == 200
+    assert first.json()["title"] == "Vídeo"
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == first.headers["etag"]
+    assert stale.status_code == 200
@@ -0,0 +1,216 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.extraction_pool import PoolSaturatedError
+from app.services.jobs import ClientJobLimitError, JobScheduler, run_download_job
+from app.services.ytdlp_service import MediaStream
+
+
+def _scheduler(tmp_path, run, **kwargs):
+    return JobScheduler(run=run, directory=str(tmp_path), **kwargs)
+
+
+async def _until(predicate, timeout=2.0):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+
+async def _body(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_dispatch_order_respects_priority_and_alternates_clients(tmp_path):
+    order = []
+
+    async def run(scheduler, job):
+        order.append(job.url)
+
+    scheduler = _scheduler(tmp_path, run, max_workers=1)
+    for url in ("a1", "a2", "a3"):
+        scheduler.submit("alice", url)
+    scheduler.submit("bob", "b1")
+    scheduler.submit("carol", "c1", priority="high")
+    scheduler.submit("bob", "b2", priority="low")
+
+    assert [scheduler.get(j.id).position for j in scheduler._order()] == [1, 2, 3, 4, 5, 6]
+    await _until(lambda: scheduler.completed == 6)
+
+    assert order == ["c1", "a1", "b1", "a2", "a3", "b2"]
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_limits_per_client_and_queue(tmp_path):
+    scheduler = _scheduler(tmp_path, AsyncMock(), max_workers=1, max_queue=3, max_per_client=2)
+    scheduler._ready = asyncio.Semaphore(0)  # Sem workers: tudo fica na fila
+    scheduler._ensure_workers = lambda: None
+
+    scheduler.submit("alice", "a1")
+    scheduler.submit("alice", "a2")
+    with pytest.raises(ClientJobLimitError):
+        scheduler.submit("alice", "a3")
+    scheduler.submit("bob", "b1")
+    with pytest.raises(PoolSaturatedError):
+        scheduler.submit("carol", "c1")
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_and_running_jobs(tmp_path):
+    started = asyncio.Event()
+
+    async def run(scheduler, job):
+        started.set()
+        await asyncio.sleep(60)
+
+    scheduler = _scheduler(tmp_path, run, max_workers=1)
+    running = scheduler.submit("alice", "a1")
+    queued = scheduler.submit("bob", "b1")
+    await started.wait()
+
+    scheduler.cancel(queued.id)
+    assert queued.state == "cancelled"
+    assert scheduler.queued == 0
+
+    scheduler.cancel(running.id)
+    await _until(lambda: running.finished)
+    assert running.state == "cancelled"
+    assert scheduler.stats()["cancelled"] == 2
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_saturated_job_goes_back_to_the_queue(tmp_path):
+    attempts = []
+
+    async def run(scheduler, job):
+        attempts.append(job.url)
+        if len(attempts) == 1:
+            raise PoolSaturatedError(0)
+
+    scheduler = _scheduler(tmp_path, run, max_workers=1)
+    job = scheduler.submit("alice", "a1")
+    await _until(lambda: job.finished)
+
+    assert job.state == "completed"
+    assert attempts == ["a1", "a1"]
+    assert scheduler.requeued == 1
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_events_coalesce_and_end_at_terminal_state(tmp_path):
+    gate = asyncio.Event()
+
+    async def run(scheduler, job):
+        job.total_bytes = 100
+        for done in (10, 20, 30):
+            scheduler.report(job, done)
+        await gate.wait()
+        scheduler.report(job, 100, force=True)
+
+    scheduler = _scheduler(tmp_path, run, max_workers=1)
+    job = scheduler.submit("alice", "a1")
+    events = scheduler.events(job)
+    first = await events.__anext__()
+    gate.set()
+    rest = [e async for e in events]
+
+    assert first["state"] == "queued"
+    assert rest[-1]["state"] == "completed"
+    assert rest[-1]["progress"] == 1.0
+    assert job.listeners == []
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_download_job_writes_artifact(tmp_path):
+    stream = MediaStream(_body(b"abc", b"def"), "audio/mp4", "audio.m4a", engine="proxy", headers={"Content-Length": "6"})
+    scheduler = _scheduler(tmp_path, run_download_job, max_workers=1)
+
+    with patch("app.services.jobs.YtDlpService.open_stream", AsyncMock(return_value=stream)) as mock_open:
+        job = scheduler.submit("alice", "http://youtube.com/v/123", mode="audio", codec="mp3")
+        await _until(lambda: job.finished)
+
+    assert job.state == "completed", job.error
+    assert mock_open.call_args.kwargs["codec"] == "mp3"
+    assert job.path == str(tmp_path / f"{job.id}.m4a")
+    assert (tmp_path / f"{job.id}.m4a").read_bytes() == b"abcdef"
+    assert job.snapshot()["total_bytes"] == 6
+
+    scheduler.delete(job.id)
+    assert not (tmp_path / f"{job.id}.m4a").exists()
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_jobs_api_create_events_and_ranged_artifact(tmp_path):
+    async def run(scheduler, job):
+        job.media_type, job.filename = "audio/mp4", "audio.m4a"
+        job.path = scheduler.job_path(job, "m4a")
+        with open(job.path, "wb") as f:
+            f.write(b"0123456789")
+        job.total_bytes = 10
+        scheduler.report(job, 10, force=True)
+
+    scheduler = _scheduler(tmp_path, run, max_workers=1)
+    transport = httpx.ASGITransport(app=app)
+    with patch("app.api.v1.endpoints.jobs.get_job_scheduler", return_value=scheduler):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            created = await client.post(
+                "/api/v1/jobs", json={"url": "http://youtube.com/v/123", "mode": "audio"},
+                headers={"X-Client-Id": "alice"},
+            )
+            assert created.status_code == 202
+            job_id = created.json()["id"]
+
+            events = await client.get(f"/api/v1/jobs/{job_id}/events")
+            assert events.headers["content-type"].startswith("text/event-stream")
+            data = [json.loads(line[6:]) for line in events.text.splitlines() if line.startswith("data: ")]
+            assert data[-1]["state"] == "completed"
+
+            listed = await client.get("/api/v1/jobs", headers={"X-Client-Id": "alice"})
+            assert [j["id"] for j in listed.json()] == [job_id]
+
+            ranged = await client.get(f"/api/v1/jobs/{job_id}/artifact", headers={"Range": "bytes=2-5"})
+            assert ranged.status_code == 206
+            assert ranged.content == b"2345"
+
+            assert (await client.delete(f"/api/v1/jobs/{job_id}")).status_code == 204
+            assert (await client.get(f"/api/v1/jobs/{job_id}")).status_code == 404
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_artifact_before_completion_is_conflict(tmp_path):
+    async def run(scheduler, job):
+        await asyncio.sleep(60)
+
+    scheduler = _scheduler(tmp_path, run, max_workers=1)
+    job = scheduler.submit("alice", "a1")
+    transport = httpx.ASGITransport(app=app)
+    with patch("app.api.v1.endpoints.jobs.get_job_scheduler", return_value=scheduler):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get(f"/api/v1/jobs/{job.id}/artifact")
+    assert response.status_code == 409
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_websocket_sends_snapshots_until_terminal_state(tmp_path):
+    scheduler = _scheduler(tmp_path, AsyncMock(), max_workers=1)
+    job = scheduler.submit("alice", "a1")
+    await _until(lambda: job.finished)
+
+    with patch("app.api.v1.endpoints.jobs.get_job_scheduler", return_value=scheduler):
+        with TestClient(app).websocket_connect(f"/api/v1/jobs/{job.id}/ws") as ws:
+            assert ws.receive_json()["state"] == "completed"
+    await scheduler.close()
@@ -0,0 +1,139 @@
+import os
+import time
+import pytest
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.media_cache import MediaCache
+
+
+async def _body(*chunks, fail=False):
+    for chunk in chunks:
+        yield chunk
+    if fail:
+        raise ConnectionError("upstream caiu")
+
+
+@pytest.mark.asyncio
+async def test_tee_publishes_complete_file(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1024)
+    writer = cache.writer("vid", "140", "m4a", expected_size=6)
+
+    data = b"".join([c async for c in cache.tee(_body(b"abc", b"def"), writer)])
+
+    assert data == b"abcdef"
+    path = cache.lookup("vid", "140")
+    assert path is not None
+    assert open(path, "rb").read() == b"abcdef"
+    assert not [p for p in os.listdir(tmp_path / "vid") if p.endswith(".part")]
+
+
+@pytest.mark.asyncio
+async def test_tee_discards_partial_file(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1024)
+    writer = cache.writer("vid", "140", "m4a", expected_size=None)
+
+    with pytest.raises(ConnectionError):
+        async for _ in cache.tee(_body(b"abc", fail=True), writer):
+            pass
+
+    assert cache.lookup("vid", "140") is None
+    assert os.listdir(tmp_path / "vid") == []
+    # Depois de abortado, o formato pode ser gravado de novo
+    assert cache.writer("vid", "140", "m4a", expected_size=None) is not None
+
+
+@pytest.mark.asyncio
+async def test_only_one_writer_per_format(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1024)
+    assert cache.writer("vid", "140", "m4a", None) is not None
+    assert cache.writer("vid", "140", "m4a", None) is None
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_by_size(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=10)
+    for format_id in ("a", "b"):
+        writer = cache.writer("vid", format_id, "mp4", None)
+        async for _ in cache.tee(_body(b"x" * 4), writer):
+            pass
+
+    assert cache.lookup("vid", "a")  # 'a' passa a ser o mais recente
+    writer = cache.writer("vid", "c", "mp4", None)
+    async for _ in cache.tee(_body(b"x" * 4), writer):
+        pass
+
+    assert cache.lookup("vid", "b") is None
+    assert cache.lookup("vid", "a") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 8
+
+
+def test_load_rebuilds_index_and_removes_stale_parts(tmp_path):
+    video_dir = tmp_path / "vid"
+    video_dir.mkdir()
+    (video_dir / "140.m4a").write_bytes(b"abc")
+    stale = video_dir / "137.mp4.deadbeef.part"
+    stale.write_bytes(b"zz")
+    old = time.time() - 7200
+    os.utime(stale, (old, old))
+    fresh = video_dir / "136.mp4.cafe.part"
+    fresh.write_bytes(b"zz")
+
+    cache = MediaCache(str(tmp_path), max_bytes=1024)
+
+    assert cache.lookup("vid", "140") == str(video_dir / "140.m4a")
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+def test_second_stream_is_served_from_disk(tmp_path):
+    media = b"0123456789" * 100
+    proxy = AsyncMock()
+
+    async def open_media(fmt, start=0, end=None):
+        from app.services.media_proxy import ProxiedMedia
+        return ProxiedMedia(len(media), 0, len(media) - 1, _body(media), ranged=True)
+
+    proxy.open.side_effect = open_media
+    info = {'id': 'dQw4w9WgXcQ', 'formats': [
+        {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a', 'url': 'https://media/140', 'filesize': len(media)},
+    ]}
+    cache = MediaCache(str(tmp_path), max_bytes=1 << 20)
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", AsyncMock(return_value=info)), \
+         patch("app.services.ytdlp_service.get_media_proxy", return_value=proxy), \
+         patch("app.services.ytdlp_service.get_media_cache", return_value=cache):
+        client = TestClient(app)
+        first = client.get("/api/v1/download/stream/dQw4w9WgXcQ?mode=audio")
+        second = client.get("/api/v1/download/stream/dQw4w9WgXcQ?mode=audio")
+        ranged = client.get("/api/v1/download/stream/dQw4w9WgXcQ?mode=audio", headers={"Range": "bytes=990-"})
+
+    assert first.content == media
+    assert second.content == media
+    assert second.headers["etag"] == first.headers["etag"]
+    assert ranged.status_code == 206
+    assert ranged.content == media[990:]
+    assert proxy.open.call_count == 1
+    assert cache.stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_tee_keeps_streaming_when_the_disk_fails(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1024)
+    writer = await cache.open_writer("vid", "140", "m4a", expected_size=None)
+    writes = []
+
+    def write(data):
+        if writes:
+            raise OSError(28, "No space left on device")
+        writes.append(data)
+
+    with patch.object(writer, "write", side_effect=write):
+        data = b"".join([c async for c in cache.tee(_body(b"abc", b"def", b"ghi"), writer)])
+
+    # O cliente recebe tudo; o .part é descartado e nada entra no índice
+    assert data == b"abcdefghi"
+    assert await cache.find("vid", "140") is None
+    assert os.listdir(tmp_path / "vid") == []
+    assert await cache.open_writer("vid", "140", "m4a", expected_size=None) is not None
@@ -0,0 +1,297 @@
+import httpx
+import pytest
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.egress import get_egress_pool
+from app.services.media_proxy import (
+    ByteRange,
+    MediaProxy,
+    RangeNotSatisfiableError,
+    UpstreamError,
+    is_proxyable,
+    select_format,
+)
+from app.services.ytdlp_service import YtDlpService
+
+MEDIA = bytes(range(256)) * 40  # 10240 bytes
+
+FORMATS = [
+    {'format_id': '139', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.5', 'url': 'https://media/139'},
+    {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'url': 'https://media/140'},
+    {'format_id': '251', 'ext': 'webm', 'vcodec': 'none', 'acodec': 'opus', 'url': 'https://media/251'},
+    {'format_id': '136', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'none', 'height': 720, 'url': 'https://media/136'},
+    {'format_id': '247', 'ext': 'webm', 'vcodec': 'vp9', 'acodec': 'none', 'height': 720, 'url': 'https://media/247'},
+    {'format_id': '18', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'mp4a', 'height': 360, 'url': 'https://media/18'},
+    {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'none', 'height': 1080, 'url': 'https://media/137'},
+]
+
+
+def _range_server(requests_seen):
+    def handler(request: httpx.Request):
+        requests_seen.append(request.headers.get('range'))
+        start, _, end = request.headers['range'][len('bytes='):].partition('-')
+        start = int(start)
+        end = min(int(end), len(MEDIA) - 1) if end else len(MEDIA) - 1
+        return httpx.Response(
+            206,
+            headers={'Content-Range': f"bytes {start}-{end}/{len(MEDIA)}"},
+            content=MEDIA[start:end + 1],
+        )
+    return handler
+
+
+def _proxy(handler, chunk_size=4096):
+    proxy = MediaProxy(chunk_size=chunk_size)
+    proxy._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return proxy
+
+
+def test_select_format_matches_subprocess_selectors():
+    info = {'formats': FORMATS}
+    assert select_format(info, 'audio')['format_id'] == '140'
+    assert select_format(info, 'video', 720)['format_id'] == '247'
+    assert select_format(info, 'video')['format_id'] == '137'
+    assert select_format(info, 'video', 2160) is None
+
+
+def test_is_proxyable():
+    assert is_proxyable({'url': 'https://x', 'protocol': 'https'})
+    assert not is_proxyable({'url': 'https://x', 'protocol': 'm3u8_native'})
+    assert not is_proxyable({'url': 'https://x', 'protocol': 'http_dash_segments', 'fragments': [{}]})
+
+
+@pytest.mark.asyncio
+async def test_open_fetches_media_in_range_slices():
+    seen = []
+    proxy = _proxy(_range_server(seen))
+
+    media = await proxy.open({'url': 'https://media/140'})
+    data = b''.join([chunk async for chunk in media.body])
+
+    assert data == MEDIA
+    assert media.total_size == len(MEDIA)
+    assert seen == ['bytes=0-4095', 'bytes=4096-8191', 'bytes=8192-10239']
+
+
+@pytest.mark.asyncio
+async def test_open_raises_before_streaming_on_upstream_error():
+    proxy = _proxy(lambda request: httpx.Response(403))
+
+    with pytest.raises(UpstreamError) as exc:
+        await proxy.open({'url': 'https://media/expired'})
+    assert exc.value.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_aclose_without_reading_releases_upstream_and_profile():
+    closed = []
+
+    class Stream(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            yield MEDIA[:4096]
+
+        async def aclose(self):
+            closed.append(True)
+
+    proxy = _proxy(lambda request: httpx.Response(
+        206, headers={'Content-Range': f"bytes 0-4095/{len(MEDIA)}"}, stream=Stream()
+    ))
+    profile = get_egress_pool().profiles["default"]
+
+    media = await proxy.open({'url': 'https://media/140', 'egress': 'default'})
+    assert profile.in_flight == 1
+
+    # Ex: o cliente saiu antes do primeiro pedaço
+    await media.aclose()
+    assert closed == [True]
+    assert profile.in_flight == 0
+    await media.aclose()
+    assert profile.in_flight == 0 and profile.leases == 1
+
+
+@pytest.mark.asyncio
+async def test_open_stream_uses_proxy_with_cached_info():
+    seen = []
+    proxy = _proxy(_range_server(seen), chunk_size=1 << 20)
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", new_callable=AsyncMock) as mock_fetch, \
+         patch("app.services.ytdlp_service.get_media_proxy", return_value=proxy), \
+         patch("app.services.ytdlp_service.YtDlpService.stream_video") as mock_subprocess:
+        mock_fetch.return_value = {'formats': FORMATS}
+
+        stream = await YtDlpService.open_stream("https://youtu.be/dQw4w9WgXcQ", "audio")
+        data = b''.join([chunk async for chunk in stream.body])
+
+    assert stream.engine == 'proxy'
+    assert data == MEDIA
+    mock_subprocess.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_open_stream_falls_back_to_subprocess():
+    proxy = _proxy(lambda request: httpx.Response(403))
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", new_callable=AsyncMock) as mock_fetch, \
+         patch("app.services.ytdlp_service.get_media_proxy", return_value=proxy), \
+         patch("app.services.ytdlp_service.YtDlpService.stream_video") as mock_subprocess:
+        mock_fetch.return_value = {'formats': FORMATS}
+
+        stream = await YtDlpService.open_stream("https://youtu.be/dQw4w9WgXcQ", "video", 720)
+
+    assert stream.engine == 'subprocess'
+    # Formato exato do índice, sem o yt-dlp refazer a seleção
+    mock_subprocess.assert_called_once_with("https://youtu.be/dQw4w9WgXcQ", "247")
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=100-199", ByteRange(100, 199)),
+    ("bytes=100-", ByteRange(100, None)),
+    ("bytes=-500", ByteRange(None, 500)),
+    ("bytes=200-100", None),
+    ("bytes=0-1,5-9", None),
+    ("items=0-1", None),
+    ("bytes=-", None),
+    (None, None),
+])
+def test_byte_range_parse(header, expected):
+    assert ByteRange.parse(header) == expected
+
+
+def test_byte_range_resolve():
+    assert ByteRange(100, None).resolve(1000) == (100, 999)
+    assert ByteRange(100, 5000).resolve(1000) == (100, 999)
+    assert ByteRange(None, 300).resolve(1000) == (700, 999)
+    assert ByteRange(100, None).resolve(None) == (100, None)
+    assert ByteRange(None, 300).resolve(None) is None
+    with pytest.raises(RangeNotSatisfiableError):
+        ByteRange(1000, None).resolve(1000)
+
+
+def _stream_client(seen, filesize=None):
+    proxy = _proxy(_range_server(seen), chunk_size=1 << 20)
+    formats = [dict(f, filesize=filesize) for f in FORMATS]
+    fetch = AsyncMock(return_value={'formats': formats})
+    return proxy, fetch
+
+
+def test_stream_endpoint_honors_range_with_206():
+    seen = []
+    proxy, fetch = _stream_client(seen, filesize=len(MEDIA))
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", fetch), \
+         patch("app.services.ytdlp_service.get_media_proxy", return_value=proxy):
+        response = TestClient(app).post(
+            "/api/v1/download/stream",
+            json={"url": "https://youtu.be/dQw4w9WgXcQ", "mode": "audio"},
+            headers={"Range": "bytes=10000-"},
+        )
+
+    assert response.status_code == 206
+    assert response.content == MEDIA[10000:]
+    assert response.headers["content-range"] == f"bytes 10000-10239/{len(MEDIA)}"
+    assert response.headers["content-length"] == "240"
+    assert response.headers["accept-ranges"] == "bytes"
+    # O intervalo foi pedido ao upstream, sem baixar e descartar o começo
+    assert seen == ["bytes=10000-10239"]
+
+
+def test_stream_endpoint_full_download_has_content_length():
+    seen = []
+    proxy, fetch = _stream_client(seen)
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", fetch), \
+         patch("app.services.ytdlp_service.get_media_proxy", return_value=proxy):
+        response = TestClient(app).post(
+            "/api/v1/download/stream",
+            json={"url": "https://youtu.be/dQw4w9WgXcQ", "mode": "audio"},
+        )
+
+    assert response.status_code == 200
+    assert response.content == MEDIA
+    assert response.headers["content-length"] == str(len(MEDIA))
+    assert "content-range" not in response.headers
+
+
+def test_stream_endpoint_unsatisfiable_range():
+    seen = []
+    proxy, fetch = _stream_client(seen, filesize=len(MEDIA))
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", fetch), \
+         patch("app.services.ytdlp_service.get_media_proxy", return_value=proxy):
+        response = TestClient(app).post(
+            "/api/v1/download/stream",
+            json={"url": "https://youtu.be/dQw4w9WgXcQ", "mode": "audio"},
+            headers={"Range": f"bytes={len(MEDIA)}-"},
+        )
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(MEDIA)}"
+    assert seen == []
+
+
+def _get_client(seen):
+    proxy = _proxy(_range_server(seen), chunk_size=1 << 20)
+    formats = [
+        dict(f, filesize=len(MEDIA), url=f"{f['url']}?expire=9999999999&lmt=1700000000123456")
+        for f in FORMATS
+    ]
+    fetch = AsyncMock(return_value={'id': 'dQw4w9WgXcQ', 'formats': formats})
+    return proxy, fetch
+
+
+def test_get_stream_has_stable_validators_and_cache_headers():
+    seen = []
+    proxy, fetch = _get_client(seen)
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", fetch), \
+         patch("app.services.ytdlp_service.get_media_proxy", return_value=proxy):
+        client = TestClient(app)
+        response = client.get("/api/v1/download/stream/dQw4w9WgXcQ?mode=audio")
+
+        assert response.status_code == 200
+        assert response.content == MEDIA
+        assert response.headers["etag"] == '"dQw4w9WgXcQ-140-1700000000123456"'
+        assert response.headers["last-modified"] == "Tue, 14 Nov 2023 22:13:20 GMT"
+        assert response.headers["cache-control"].startswith("public, max-age=")
+
+        revalidate = client.get(
+            "/api/v1/download/stream/dQw4w9WgXcQ?mode=audio",
+            headers={"If-None-Match": response.headers["etag"]},
+        )
+        assert revalidate.status_code == 304
+        assert revalidate.content == b""
+
+        head = client.head("/api/v1/download/stream/dQw4w9WgXcQ?mode=audio")
+        assert head.status_code == 200
+        assert head.headers["content-length"] == str(len(MEDIA))
+
+    # 304 e HEAD não tocam o upstream
+    assert len(seen) == 1
+
+
+def test_get_stream_if_range_mismatch_sends_full_body():
+    seen = []
+    proxy, fetch = _get_client(seen)
+
+    with patch("app.services.ytdlp_service.YtDlpService.fetch_info", fetch), \
+         patch("app.services.ytdlp_service.get_media_proxy", return_value=proxy):
+        client = TestClient(app)
+        resumed = client.get(
+            "/api/v1/download/stream/dQw4w9WgXcQ?mode=audio",
+            headers={"Range": "bytes=100-", "If-Range": '"dQw4w9WgXcQ-140-1700000000123456"'},
+        )
+        stale = client.get(
+            "/api/v1/download/stream/dQw4w9WgXcQ?mode=audio",
+            headers={"Range": "bytes=100-", "If-Range": '"old-etag"'},
+        )
+
+    assert resumed.status_code == 206
+    assert resumed.content == MEDIA[100:]
+    assert stale.status_code == 200
+    assert stale.content == MEDIA
+
+
+def test_get_stream_rejects_invalid_video_id():
+    response = TestClient(app).get("/api/v1/download/stream/not-an-id")
+    assert response.status_code == 422
@@ -0,0 +1,96 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import metrics
+from app.services.metrics import Counter, Histogram, instrument_stream, stats_gauges
+
+
+async def _body(*chunks, error=None):
+    for chunk in chunks:
+        yield chunk
+    if error:
+        raise error
+
+
+def test_counter_renders_labels_sorted_and_escaped():
+    counter = Counter("t_total", "teste", ("kind",))
+    counter.inc(kind="b")
+    counter.inc(2, kind='a"x')
+
+    lines = counter.render()
+
+    assert lines[:2] == ["# HELP t_total teste", "# TYPE t_total counter"]
+    assert lines[2:] == ['t_total{kind="a\\"x"} 2', 't_total{kind="b"} 1']
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("t_seconds", "teste", ("phase",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value, phase="network")
+
+    lines = histogram.render()
+
+    assert 't_seconds_bucket{phase="network",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{phase="network",le="1"} 3' in lines
+    assert 't_seconds_bucket{phase="network",le="+Inf"} 4' in lines
+    assert 't_seconds_sum{phase="network"} 6.25' in lines
+    assert 't_seconds_count{phase="network"} 4' in lines
+
+
+def test_stats_gauges_keeps_only_numeric_fields():
+    collect = stats_gauges("t_state", "teste", lambda: {
+        "pool": {"size": 3, "enabled": True, "children": [], "ratio": 0.5},
+        "cache": None,
+    })
+
+    lines = collect()
+
+    assert 't_state{component="pool",field="size"} 3' in lines
+    assert 't_state{component="pool",field="ratio"} 0.5' in lines
+    assert not any("enabled" in line or "children" in line or "cache" in line for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_instrument_stream_records_complete_stream():
+    labels = {"endpoint": "/t-complete", "mode": "audio", "engine": "proxy"}
+    chunks = [c async for c in instrument_stream(_body(b"ab", b"cde"), **labels)]
+
+    assert chunks == [b"ab", b"cde"]
+    assert metrics.stream_bytes.value(**labels) == 5
+    assert metrics.stream_ttfb.count(**labels) == 1
+    assert metrics.stream_duration.count(**labels) == 1
+    assert metrics.stream_results.value(**labels, outcome="complete") == 1
+
+
+@pytest.mark.asyncio
+async def test_instrument_stream_records_disconnect_and_error():
+    labels = {"endpoint": "/t-outcomes", "mode": "video", "engine": "subprocess"}
+
+    body = instrument_stream(_body(b"x", b"y"), **labels)
+    assert await body.__anext__() == b"x"
+    await body.aclose()
+
+    with pytest.raises(RuntimeError):
+        async for _ in instrument_stream(_body(b"z", error=RuntimeError("falhou")), **labels):
+            pass
+
+    assert metrics.stream_results.value(**labels, outcome="disconnect") == 1
+    assert metrics.stream_results.value(**labels, outcome="error") == 1
+    assert metrics.stream_bytes.value(**labels) == 2
+
+
+def test_metrics_endpoint_labels_requests_by_route_template():
+    client = TestClient(app)
+    client.get("/api/v1/download/stream/abc123", params={"mode": "invalido"})
+    client.get("/api/v1/download/stream/def456", params={"mode": "invalido"})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'vids_http_requests_total{endpoint="/api/v1/download/stream/{video_id}",method="GET",status="422"}' in body
+    assert "abc123" not in body
+    assert 'vids_component_state{component="processes",field="running"}' in body
+    assert 'vids_component_state{component="extraction_pool",field="max_workers"}' in body
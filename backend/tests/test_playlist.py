@@ -0,0 +1,161 @@
+import itertools
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.egress import EgressPool, EgressProfile
+from app.services.playlist import InvalidCursorError, PlaylistPager, decode_cursor, encode_cursor
+from app.services.rate_limit import BotChallengeError
+
+URL = "https://www.youtube.com/playlist?list=PL123"
+
+
+class FakeYDL:
+    """Playlist 'infinita' que conta quantas entradas foram de fato geradas."""
+
+    def __init__(self, size=None):
+        self.size = size
+        self.produced = 0
+        self.closed = False
+        self.calls = []
+
+    def extract_info(self, url, download=False, process=True):
+        self.calls.append((url, process))
+        if url.startswith("https://www.youtube.com/@"):
+            return {'_type': 'url', 'url': URL}
+        return {'_type': 'playlist', 'title': 'Minha playlist', 'entries': self._entries()}
+
+    def _entries(self):
+        for i in itertools.count() if self.size is None else range(self.size):
+            self.produced += 1
+            yield {'id': f"v{i:010d}", 'title': f"Vídeo {i}", 'duration': 60,
+                   'thumbnails': [{'url': 'small'}, {'url': 'big'}]}
+
+    def close(self):
+        self.closed = True
+
+
+def _pager(ydls):
+    return PlaylistPager(ydl_factory=lambda profile: ydls.append(FakeYDL()) or ydls[-1])
+
+
+def test_first_page_does_not_walk_whole_playlist():
+    ydls = []
+    page = _pager(ydls).page(URL, limit=3)
+
+    assert [e['id'] for e in page.entries] == ["v0000000000", "v0000000001", "v0000000002"]
+    assert page.entries[0]['url'] == "https://www.youtube.com/watch?v=v0000000000"
+    assert page.entries[0]['thumbnail'] == "big"
+    assert page.title == "Minha playlist"
+    assert page.next_cursor
+    assert ydls[0].produced == 4  # limit + 1 para saber se há próxima página
+    assert ydls[0].calls == [(URL, False)]
+
+
+def test_cursor_resumes_same_generator():
+    ydls = []
+    pager = _pager(ydls)
+    first = pager.page(URL, limit=2)
+    second = pager.page(URL, first.next_cursor, limit=2)
+
+    assert [e['id'] for e in second.entries] == ["v0000000002", "v0000000003"]
+    assert len(ydls) == 1
+    assert pager.stats()["resumed"] == 1
+
+
+def test_lost_session_reopens_and_skips_offset():
+    ydls = []
+    pager = _pager(ydls)
+    first = pager.page(URL, limit=2)
+    pager.clear()
+
+    second = pager.page(URL, first.next_cursor, limit=2)
+
+    assert [e['id'] for e in second.entries] == ["v0000000002", "v0000000003"]
+    assert len(ydls) == 2 and ydls[0].closed
+
+
+def test_last_page_has_no_cursor_and_closes_session():
+    pager = PlaylistPager(ydl_factory=lambda profile: FakeYDL(size=3))
+    first = pager.page(URL, limit=2)
+    last = pager.page(URL, first.next_cursor, limit=2)
+
+    assert len(last.entries) == 1
+    assert last.next_cursor is None
+    assert pager.stats()["sessions"] == 0
+
+
+def test_redirect_is_followed_lazily():
+    ydls = []
+    page = _pager(ydls).page("https://www.youtube.com/@canal", limit=1)
+    assert page.entries[0]['id'] == "v0000000000"
+    assert ydls[0].calls == [("https://www.youtube.com/@canal", False), (URL, False)]
+
+
+def test_expired_sessions_are_closed():
+    now = [0.0]
+    ydls = []
+    pager = PlaylistPager(ydl_factory=lambda profile: ydls.append(FakeYDL()) or ydls[-1], ttl=10, clock=lambda: now[0])
+    pager.page(URL, limit=1)
+    now[0] = 20
+    pager.page(URL, limit=1)
+
+    assert ydls[0].closed
+    assert pager.stats()["sessions"] == 1
+
+
+def test_session_keeps_the_egress_profile_it_opened_with():
+    pool = EgressPool([EgressProfile("a"), EgressProfile("b")])
+    pool.profiles["a"].last_used = 1.0  # 'b' é o primeiro da fila
+    opened_with = []
+    pager = PlaylistPager(ydl_factory=lambda profile: opened_with.append(profile.name) or FakeYDL(), egress=pool)
+
+    first = pager.page(URL, limit=2)
+    pool.hold("b")  # 'b' fica mais carregado; a sessão continua nele
+    pager.page(URL, first.next_cursor, limit=2)
+
+    assert opened_with == ["b"]
+    assert pool.profiles["b"].leases == 3
+    assert pool.profiles["b"].in_flight == 1
+    assert pool.profiles["a"].in_flight == 0
+
+
+def test_bot_challenge_quarantines_the_profile():
+    class ChallengedYDL(FakeYDL):
+        def extract_info(self, url, download=False, process=True):
+            raise Exception("ERROR: Sign in to confirm you're not a bot")
+
+    pool = EgressPool([EgressProfile("a"), EgressProfile("b")])
+    pool.profiles["a"].last_used = 1.0  # 'b' é o primeiro da fila
+    pager = PlaylistPager(ydl_factory=lambda profile: ChallengedYDL(), egress=pool)
+
+    with pytest.raises(BotChallengeError):
+        pager.page(URL, limit=2)
+
+    assert pool.profiles["b"].blocked == 1
+    assert pool.profiles["b"].quarantined_until > 0
+    assert pool.profiles["b"].in_flight == 0
+
+
+def test_cursor_is_bound_to_url():
+    cursor = encode_cursor(URL, 10, "abc")
+    assert decode_cursor(cursor, URL) == (10, "abc")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "https://www.youtube.com/playlist?list=OTHER")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("não-é-cursor", URL)
+
+
+def test_playlist_endpoint_pages():
+    pager = PlaylistPager(ydl_factory=lambda profile: FakeYDL(size=5))
+    client = TestClient(app)
+    with patch("app.services.ytdlp_service.get_playlist_pager", return_value=pager), \
+         patch("app.services.ytdlp_service.YtDlpService.validate_integrity"):
+        first = client.get("/api/v1/download/playlist", params={"url": URL, "limit": 3}).json()
+        second = client.get("/api/v1/download/playlist", params={"url": URL, "limit": 3, "cursor": first["next_cursor"]}).json()
+        bad = client.get("/api/v1/download/playlist", params={"url": URL, "cursor": "xyz"})
+
+    assert len(first["entries"]) == 3
+    assert [e["title"] for e in second["entries"]] == ["Vídeo 3", "Vídeo 4"]
+    assert second["next_cursor"] is None
+    assert bad.status_code == 400
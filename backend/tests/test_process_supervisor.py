@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+import pytest
+from app.services.process_supervisor import ProcessFailedError, ProcessSupervisor, ProcessTimeoutError
+from app.services.relay import PipeRelay
+
+
+def _supervisor(**kwargs):
+    return ProcessSupervisor(PipeRelay(chunk_size=4096, high_water=16384), **kwargs)
+
+
+def _python(code):
+    return [sys.executable, "-c", code]
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.mark.asyncio
+async def test_chatty_stderr_does_not_block_stdout():
+    supervisor = _supervisor()
+    # ~2 MiB de stderr antes do stdout: com o stderr lido só no fim, travaria
+    code = "import sys\nsys.stderr.write('log\\n' * 500000)\nsys.stderr.flush()\nsys.stdout.write('done')"
+
+    body = supervisor.stream(_python(code), "chatty")
+    data = await asyncio.wait_for(_collect(body), timeout=10)
+
+    assert data == b"done"
+    assert supervisor.running == 0
+
+
+async def _collect(body):
+    return b"".join([c async for c in body])
+
+
+@pytest.mark.asyncio
+async def test_stderr_tail_is_bounded_and_reported_on_failure():
+    supervisor = _supervisor(stderr_limit=100)
+    code = "import sys\nsys.stderr.write('a' * 5000 + 'THE END')\nsys.exit(2)"
+
+    with pytest.raises(ProcessFailedError) as exc:
+        await _collect(supervisor.stream(_python(code)))
+
+    assert exc.value.returncode == 2
+    assert len(exc.value.stderr) == 100
+    assert exc.value.stderr.endswith("THE END")
+    assert supervisor.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_disconnect_kills_and_reaps_child():
+    supervisor = _supervisor()
+    endless = _python("import sys\nwhile True: sys.stdout.buffer.write(b'x' * 65536)")
+
+    body = supervisor.stream(endless, "endless")
+    assert await body.__anext__()
+    pid = supervisor.stats()["children"][0]["pid"]
+    assert supervisor.running == 1
+
+    await body.aclose()
+
+    assert supervisor.running == 0
+    assert supervisor.killed == 1
+    assert not _alive(pid)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_consumer_kills_child():
+    supervisor = _supervisor()
+
+    async def consume():
+        async for _ in supervisor.stream(_python("import time\ntime.sleep(30)")):
+            pass
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.2)
+    pid = supervisor.stats()["children"][0]["pid"]
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert supervisor.running == 0
+    assert not _alive(pid)
+
+
+@pytest.mark.asyncio
+async def test_idle_timeout_kills_silent_child():
+    supervisor = _supervisor(idle_timeout=0.2)
+    code = "import sys, time\nsys.stdout.write('x')\nsys.stdout.flush()\ntime.sleep(30)"
+
+    with pytest.raises(ProcessTimeoutError, match="inatividade"):
+        await _collect(supervisor.stream(_python(code)))
+
+    assert supervisor.running == 0
+    assert supervisor.stats()["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_total_timeout_stops_endless_stream():
+    supervisor = _supervisor(idle_timeout=5, total_timeout=0.3)
+    code = "import sys, time\nwhile True:\n    sys.stdout.write('x'); sys.stdout.flush(); time.sleep(0.01)"
+
+    with pytest.raises(ProcessTimeoutError, match="duração máxima"):
+        await _collect(supervisor.stream(_python(code)))
+
+    assert supervisor.running == 0
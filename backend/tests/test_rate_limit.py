@@ -0,0 +1,206 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.extraction_pool import PoolSaturatedError
+from app.services.info_cache import MemoryInfoCache
+from app.services.playlist import PlaylistPage
+from app.services.rate_limit import (
+    AdaptiveThrottle,
+    BotChallengeError,
+    RateLimiter,
+    UpstreamThrottledError,
+)
+from app.services.ytdlp_service import YtDlpService
+
+
+def test_client_and_global_buckets():
+    now = [0.0]
+    limiter = RateLimiter(rate=1, burst=2, global_rate=10, global_burst=3, clock=lambda: now[0])
+
+    assert limiter.check("a") == (None, 0.0)
+    assert limiter.check("a") == (None, 0.0)
+    scope, wait = limiter.check("a")
+    assert scope == "client" and wait == pytest.approx(1.0)
+
+    assert limiter.check("b") == (None, 0.0)
+    scope, wait = limiter.check("b")  # Global esgotado: a ficha de 'b' volta
+    assert scope == "global" and wait == pytest.approx(0.1)
+
+    now[0] = 0.1
+    assert limiter.check("b") == (None, 0.0)
+    assert limiter.stats()["limited_client"] == 1
+    assert limiter.stats()["limited_global"] == 1
+
+
+def test_client_buckets_are_bounded():
+    limiter = RateLimiter(rate=1, burst=1, global_rate=100, global_burst=100, max_clients=2)
+    for client in ("a", "b", "c"):
+        limiter.check(client)
+    assert limiter.stats()["clients"] == 2
+    # 'a' foi esquecido e volta com o bucket cheio
+    assert limiter.check("a") == (None, 0.0)
+
+
+def _throttle(now, **kwargs):
+    options = dict(max_rate=4.0, min_rate=0.5, threshold=0.5, min_challenges=2, window=60,
+                   backoff=10, max_backoff=100, recovery=0.1, clock=lambda: now[0], jitter=lambda: 1.0)
+    options.update(kwargs)
+    return AdaptiveThrottle(**options)
+
+
+def test_challenges_open_the_circuit_and_halve_the_rate():
+    now = [0.0]
+    throttle = _throttle(now)
+
+    throttle.record(blocked=False)
+    throttle.record(blocked=True)
+    assert throttle.state == "closed"
+    throttle.record(blocked=True)  # 2 de 3 na janela
+
+    assert throttle.state == "open"
+    assert throttle.rate == 2.0
+    assert throttle.acquire() == pytest.approx(10.0)
+    assert throttle.stats()["open"] == 1
+
+    now[0] = 10.0
+    assert throttle.acquire() == 0.0
+    assert throttle.state == "half_open"
+
+
+def test_half_open_block_reopens_with_longer_backoff():
+    now = [0.0]
+    throttle = _throttle(now, jitter=lambda: 0.0)
+    throttle.record(blocked=True)
+    throttle.record(blocked=True)
+    assert throttle.open_until == pytest.approx(5.0)  # Metade fixa do backoff de 10s
+
+    now[0] = 5.0
+    throttle.acquire()
+    throttle.record(blocked=True)
+
+    assert throttle.state == "open"
+    assert throttle.open_until == pytest.approx(15.0)  # 5 + metade de 20s
+    assert throttle.rate == 1.0
+    assert throttle.trips == 2
+
+
+def test_rate_recovers_gradually_after_closing():
+    now = [0.0]
+    throttle = _throttle(now)
+    throttle.record(blocked=True)
+    throttle.record(blocked=True)
+
+    now[0] = 10.0
+    throttle.acquire()
+    throttle.record(blocked=False)
+    assert throttle.state == "closed"
+    assert throttle.rate == 2.0
+
+    now[0] = 20.0
+    assert throttle.stats()["rate"] == pytest.approx(3.0)
+    now[0] = 100.0
+    assert throttle.stats()["rate"] == 4.0
+    assert throttle.consecutive_trips == 0
+
+
+@pytest.mark.asyncio
+async def test_fetch_info_backs_off_on_bot_challenges():
+    throttle = _throttle([0.0], min_challenges=2, threshold=0.5)
+    run = AsyncMock(side_effect=BotChallengeError("Sign in to confirm you're not a bot"))
+
+    with patch("app.services.ytdlp_service.get_info_cache", return_value=MemoryInfoCache(max_entries=8)), \
+         patch("app.services.ytdlp_service.get_upstream_throttle", return_value=throttle), \
+         patch("app.services.ytdlp_service.get_extraction_pool") as mock_pool:
+        mock_pool.return_value.run = run
+        for video_id in ("aaaaaaaaaaa", "bbbbbbbbbbb"):
+            with pytest.raises(UpstreamThrottledError) as exc:
+                await YtDlpService.fetch_info(f"https://youtu.be/{video_id}")
+        assert exc.value.retry_after == 10
+
+        # Circuito aberto: nem chega ao pool
+        with pytest.raises(UpstreamThrottledError):
+            await YtDlpService.fetch_info("https://youtu.be/ccccccccccc")
+
+    assert run.await_count == 2
+    assert throttle.stats()["throttled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_info_refunds_the_token_when_the_pool_is_full():
+    throttle = _throttle([0.0], max_rate=1.0)  # Uma ficha só
+    run = AsyncMock(side_effect=[PoolSaturatedError(5), {"id": "aaaaaaaaaaa"}])
+
+    with patch("app.services.ytdlp_service.get_info_cache", return_value=MemoryInfoCache(max_entries=8)), \
+         patch("app.services.ytdlp_service.get_upstream_throttle", return_value=throttle), \
+         patch("app.services.ytdlp_service.get_extraction_pool") as mock_pool:
+        mock_pool.return_value.run = run
+        with pytest.raises(PoolSaturatedError) as exc:
+            await YtDlpService.fetch_info("https://youtu.be/aaaaaaaaaaa")
+        assert not isinstance(exc.value, UpstreamThrottledError)
+
+        # A recusa do pool não gastou a ficha
+        assert await YtDlpService.fetch_info("https://youtu.be/aaaaaaaaaaa") == {"id": "aaaaaaaaaaa"}
+
+    assert throttle.stats()["throttled"] == 0
+
+
+@pytest.mark.asyncio
+async def test_playlist_listings_share_the_upstream_throttle():
+    throttle = _throttle([0.0], max_rate=2.0)  # Duas fichas
+    run = AsyncMock(side_effect=[BotChallengeError("Sign in to confirm you're not a bot"), ["https://youtu.be/aaaaaaaaaaa"]])
+
+    with patch("app.services.ytdlp_service.get_upstream_throttle", return_value=throttle), \
+         patch("app.services.ytdlp_service.get_extraction_pool") as mock_pool:
+        mock_pool.return_value.run = run
+        with pytest.raises(UpstreamThrottledError):
+            await YtDlpService.fetch_playlist_page("https://www.youtube.com/playlist?list=PL1")
+        assert await YtDlpService.fetch_playlist("https://www.youtube.com/playlist?list=PL1") == ["https://youtu.be/aaaaaaaaaaa"]
+
+        # Fichas esgotadas: a próxima listagem nem chega ao pool
+        with pytest.raises(UpstreamThrottledError):
+            await YtDlpService.fetch_playlist_page("https://www.youtube.com/playlist?list=PL1")
+
+    assert run.await_count == 2
+    assert throttle.stats()["throttled"] == 1
+
+
+def test_playlist_rate_limited_per_client():
+    limiter = RateLimiter(rate=0.001, burst=1, global_rate=100, global_burst=100)
+    page = PlaylistPage("Lista", [], None)
+
+    with patch("app.api.v1.endpoints.download.get_rate_limiter", return_value=limiter), \
+         patch("app.api.v1.endpoints.download.YtDlpService.fetch_playlist_page", AsyncMock(return_value=page)):
+        client = TestClient(app)
+        params = {"url": "https://www.youtube.com/playlist?list=PL1"}
+        first = client.get("/api/v1/download/playlist", params=params)
+        second = client.get("/api/v1/download/playlist", params=params)
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+
+
+def test_info_rate_limited_per_client():
+    limiter = RateLimiter(rate=0.001, burst=1, global_rate=100, global_burst=100)
+    info = {"id": "dQw4w9WgXcQ", "title": "Vídeo", "formats": []}
+
+    with patch("app.api.v1.endpoints.download.get_rate_limiter", return_value=limiter), \
+         patch("app.api.v1.endpoints.download.YtDlpService.fetch_info", AsyncMock(return_value=info)):
+        client = TestClient(app)
+        first = client.post("/api/v1/download/info", json={"url": "https://youtu.be/dQw4w9WgXcQ"})
+        second = client.post("/api/v1/download/info", json={"url": "https://youtu.be/dQw4w9WgXcQ"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert int(second.headers["Retry-After"]) >= 1
+
+
+def test_bot_challenge_answers_503_with_retry_after():
+    error = UpstreamThrottledError(42.3, "YouTube bloqueou o acesso. Tente novamente.")
+
+    with patch("app.api.v1.endpoints.download.YtDlpService.fetch_info", AsyncMock(side_effect=error)):
+        response = TestClient(app).post("/api/v1/download/info", json={"url": "https://youtu.be/dQw4w9WgXcQ"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "43"
+    assert "bloqueou" in response.json()["detail"]
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+import pytest
+from app.services.relay import PipeRelay
+
+
+async def _spawn(relay, code):
+    read_fd, write_fd = relay.pipe()
+    try:
+        process = await asyncio.create_subprocess_exec(sys.executable, "-c", code, stdout=write_fd)
+    finally:
+        os.close(write_fd)
+    return process, read_fd
+
+
+@pytest.mark.asyncio
+async def test_relays_whole_pipe_in_bounded_chunks():
+    relay = PipeRelay(chunk_size=4096, high_water=16384)
+    code = "import os\nfor i in range(50): os.write(1, bytes([i]) * 10000)"
+    process, fd = await _spawn(relay, code)
+
+    chunks = [c async for c in relay.stream(fd)]
+    await process.wait()
+
+    assert b"".join(chunks) == b"".join(bytes([i]) * 10000 for i in range(50))
+    assert max(len(c) for c in chunks) <= 16384
+    assert all(isinstance(c, bytes) for c in chunks)
+
+
+@pytest.mark.asyncio
+async def test_slow_producer_is_not_held_back_by_high_water():
+    relay = PipeRelay(chunk_size=4096, high_water=1 << 20)
+    code = "import os, time\nos.write(1, b'first')\ntime.sleep(5)\nos.write(1, b'second')"
+    process, fd = await _spawn(relay, code)
+
+    body = relay.stream(fd)
+    assert await asyncio.wait_for(body.__anext__(), timeout=2) == b"first"
+
+    await body.aclose()
+    process.kill()
+    await process.wait()
+
+
+@pytest.mark.asyncio
+async def test_buffers_are_reused_and_fd_closed():
+    relay = PipeRelay(chunk_size=4096, high_water=8192)
+    for _ in range(3):
+        process, fd = await _spawn(relay, "import os\nos.write(1, b'x' * 20000)")
+        assert len(b"".join([c async for c in relay.stream(fd)])) == 20000
+        await process.wait()
+        with pytest.raises(OSError):
+            os.fstat(fd)
+
+    assert relay.pool.stats()["allocated"] == 1
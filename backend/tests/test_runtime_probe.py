@@ -0,0 +1,76 @@
+import subprocess
+import pytest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.runtime_probe import NodeRuntimeProbe
+from app.services.ytdlp_service import YtDlpService
+from app.core.config import get_settings
+
+PROBE_PATH = "app.services.runtime_probe"
+
+
+def _completed(version="v20.11.0"):
+    return MagicMock(stdout=f"{version}\n")
+
+
+def test_probe_is_memoized_after_success():
+    probe = NodeRuntimeProbe()
+    with patch(f"{PROBE_PATH}.shutil.which", return_value="/usr/bin/node"), \
+         patch(f"{PROBE_PATH}.subprocess.run", return_value=_completed()) as mock_run:
+        first = probe.status()
+        second = probe.status()
+
+    assert first is second
+    assert first.available
+    assert first.path == "/usr/bin/node"
+    assert first.version == "v20.11.0"
+    assert mock_run.call_count == 1
+
+
+def test_probe_retries_after_failure():
+    probe = NodeRuntimeProbe(retry_interval=0)
+    with patch(f"{PROBE_PATH}.shutil.which", return_value="/usr/bin/node"), \
+         patch(f"{PROBE_PATH}.subprocess.run") as mock_run:
+        mock_run.side_effect = [subprocess.CalledProcessError(1, "node"), _completed()]
+
+        assert not probe.status().available
+        assert probe.status().available
+        assert mock_run.call_count == 2
+
+
+def test_probe_missing_node():
+    probe = NodeRuntimeProbe()
+    with patch(f"{PROBE_PATH}.shutil.which", return_value=None):
+        status = probe.probe()
+    assert not status.available
+    assert status.path is None
+
+
+def test_validate_integrity_does_not_fork_per_call():
+    with patch("app.services.ytdlp_service.node_runtime") as mock_runtime, \
+         patch("subprocess.check_call") as mock_check_call:
+        mock_runtime.status.return_value.available = True
+        YtDlpService.validate_integrity()
+        YtDlpService.validate_integrity()
+        mock_check_call.assert_not_called()
+
+        mock_runtime.status.return_value.available = False
+        with pytest.raises(RuntimeError):
+            YtDlpService.validate_integrity()
+
+
+def test_admin_reprobe_requires_token():
+    client = TestClient(app)
+    settings = get_settings()
+    with patch.object(settings, "ADMIN_TOKEN", "secret"), \
+         patch("app.api.v1.endpoints.admin.node_runtime") as mock_runtime:
+        mock_runtime.probe.return_value.to_dict.return_value = {"available": True}
+
+        assert client.post("/api/v1/admin/runtime/probe").status_code == 401
+        assert client.post("/api/v1/admin/runtime/probe", headers={"X-Admin-Token": "secreT"}).status_code == 401
+
+        response = client.post("/api/v1/admin/runtime/probe", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 200
+        assert response.json() == {"available": True}
+        mock_runtime.probe.assert_called_once()
@@ -0,0 +1,198 @@
+import asyncio
+import fcntl
+import os
+import threading
+
+import pytest
+
+from app.services.extraction_pool import ExtractionPool, ExtractionTimeoutError
+from app.services.ffmpeg_service import ProcessLimiter
+from app.services.info_cache import SqliteInfoCache
+from app.services.info_projection import project_info
+from app.services.jobs import JobScheduler
+from app.services.shared_state import SharedSlots, _key_path, key_lock
+
+RAW = {
+    'id': 'dQw4w9WgXcQ',
+    'title': 'Vídeo',
+    'formats': [
+        {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'url': 'https://media/140'},
+        {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'none', 'height': 1080,
+         'url': 'https://media/137'},
+    ],
+}
+
+
+def test_slots_are_shared_between_instances(tmp_path):
+    # Duas instâncias no mesmo diretório se comportam como dois workers
+    a = SharedSlots(str(tmp_path), "extraction", 2)
+    b = SharedSlots(str(tmp_path), "extraction", 2)
+
+    assert a.try_acquire() == 0
+    assert a.try_acquire() == 1
+    assert b.try_acquire() is None
+    assert b.busy() == 2
+
+    a.release(0)
+    assert b.try_acquire() == 0
+    assert a.stats()["busy"] == 2
+    a.close()
+    b.close()
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_other_worker(tmp_path):
+    a = SharedSlots(str(tmp_path), "ffmpeg", 1, poll_interval=0.005)
+    b = SharedSlots(str(tmp_path), "ffmpeg", 1, poll_interval=0.005)
+    slot = a.try_acquire()
+
+    waiter = asyncio.create_task(b.acquire())
+    await asyncio.sleep(0.03)
+    assert not waiter.done()
+
+    a.release(slot)
+    assert await asyncio.wait_for(waiter, 1) == 0
+    assert b.waited == 1
+    a.close()
+    b.close()
+
+
+@pytest.mark.asyncio
+async def test_key_lock_serializes_same_key(tmp_path):
+    order = []
+
+    async def critical(name):
+        async with key_lock(str(tmp_path), "yt:abc", poll_interval=0.005):
+            order.append(f"{name}-in")
+            await asyncio.sleep(0.02)
+            order.append(f"{name}-out")
+
+    await asyncio.gather(critical("a"), critical("b"))
+    assert order in (["a-in", "a-out", "b-in", "b-out"], ["b-in", "b-out", "a-in", "a-out"])
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_key_lock_waits_for_other_worker_only_on_the_same_key(tmp_path):
+    # Outro worker segurando o lock de "yt:abc"
+    fd = os.open(_key_path(str(tmp_path), "yt:abc"), os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+
+    async def enter(key):
+        async with key_lock(str(tmp_path), key, poll_interval=0.005):
+            return key
+
+    # Outra chave não cai no mesmo arquivo
+    assert await asyncio.wait_for(enter("yt:def"), 1) == "yt:def"
+
+    waiter = asyncio.create_task(enter("yt:abc"))
+    await asyncio.sleep(0.03)
+    assert not waiter.done()
+
+    # O outro worker solta (apagando o arquivo, como o key_lock faz)
+    os.unlink(_key_path(str(tmp_path), "yt:abc"))
+    os.close(fd)
+    assert await asyncio.wait_for(waiter, 1) == "yt:abc"
+    assert os.listdir(tmp_path) == []
+
+
+def test_sqlite_cache_is_shared_and_keeps_format_index(tmp_path):
+    now = [1000.0]
+    path = str(tmp_path / "info.sqlite3")
+    writer = SqliteInfoCache(path, max_entries=2, clock=lambda: now[0])
+    reader = SqliteInfoCache(path, max_entries=2, clock=lambda: now[0])
+
+    writer.set("yt:dQw4w9WgXcQ", project_info(RAW), ttl=60)
+    cached = reader.get("yt:dQw4w9WgXcQ")
+
+    assert cached.title == 'Vídeo'
+    assert cached.format_index.select("audio") == '140'
+    assert reader.stats()["hits"] == 1
+
+    now[0] += 61
+    assert reader.get("yt:dQw4w9WgXcQ") is None
+    assert reader.expirations == 1
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    now = [1000.0]
+    cache = SqliteInfoCache(str(tmp_path / "info.sqlite3"), max_entries=2, clock=lambda: now[0])
+    for key in ("a", "b"):
+        now[0] += 1
+        cache.set(key, {"id": key}, ttl=60)
+    now[0] += 1
+    cache.get("a")
+    now[0] += 1
+    cache.set("c", {"id": "c"}, ttl=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"id": "a"}
+    assert len(cache) == 2
+
+
+@pytest.mark.asyncio
+async def test_extraction_limit_is_global_across_pools(tmp_path):
+    first = ExtractionPool(max_workers=1, max_queue=1, timeout=5,
+                           shared=SharedSlots(str(tmp_path), "extraction", 1, poll_interval=0.005))
+    second = ExtractionPool(max_workers=1, max_queue=1, timeout=0.1,
+                            shared=SharedSlots(str(tmp_path), "extraction", 1, poll_interval=0.005))
+    release = threading.Event()
+
+    running = asyncio.create_task(first.run(release.wait))
+    await asyncio.sleep(0.05)
+    with pytest.raises(ExtractionTimeoutError):
+        await second.run(lambda: "nunca roda")
+    assert second.pending == 0
+
+    release.set()
+    await running
+    assert await second.run(lambda: "ok") == "ok"
+    first.shutdown()
+    second.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_limit_is_global_across_limiters(tmp_path):
+    first = ProcessLimiter(1, 1, shared=SharedSlots(str(tmp_path), "transcode", 1, poll_interval=0.005))
+    second = ProcessLimiter(1, 1, shared=SharedSlots(str(tmp_path), "transcode", 1, poll_interval=0.005))
+
+    waiting = second.slot()
+    async with first.slot():
+        waiter = asyncio.create_task(waiting.__aenter__())
+        await asyncio.sleep(0.03)
+        assert not waiter.done()
+        assert second.waiting == 1
+    await asyncio.wait_for(waiter, 1)
+    assert second.running == 1
+    await waiting.__aexit__(None, None, None)
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_visible_and_cancellable_from_other_worker(tmp_path):
+    started = asyncio.Event()
+
+    async def run(scheduler, job):
+        started.set()
+        await asyncio.sleep(60)
+
+    owner = JobScheduler(run=run, directory=str(tmp_path), max_workers=1, shared=True)
+    other = JobScheduler(run=run, directory=str(tmp_path), max_workers=1, shared=True)
+    job = owner.submit("alice", "a1")
+    await started.wait()
+
+    remote = other.get(job.id)
+    assert remote.state == "running" and remote.client == "alice"
+    assert [j.id for j in other.list("alice")] == [job.id]
+    assert other.get("../../etc/passwd") is None
+
+    other.cancel(job.id)
+    owner.get(job.id)  # O dono aplica o marcador na próxima chamada
+    await asyncio.sleep(0.05)
+    assert job.state == "cancelled"
+    assert other.get(job.id).state == "cancelled"
+
+    assert other.delete(job.id)
+    owner.get(job.id)
+    assert owner.get(job.id) is None
+    assert list(tmp_path.iterdir()) == []
+    await owner.close()
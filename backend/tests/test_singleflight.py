@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.services.singleflight import SingleFlight
+from app.services.ytdlp_service import YtDlpService
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = 0
+    gate = asyncio.Event()
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await gate.wait()
+        return {"id": "abc"}
+
+    waiters = [asyncio.create_task(flights.do("abc", work)) for _ in range(10)]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == 1
+    assert all(r is results[0] for r in results)
+    assert flights.shared == 9
+    assert "abc" not in flights
+
+
+@pytest.mark.asyncio
+async def test_exception_is_shared():
+    flights = SingleFlight()
+    gate = asyncio.Event()
+
+    async def work():
+        await gate.wait()
+        raise RuntimeError("YouTube bloqueou o acesso")
+
+    waiters = [asyncio.create_task(flights.do("abc", work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_work():
+    flights = SingleFlight()
+    gate = asyncio.Event()
+
+    async def work():
+        await gate.wait()
+        return "done"
+
+    first = asyncio.create_task(flights.do("abc", work))
+    second = asyncio.create_task(flights.do("abc", work))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    gate.set()
+
+    assert await second == "done"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_fetch_info_coalesces_url_variants():
+    calls = 0
+
+    async def slow_run(fn, url):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"id": "dQw4w9WgXcQ", "formats": []}
+
+    with patch("app.services.ytdlp_service.get_extraction_pool") as mock_pool, \
+         patch("app.services.ytdlp_service.get_info_cache") as mock_cache:
+        mock_pool.return_value.run = slow_run
+        mock_cache.return_value.get.return_value = None
+
+        results = await asyncio.gather(
+            YtDlpService.fetch_info("https://youtu.be/dQw4w9WgXcQ"),
+            YtDlpService.fetch_info("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=1"),
+        )
+
+    assert calls == 1
+    assert results[0] is results[1]
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import app.main
+from app.services.ydl_pool import PRELOAD_MODULES, preload
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Nada disso pode entrar no import do app: vem na primeira extração ou no preload
+LAZY_PREFIXES = ("yt_dlp", "curl_cffi", "fastapi.staticfiles")
+
+
+def _import_times(module: str, env: dict) -> dict[str, int]:
+    """Módulo -> microssegundos acumulados, pelo `-X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_app_import_stays_lazy(tmp_path):
+    download_dir = tmp_path / "downloads"
+    env = {**os.environ, "DOWNLOAD_DIR": str(download_dir)}
+
+    times = _import_times("app.main", env)
+
+    assert "app.main" in times
+    eager = sorted(name for name in times if name.startswith(LAZY_PREFIXES))
+    assert eager == []
+    # Importar a configuração não cria diretórios
+    assert not download_dir.exists()
+
+
+def test_preload_imports_heavy_modules():
+    missing = preload()
+    for module in PRELOAD_MODULES:
+        assert module in sys.modules or module in missing
+    assert "yt_dlp" not in missing
+
+
+def test_health_answers_before_warmup():
+    gate = asyncio.Event()
+
+    async def slow_warm_up():
+        await gate.wait()
+
+    with patch("app.main.warm_up", slow_warm_up):
+        with TestClient(app.main.app) as client:
+            response = client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["warm"] is False
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_prefork_replaces_dead_workers_and_stops_on_sigterm(tmp_path):
+    script = textwrap.dedent(f"""
+        import os, sys, time
+        from app.server import prefork
+
+        def run_worker():
+            open(os.path.join({str(tmp_path)!r}, str(os.getpid())), "w").close()
+            time.sleep(60)
+
+        sys.exit(prefork(run_worker, 2))
+    """)
+    master = subprocess.Popen([sys.executable, "-c", script], cwd=BACKEND)
+    try:
+        _wait_for(lambda: len(list(tmp_path.iterdir())) == 2)
+        first = int(next(tmp_path.iterdir()).name)
+        os.kill(first, signal.SIGKILL)
+        _wait_for(lambda: len(list(tmp_path.iterdir())) == 3)
+
+        master.send_signal(signal.SIGTERM)
+        assert master.wait(timeout=10) == 0
+        for path in tmp_path.iterdir():
+            pid = int(path.name)
+            _wait_for(lambda: not Path(f"/proc/{pid}").exists())
+    finally:
+        if master.poll() is None:
+            master.kill()
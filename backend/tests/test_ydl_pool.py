@@ -0,0 +1,107 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from yt_dlp.utils import DownloadError, ExtractorError
+from app.services.ydl_pool import YoutubeDLPool
+from app.services.ytdlp_service import YtDlpService
+
+
+def _new_instance(opts):
+    instance = MagicMock()
+    instance.__enter__.return_value = instance
+    return instance
+
+
+@pytest.fixture
+def mock_ydl():
+    with patch('yt_dlp.YoutubeDL', side_effect=_new_instance) as mock:
+        yield mock
+
+
+def _pool(**kwargs):
+    return YoutubeDLPool(options_factory=dict, **kwargs)
+
+
+def test_lease_reuses_warm_instance(mock_ydl):
+    pool = _pool()
+
+    with pool.lease() as first:
+        pass
+    with pool.lease() as second:
+        pass
+
+    assert first is second
+    assert mock_ydl.call_count == 1
+    assert pool.stats()["reused"] == 1
+    assert pool.stats()["in_use"] == 0
+
+
+def test_unhealthy_error_recycles_instance(mock_ydl):
+    pool = _pool()
+
+    with pytest.raises(DownloadError):
+        with pool.lease() as first:
+            raise DownloadError("HTTP Error 429")
+    with pool.lease() as second:
+        pass
+
+    assert first is not second
+    first.__exit__.assert_called_once()
+    assert pool.stats()["recycled"] == 1
+
+
+def test_expected_extractor_error_keeps_instance(mock_ydl):
+    pool = _pool()
+    unavailable = ExtractorError("Video unavailable", expected=True)
+
+    with pytest.raises(DownloadError):
+        with pool.lease() as first:
+            raise DownloadError("Video unavailable", exc_info=(ExtractorError, unavailable, None))
+    with pool.lease() as second:
+        pass
+
+    assert first is second
+
+
+def test_max_age_and_max_uses(mock_ydl):
+    now = [0.0]
+    pool = _pool(max_age=10, max_uses=2, clock=lambda: now[0])
+
+    with pool.lease() as a:
+        pass
+    with pool.lease() as b:
+        pass
+    with pool.lease() as c:  # 'a' atingiu max_uses
+        pass
+    assert a is b
+    assert c is not a
+
+    now[0] = 11
+    with pool.lease() as d:  # 'c' expirou por idade
+        pass
+    assert d is not c
+    assert mock_ydl.call_count == 3
+
+
+def test_idle_instances_are_bounded(mock_ydl):
+    pool = _pool(max_size=1)
+
+    first = pool.checkout()
+    second = pool.checkout()
+    pool.checkin(first)
+    pool.checkin(second)
+
+    assert pool.stats()["idle"] == 1
+    second.ydl.__exit__.assert_called_once()
+
+
+def test_get_info_reuses_pooled_instance():
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        instance = mock_ydl.return_value
+        instance.__enter__.return_value = instance
+        instance.extract_info.return_value = {'title': 'Test Video', 'formats': []}
+
+        YtDlpService.get_info("http://test.com/1")
+        YtDlpService.get_info("http://test.com/2")
+
+        assert mock_ydl.call_count == 1
+        assert instance.extract_info.call_count == 2